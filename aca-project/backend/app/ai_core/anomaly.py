@@ -1,6 +1,8 @@
 ﻿from __future__ import annotations
 
-import asyncio
+import copy
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Iterable
@@ -10,8 +12,12 @@ import torch
 import torch.nn as nn
 from PIL import Image
 
+from app.ai_core.executor import get_inference_executor, get_training_executor
 from app.ai_core.model import ConvAutoencoder, load_model, save_model
+from app.ai_core.registry import get_model_registry
+from app.api.schemas import SimulationMode
 from app.core.config import settings
+from app.services.synthetic import SyntheticFrameGenerator
 
 
 @dataclass
@@ -20,15 +26,176 @@ class AnalyzeResult:
     score: float
     heatmap_path: str | None
     recon_path: str | None
+    queue_ms: float | None = None
+    compute_ms: float | None = None
 
 
-def _load_image_grayscale(path: str, size: tuple[int, int] = (256, 256)) -> torch.Tensor:
+def get_inference_model(item: str | None = None) -> ConvAutoencoder:
+    """Weights for ``item`` from the registry, or the shared model when it has none."""
+    return get_model_registry().get(item)
+
+
+def _set_inference_model(model: ConvAutoencoder, item: str | None = None) -> None:
+    get_model_registry().put(item, model)
+
+
+def _load_image_u8(path: str, size: tuple[int, int] = (256, 256)) -> np.ndarray:
     img = Image.open(path).convert('L').resize(size)
-    arr = np.array(img, dtype=np.float32) / 255.0
+    return np.array(img, dtype=np.uint8)
+
+
+def _load_image_grayscale(path: str, size: tuple[int, int] = (256, 256)) -> torch.Tensor:
+    arr = _load_image_u8(path, size).astype(np.float32) / 255.0
     tensor = torch.from_numpy(arr).unsqueeze(0).unsqueeze(0)
     return tensor
 
 
+def _load_stack_u8(paths: list[str]) -> torch.Tensor:
+    """Decode ``paths`` once into an ``[N,1,H,W]`` uint8 tensor; batches are scaled to float on demand."""
+    if not paths:
+        return torch.empty((0, 1, 256, 256), dtype=torch.uint8)
+    with ThreadPoolExecutor(max_workers=min(8, len(paths))) as pool:
+        arrays = list(pool.map(_load_image_u8, paths))
+    return torch.from_numpy(np.stack(arrays)).unsqueeze(1)
+
+
+def _as_float(batch: torch.Tensor) -> torch.Tensor:
+    return batch.float().div_(255.0)
+
+
+def _eval_loss(model: ConvAutoencoder, data: torch.Tensor, batch_size: int) -> float:
+    model.eval()
+    total = 0.0
+    with torch.no_grad():
+        for start in range(0, len(data), batch_size):
+            x = _as_float(data[start:start + batch_size])
+            total += torch.mean((model(x) - x) ** 2, dim=(1, 2, 3)).sum().item()
+    return total / max(1, len(data))
+
+
+def fit_batches(
+    model: ConvAutoencoder,
+    train: torch.Tensor,
+    val: torch.Tensor,
+    epochs: int,
+    lr: float,
+    batch_size: int,
+    patience: int,
+) -> dict:
+    """Mini-batch training on in-memory uint8 tensors with early stopping on ``val``."""
+    optim = torch.optim.Adam(model.parameters(), lr=lr)
+    loss_fn = nn.MSELoss()
+    has_val = len(val) > 0
+    initial_val = _eval_loss(model, val, batch_size) if has_val else None
+    best_val = initial_val
+    best_state = copy.deepcopy(model.state_dict())
+    stale = 0
+    epochs_run = 0
+
+    for _ in range(epochs):
+        model.train()
+        order = torch.randperm(len(train))
+        for start in range(0, len(train), batch_size):
+            x = _as_float(train[order[start:start + batch_size]])
+            optim.zero_grad()
+            loss = loss_fn(model(x), x)
+            loss.backward()
+            optim.step()
+        epochs_run += 1
+
+        if not has_val:
+            best_state = copy.deepcopy(model.state_dict())
+            continue
+        val_loss = _eval_loss(model, val, batch_size)
+        if val_loss < best_val:
+            best_val = val_loss
+            best_state = copy.deepcopy(model.state_dict())
+            stale = 0
+        else:
+            stale += 1
+            if stale >= patience:
+                break
+
+    model.load_state_dict(best_state)
+    model.eval()
+    return {'epochs_run': epochs_run, 'initial_val_loss': initial_val, 'best_val_loss': best_val}
+
+
+def fine_tune(
+    train_paths: list[str],
+    val_paths: list[str],
+    epochs: int = 20,
+    lr: float = 1e-3,
+    batch_size: int = 16,
+    patience: int = 3,
+    item: str | None = None,
+) -> dict:
+    """Continue training from the current weights for ``item`` on ``train_paths`` only.
+
+    An item without weights of its own starts from the shared model and is saved
+    under its own name, so the shared model is only changed when ``item`` is None.
+    """
+    start = time.perf_counter()
+    train = _load_stack_u8(train_paths)
+    val = _load_stack_u8(val_paths)
+    result = _fit_and_publish(train, val, epochs, lr, batch_size, patience, item)
+    return {**result, 'duration_s': time.perf_counter() - start}
+
+
+def train_synthetic(
+    count: int = 512,
+    val_count: int = 64,
+    epochs: int = 20,
+    lr: float = 1e-3,
+    batch_size: int = 16,
+    patience: int = 3,
+    item: str | None = None,
+    seed: int | None = None,
+) -> dict:
+    """Fine-tune ``item`` on frames from ``SyntheticFrameGenerator``, entirely in memory.
+
+    Only defect-free modes are generated: the autoencoder learns what normal looks like.
+    """
+    start = time.perf_counter()
+    generator = SyntheticFrameGenerator(resolution=(256, 256), seed=seed)
+    normal = (SimulationMode.CLEAN, SimulationMode.OPTICAL_NOISE)
+    train = torch.empty((count, 1, 256, 256), dtype=torch.uint8)
+    val = torch.empty((val_count, 1, 256, 256), dtype=torch.uint8)
+    generator.fill(train.numpy()[:, 0], modes=normal)
+    generator.fill(val.numpy()[:, 0], modes=normal)
+    generate_s = time.perf_counter() - start
+    result = _fit_and_publish(train, val, epochs, lr, batch_size, patience, item)
+    return {**result, 'source': 'synthetic', 'generate_s': generate_s, 'duration_s': time.perf_counter() - start}
+
+
+def _fit_and_publish(
+    train: torch.Tensor,
+    val: torch.Tensor,
+    epochs: int,
+    lr: float,
+    batch_size: int,
+    patience: int,
+    item: str | None,
+) -> dict:
+    model = ConvAutoencoder()
+    model.load_state_dict(get_inference_model(item).state_dict())
+    stats = fit_batches(model, train, val, epochs=epochs, lr=lr, batch_size=batch_size, patience=patience)
+
+    # Only publish weights that improved on the held-out split.
+    improved = stats['initial_val_loss'] is None or stats['best_val_loss'] < stats['initial_val_loss']
+    if improved:
+        save_model(model, item)
+        _set_inference_model(model, item)
+    return {
+        'item': item,
+        'trained': improved,
+        'reason': None if improved else 'no_improvement',
+        'count': len(train),
+        'val_count': len(val),
+        **stats,
+    }
+
+
 def _save_image(tensor: torch.Tensor, path: Path) -> None:
     arr = tensor.squeeze(0).squeeze(0).clamp(0, 1).mul(255).byte().cpu().numpy()
     Image.fromarray(arr, mode='L').save(path)
@@ -68,14 +235,28 @@ def train_from_static(epochs: int = 5, lr: float = 1e-3) -> dict:
             optim.step()
 
     save_model(model)
+    _set_inference_model(model)
     return {'trained': True, 'count': len(paths)}
 
 
-def analyze_image(path: str, threshold: float = 0.01) -> AnalyzeResult:
+def array_to_tensor(image: np.ndarray, size: tuple[int, int] = (256, 256)) -> torch.Tensor:
+    """Same preprocessing as ``_load_image_grayscale`` for an in-memory BGR (OpenCV order) frame; never aliases ``image``."""
+    if image.ndim == 3:
+        image = image[..., ::-1]
+    img = Image.fromarray(image).convert('L').resize(size)
+    arr = np.array(img, dtype=np.float32) / 255.0
+    return torch.from_numpy(arr).unsqueeze(0).unsqueeze(0)
+
+
+def analyze_image(path: str, threshold: float = 0.01, item: str | None = None) -> AnalyzeResult:
+    return analyze_tensor(_load_image_grayscale(path), Path(path).stem, threshold, item)
+
+
+def analyze_tensor(x: torch.Tensor, stem: str, threshold: float = 0.01, item: str | None = None) -> AnalyzeResult:
     device = torch.device('cpu')
-    model = load_model(device=device)
+    model = get_inference_model(item)
 
-    x = _load_image_grayscale(path).to(device)
+    x = x.to(device)
     with torch.no_grad():
         recon = model(x)
 
@@ -87,8 +268,8 @@ def analyze_image(path: str, threshold: float = 0.01) -> AnalyzeResult:
     heat_dir.mkdir(parents=True, exist_ok=True)
     recon_dir.mkdir(parents=True, exist_ok=True)
 
-    heat_path = heat_dir / (Path(path).stem + '_heat.png')
-    recon_path = recon_dir / (Path(path).stem + '_recon.png')
+    heat_path = heat_dir / (stem + '_heat.png')
+    recon_path = recon_dir / (stem + '_recon.png')
 
     _save_heatmap(diff, heat_path)
     _save_image(recon, recon_path)
@@ -103,8 +284,36 @@ def analyze_image(path: str, threshold: float = 0.01) -> AnalyzeResult:
 
 
 async def train_async(epochs: int = 5, lr: float = 1e-3) -> dict:
-    return await asyncio.to_thread(train_from_static, epochs, lr)
+    return await get_training_executor().run(train_from_static, epochs, lr)
+
+
+async def fine_tune_async(
+    train_paths: list[str],
+    val_paths: list[str],
+    epochs: int = 20,
+    lr: float = 1e-3,
+    batch_size: int = 16,
+    patience: int = 3,
+    item: str | None = None,
+) -> dict:
+    return await get_training_executor().run(fine_tune, train_paths, val_paths, epochs, lr, batch_size, patience, item)
+
+
+async def train_synthetic_async(
+    count: int = 512,
+    val_count: int = 64,
+    epochs: int = 20,
+    lr: float = 1e-3,
+    batch_size: int = 16,
+    patience: int = 3,
+    item: str | None = None,
+    seed: int | None = None,
+) -> dict:
+    return await get_training_executor().run(train_synthetic, count, val_count, epochs, lr, batch_size, patience, item, seed)
 
 
-async def analyze_async(path: str, threshold: float = 0.01) -> AnalyzeResult:
-    return await asyncio.to_thread(analyze_image, path, threshold)
+async def analyze_async(path: str, threshold: float = 0.01, item: str | None = None) -> AnalyzeResult:
+    result, queue_ms, compute_ms = await get_inference_executor().run_timed(analyze_image, path, threshold, item)
+    result.queue_ms = queue_ms
+    result.compute_ms = compute_ms
+    return result
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterator
+
+import numpy as np
+import torch
+from PIL import Image
+
+from app.ai_core.anomaly import _load_image_u8, get_inference_model
+from app.ai_core.executor import get_training_executor
+
+
+IMAGE_SIZE = (256, 256)
+
+
+@dataclass
+class EvalSample:
+    image_path: str
+    mask_path: str | None
+    is_anomaly: bool
+    defect_type: str
+
+
+def _load_mask(path: str | None) -> np.ndarray:
+    if path is None:
+        return np.zeros(IMAGE_SIZE[::-1], dtype=bool)
+    img = Image.open(path).convert('L').resize(IMAGE_SIZE, resample=Image.NEAREST)
+    return np.asarray(img) > 127
+
+
+def _load_batch(samples: list[EvalSample]) -> tuple[np.ndarray, np.ndarray]:
+    images = np.stack([_load_image_u8(s.image_path, IMAGE_SIZE) for s in samples])
+    masks = np.stack([_load_mask(s.mask_path) for s in samples])
+    return images, masks
+
+
+def _prefetched_batches(pool: ThreadPoolExecutor, samples: list[EvalSample], batch_size: int) -> Iterator[tuple[list[EvalSample], Future]]:
+    """Decode batch ``k+1`` on the pool while batch ``k`` runs through the model."""
+    chunks = [samples[i:i + batch_size] for i in range(0, len(samples), batch_size)]
+    pending = None
+    for chunk in chunks:
+        future = pool.submit(_load_batch, chunk)
+        if pending is not None:
+            yield pending
+        pending = (chunk, future)
+    if pending is not None:
+        yield pending
+
+
+class PixelHistogram:
+    """Fixed-bin histograms of anomaly-map values for defect and normal pixels; mergeable and O(bins) memory."""
+
+    def __init__(self, bins: int) -> None:
+        self.bins = bins
+        self.pos = np.zeros(bins, dtype=np.int64)
+        self.neg = np.zeros(bins, dtype=np.int64)
+
+    def update(self, amap: np.ndarray, mask: np.ndarray) -> None:
+        idx = np.minimum((amap * self.bins).astype(np.int64), self.bins - 1)
+        self.pos += np.bincount(idx[mask], minlength=self.bins)
+        self.neg += np.bincount(idx[~mask], minlength=self.bins)
+
+    def metrics(self) -> dict:
+        if self.pos.sum() == 0 or self.neg.sum() == 0:
+            return {'auroc': None, 'best_f1': None, 'best_iou': None, 'threshold': None}
+        # Sweep thresholds from high to low: predicted positive = value >= bin edge.
+        tp = np.cumsum(self.pos[::-1])
+        fp = np.cumsum(self.neg[::-1])
+        tpr = np.concatenate([[0.0], tp / self.pos.sum()])
+        fpr = np.concatenate([[0.0], fp / self.neg.sum()])
+        auroc = float(np.trapz(tpr, fpr))
+        fn = self.pos.sum() - tp
+        f1 = 2 * tp / np.maximum(2 * tp + fp + fn, 1)
+        iou = tp / np.maximum(tp + fp + fn, 1)
+        best = int(np.argmax(f1))
+        return {
+            'auroc': auroc,
+            'best_f1': float(f1[best]),
+            'best_iou': float(iou[best]),
+            'threshold': float((self.bins - 1 - best) / self.bins),
+        }
+
+
+def image_auroc(scores: np.ndarray, labels: np.ndarray) -> float | None:
+    """Mann-Whitney AUROC with average ranks for ties."""
+    n_pos = int(labels.sum())
+    n_neg = len(labels) - n_pos
+    if n_pos == 0 or n_neg == 0:
+        return None
+    order = np.argsort(scores, kind='mergesort')
+    sorted_scores = scores[order]
+    ranks = np.empty(len(scores), dtype=np.float64)
+    _, first, counts = np.unique(sorted_scores, return_index=True, return_counts=True)
+    avg = first + (counts - 1) / 2.0 + 1.0
+    ranks[order] = np.repeat(avg, counts)
+    return float((ranks[labels].sum() - n_pos * (n_pos + 1) / 2.0) / (n_pos * n_neg))
+
+
+def recommend_threshold(scores: np.ndarray, labels: np.ndarray) -> dict:
+    """Score threshold (for ``analyze``'s ``score > threshold``) maximising image-level F1."""
+    if len(scores) == 0 or labels.sum() == 0:
+        return {'threshold': None, 'f1': None, 'precision': None, 'recall': None}
+    order = np.argsort(-scores, kind='mergesort')
+    s, y = scores[order], labels[order]
+    tp = np.cumsum(y)
+    fp = np.cumsum(~y)
+    precision = tp / (tp + fp)
+    recall = tp / y.sum()
+    f1 = 2 * precision * recall / np.maximum(precision + recall, 1e-12)
+    # Only cut between distinct scores; flagging index i means threshold just below s[i].
+    distinct = np.append(s[1:] != s[:-1], True)
+    f1 = np.where(distinct, f1, -1.0)
+    best = int(np.argmax(f1))
+    below = s[best + 1] if best + 1 < len(s) else 0.0
+    return {
+        'threshold': float((s[best] + below) / 2.0),
+        'f1': float(f1[best]),
+        'precision': float(precision[best]),
+        'recall': float(recall[best]),
+    }
+
+
+def evaluate(
+    samples: list[EvalSample],
+    batch_size: int = 32,
+    bins: int = 1000,
+    num_threads: int | None = None,
+    item: str | None = None,
+) -> dict:
+    start = time.perf_counter()
+    model = get_inference_model(item)
+    previous_threads = torch.get_num_threads()
+    threads = num_threads or previous_threads
+    torch.set_num_threads(threads)
+
+    scores = np.empty(len(samples), dtype=np.float64)
+    labels = np.array([s.is_anomaly for s in samples], dtype=bool)
+    pixels = PixelHistogram(bins)
+    done = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(4, threads))) as pool:
+            for chunk, future in _prefetched_batches(pool, samples, batch_size):
+                images, masks = future.result()
+                x = torch.from_numpy(images).unsqueeze(1).float().div_(255.0)
+                with torch.no_grad():
+                    diff = (model(x) - x).abs_()
+                mse = diff.pow(2).mean(dim=(1, 2, 3)).numpy()
+                scores[done:done + len(chunk)] = mse
+                pixels.update(diff.squeeze(1).clamp_(0, 1).numpy(), masks)
+                done += len(chunk)
+    finally:
+        torch.set_num_threads(previous_threads)
+
+    elapsed = time.perf_counter() - start
+    by_defect: dict[str, dict] = {}
+    for sample, score in zip(samples, scores):
+        entry = by_defect.setdefault(sample.defect_type, {'count': 0, 'score_sum': 0.0})
+        entry['count'] += 1
+        entry['score_sum'] += float(score)
+
+    return {
+        'images': len(samples),
+        'anomalous': int(labels.sum()),
+        'image_auroc': image_auroc(scores, labels),
+        'pixel': pixels.metrics(),
+        'recommendation': recommend_threshold(scores, labels),
+        'per_defect': {k: {'count': v['count'], 'mean_score': v['score_sum'] / v['count']} for k, v in by_defect.items()},
+        'seconds': elapsed,
+        'images_per_sec': len(samples) / elapsed if elapsed > 0 else None,
+        'threads': threads,
+    }
+
+
+async def evaluate_async(samples: list[EvalSample], batch_size: int = 32, bins: int = 1000, item: str | None = None) -> dict:
+    return await get_training_executor().run(evaluate, samples, batch_size, bins, None, item)
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from app.core.config import settings
+from app.core.profiling import wrap_for_thread
+
+
+logger = logging.getLogger('aca.ai')
+
+
+class InferenceQueueFull(Exception):
+    """Raised at admission when an executor already holds ``workers + queue_size`` jobs."""
+
+    def __init__(self, executor: str, retry_after: int) -> None:
+        super().__init__(f'{executor} executor is full')
+        self.executor = executor
+        self.retry_after = retry_after
+
+
+def _init_worker(torch_threads: int) -> None:
+    import torch
+
+    # Intra-op threads are effectively process-wide; both executors use the same value so they never fight over it.
+    torch.set_num_threads(torch_threads)
+
+
+class BoundedExecutor:
+    """Fixed-size worker pool with a bounded queue in front of it.
+
+    Jobs beyond the queue are rejected immediately rather than piling up; time
+    spent waiting for a worker is reported separately from time spent computing.
+    """
+
+    def __init__(self, name: str, workers: int, queue_size: int, torch_threads: int) -> None:
+        self.name = name
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // self.workers)
+        self._pool: ThreadPoolExecutor | None = None
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.queue_ms_total = 0.0
+        self.compute_ms_total = 0.0
+        self.compute_ms_ewma: float | None = None
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_size
+
+    def _ensure_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix=f'aca-{self.name}',
+                initializer=_init_worker,
+                initargs=(self.torch_threads,),
+            )
+        return self._pool
+
+    def retry_after(self) -> int:
+        per_job_s = (self.compute_ms_ewma or 1000.0) / 1000.0
+        waves = math.ceil((self.in_flight + 1) / self.workers)
+        return max(1, math.ceil(waves * per_job_s))
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+
+    async def run_timed(self, func: Callable[..., Any], *args) -> tuple[Any, float, float]:
+        """Run ``func`` on a worker; returns ``(result, queue_ms, compute_ms)``."""
+        if self.in_flight >= self.capacity:
+            self.rejected += 1
+            logger.warning('executor_full', extra={'executor': self.name, 'in_flight': self.in_flight})
+            raise InferenceQueueFull(self.name, self.retry_after())
+        loop = asyncio.get_running_loop()
+        traced = wrap_for_thread(func)
+        enqueued = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            value = traced(*args)
+            return value, started, time.perf_counter()
+
+        future = self._ensure_pool().submit(timed)
+        self.in_flight += 1
+        self.submitted += 1
+        # Release the slot when the job really ends, not when an awaiting request goes away.
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        try:
+            value, started, finished = await asyncio.wrap_future(future)
+        except Exception:
+            self.failed += 1
+            raise
+        queue_ms = (started - enqueued) * 1000.0
+        compute_ms = (finished - started) * 1000.0
+        self.completed += 1
+        self.queue_ms_total += queue_ms
+        self.compute_ms_total += compute_ms
+        self.compute_ms_ewma = compute_ms if self.compute_ms_ewma is None else 0.8 * self.compute_ms_ewma + 0.2 * compute_ms
+        return value, queue_ms, compute_ms
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        value, _, _ = await self.run_timed(func, *args)
+        return value
+
+    def get_stats(self) -> dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'torch_threads': self.torch_threads,
+            'queue_size': self.queue_size,
+            'in_flight': self.in_flight,
+            'queued': max(0, self.in_flight - self.workers),
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'mean_queue_ms': self.queue_ms_total / self.completed if self.completed else None,
+            'mean_compute_ms': self.compute_ms_total / self.completed if self.completed else None,
+            'compute_ms_ewma': self.compute_ms_ewma,
+        }
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+_inference: BoundedExecutor | None = None
+_training: BoundedExecutor | None = None
+
+
+def get_inference_executor() -> BoundedExecutor:
+    global _inference
+    if _inference is None:
+        _inference = BoundedExecutor(
+            'inference',
+            settings.inference_workers,
+            settings.inference_queue_size,
+            settings.inference_torch_threads,
+        )
+    return _inference
+
+
+def get_training_executor() -> BoundedExecutor:
+    """Training and evaluation share a single worker so long jobs run one at a time beside inference."""
+    global _training
+    if _training is None:
+        _training = BoundedExecutor(
+            'training',
+            1,
+            settings.training_queue_size,
+            get_inference_executor().torch_threads,
+        )
+    return _training
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import asyncio
+import importlib
+import logging
+import time
+from types import ModuleType
+from typing import Any
+
+
+logger = logging.getLogger('aca.ai')
+
+
+class AIRuntime:
+    """Imports torch and the anomaly model on first use (or in a background warm-up)."""
+
+    def __init__(self) -> None:
+        self.status = 'cold'
+        self.error: str | None = None
+        self.load_seconds: float | None = None
+        self._module: ModuleType | None = None
+        self._lock = asyncio.Lock()
+        self._warmup_task: asyncio.Task | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self._module is not None
+
+    async def ensure_loaded(self) -> ModuleType:
+        if self._module is not None:
+            return self._module
+        async with self._lock:
+            if self._module is None:
+                self.status = 'loading'
+                start = time.perf_counter()
+                try:
+                    self._module = await asyncio.to_thread(self._load)
+                except Exception as exc:
+                    self.status = 'error'
+                    self.error = repr(exc)
+                    raise
+                self.load_seconds = time.perf_counter() - start
+                self.status = 'ready'
+                self.error = None
+                logger.info('ai_loaded', extra={'load_seconds': self.load_seconds})
+        return self._module
+
+    def start_warmup(self) -> None:
+        if self._module is None and self._warmup_task is None:
+            self._warmup_task = asyncio.create_task(self._warmup())
+
+    async def _warmup(self) -> None:
+        try:
+            await self.ensure_loaded()
+        except Exception:
+            logger.exception('ai_warmup_failed')
+
+    def _load(self) -> ModuleType:
+        module = importlib.import_module('app.ai_core.anomaly')
+        module.get_inference_model()
+        return module
+
+    def get_status(self) -> dict[str, Any]:
+        return {
+            'status': self.status,
+            'ready': self.ready,
+            'load_seconds': self.load_seconds,
+            'error': self.error,
+        }
+
+
+ai_runtime = AIRuntime()
@@ -1,4 +1,5 @@
 ﻿import os
+import re
 from pathlib import Path
 
 import torch
@@ -30,22 +31,51 @@ class ConvAutoencoder(nn.Module):
         return self.decoder(z)
 
 
-def get_weights_path() -> Path:
+_ITEM_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$')
+
+
+def get_weights_path(item: str | None = None) -> Path:
+    """``weights/cae.pt`` is the shared model; each item or product gets ``weights/items/<item>.pt``."""
     base = Path(__file__).resolve().parent
     weights_dir = base / 'weights'
-    weights_dir.mkdir(parents=True, exist_ok=True)
-    return weights_dir / 'cae.pt'
+    if item is None:
+        return weights_dir / 'cae.pt'
+    if not _ITEM_RE.match(item):
+        raise ValueError(f'invalid item name {item!r}')
+    return weights_dir / 'items' / f'{item}.pt'
+
+
+def has_weights(item: str | None = None) -> bool:
+    if item is not None and not _ITEM_RE.match(item):
+        return False
+    return get_weights_path(item).exists()
+
+
+def list_item_weights() -> list[str]:
+    item_dir = Path(__file__).resolve().parent / 'weights' / 'items'
+    if not item_dir.exists():
+        return []
+    return sorted(p.stem for p in item_dir.glob('*.pt'))
+
+
+def model_nbytes(model: nn.Module) -> int:
+    return sum(t.numel() * t.element_size() for t in list(model.parameters()) + list(model.buffers()))
 
 
-def load_model(device: torch.device | None = None) -> ConvAutoencoder:
+def load_model(device: torch.device | None = None, item: str | None = None) -> ConvAutoencoder:
     device = device or torch.device('cpu')
     model = ConvAutoencoder().to(device)
-    weights = get_weights_path()
+    weights = get_weights_path(item)
     if weights.exists():
         model.load_state_dict(torch.load(weights, map_location=device))
     model.eval()
     return model
 
 
-def save_model(model: ConvAutoencoder) -> None:
-    torch.save(model.state_dict(), get_weights_path())
+def save_model(model: ConvAutoencoder, item: str | None = None) -> None:
+    path = get_weights_path(item)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    torch.save(model.state_dict(), tmp)
+    # Replace atomically so a concurrent registry load never reads half a file.
+    os.replace(tmp, path)
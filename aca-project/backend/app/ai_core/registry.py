@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+import torch
+
+from app.ai_core.model import ConvAutoencoder, has_weights, list_item_weights, load_model, model_nbytes
+from app.core.config import settings
+
+
+logger = logging.getLogger('aca.ai')
+
+DEFAULT = '_default'
+
+
+class ModelStats:
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+        self.loads = 0
+        self.load_ms_total = 0.0
+        self.last_load_ms: float | None = None
+        self.evictions = 0
+        self.last_used: float | None = None
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'fallbacks': self.fallbacks,
+            'loads': self.loads,
+            'avg_load_ms': self.load_ms_total / self.loads if self.loads else None,
+            'last_load_ms': self.last_load_ms,
+            'evictions': self.evictions,
+        }
+
+
+class ModelRegistry:
+    """One autoencoder per item, loaded on demand and kept in an LRU cache under a byte budget.
+
+    An item without its own weights is served by the shared model (counted as a
+    fallback on the shared model's stats, so arbitrary item names from requests
+    never add entries), so new products work before they have been trained. The most
+    recently loaded model is never evicted, even if it alone exceeds the budget.
+    """
+
+    def __init__(self, budget_bytes: int) -> None:
+        self.budget_bytes = budget_bytes
+        self._models: OrderedDict[str, tuple[ConvAutoencoder, int]] = OrderedDict()
+        self._stats: dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+        self._load_locks: dict[str, threading.Lock] = {}
+
+    @staticmethod
+    def resolve(item: str | None) -> str:
+        """Cache key for ``item``: itself if it has weights on disk, otherwise the shared model."""
+        if item is not None and has_weights(item):
+            return item
+        return DEFAULT
+
+    def _stats_for(self, key: str) -> ModelStats:
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = ModelStats()
+        return stats
+
+    def get(self, item: str | None = None) -> ConvAutoencoder:
+        key = self.resolve(item)
+        with self._lock:
+            stats = self._stats_for(key)
+            if item is not None and key == DEFAULT:
+                stats.fallbacks += 1
+            stats.last_used = time.time()
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+                stats.hits += 1
+                return entry[0]
+            stats.misses += 1
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Load outside the registry lock so a slow disk never blocks hits on other items.
+        with load_lock:
+            with self._lock:
+                entry = self._models.get(key)
+                if entry is not None:
+                    self._models.move_to_end(key)
+                    return entry[0]
+            start = time.perf_counter()
+            model = load_model(device=torch.device('cpu'), item=None if key == DEFAULT else key)
+            load_ms = (time.perf_counter() - start) * 1000.0
+            with self._lock:
+                stats.loads += 1
+                stats.load_ms_total += load_ms
+                stats.last_load_ms = load_ms
+                self._insert(key, model)
+            logger.info('model_loaded', extra={'item': key, 'load_ms': load_ms})
+            return model
+
+    def put(self, item: str | None, model: ConvAutoencoder) -> None:
+        """Publish freshly trained weights for ``item`` (``None`` is the shared model)."""
+        model.eval()
+        with self._lock:
+            self._insert(item or DEFAULT, model)
+
+    def _insert(self, key: str, model: ConvAutoencoder) -> None:
+        self._models[key] = (model, model_nbytes(model))
+        self._models.move_to_end(key)
+        used = sum(size for _, size in self._models.values())
+        while used > self.budget_bytes and len(self._models) > 1:
+            evicted, (_, size) = self._models.popitem(last=False)
+            used -= size
+            self._stats_for(evicted).evictions += 1
+            logger.info('model_evicted', extra={'item': evicted, 'bytes': size})
+
+    def describe(self) -> dict[str, Any]:
+        with self._lock:
+            loaded = [{'item': key, 'bytes': size} for key, (_, size) in self._models.items()]
+            stats = {key: s.as_dict() for key, s in self._stats.items()}
+        return {
+            'budget_bytes': self.budget_bytes,
+            'used_bytes': sum(entry['bytes'] for entry in loaded),
+            # Least recently used first, i.e. in eviction order.
+            'loaded': loaded,
+            'available': list_item_weights(),
+            'stats': stats,
+        }
+
+
+_registry: ModelRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry(int(settings.inference_model_cache_mb * 1024 * 1024))
+    return _registry
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from app.api.schemas import ProfilingConfigBody
+from app.core.profiling import profile_store, profiling_config
+
+
+router = APIRouter()
+
+
+@router.get('/admin/profiling')
+async def get_profiling():
+    return profiling_config.as_dict()
+
+
+@router.post('/admin/profiling')
+async def set_profiling(body: ProfilingConfigBody):
+    profiling_config.set(enabled=body.enabled, sample_rate=body.sample_rate)
+    return profiling_config.as_dict()
+
+
+@router.get('/admin/profiles')
+async def list_profiles():
+    return [p.summary() for p in profile_store.list()]
+
+
+@router.delete('/admin/profiles')
+async def clear_profiles():
+    profile_store.clear()
+    return {'cleared': True}
+
+
+@router.get('/admin/profiles/{profile_id}')
+async def download_profile(profile_id: str):
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail='not found')
+    return PlainTextResponse(
+        profile.folded(),
+        headers={'Content-Disposition': f'attachment; filename="profile_{profile.id}.folded"'},
+    )
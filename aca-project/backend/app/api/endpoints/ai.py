@@ -2,10 +2,13 @@
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.ai_core.anomaly import train_async
-from app.api.schemas import AnalyzeBody, AnalyzeResponse
+from app.ai_core.executor import get_inference_executor, get_training_executor
+from app.ai_core.loader import ai_runtime
+from app.api.schemas import AnalyzeBody, AnalyzeResponse, DatasetTrainBody, EvaluateBody, SyntheticTrainBody
 from app.db.session import get_session
+from app.services.evaluation import evaluate_test_split
 from app.services.pipeline import analyze_raw_image
+from app.services.training import train_from_dataset
 
 
 router = APIRouter()
@@ -18,13 +21,55 @@ class TrainBody(BaseModel):
 
 @router.post('/ai/train')
 async def ai_train(body: TrainBody):
-    result = await train_async(epochs=body.epochs, lr=body.lr)
+    anomaly = await ai_runtime.ensure_loaded()
+    result = await anomaly.train_async(epochs=body.epochs, lr=body.lr)
     return result
 
 
+@router.post('/ai/train/dataset')
+async def ai_train_dataset(body: DatasetTrainBody, session: AsyncSession = Depends(get_session)):
+    return await train_from_dataset(
+        session=session,
+        item=body.item,
+        split=body.split,
+        defect_type=body.defect_type,
+        incremental=body.incremental,
+        epochs=body.epochs,
+        lr=body.lr,
+        batch_size=body.batch_size,
+        patience=body.patience,
+    )
+
+
+@router.post('/ai/train/synthetic')
+async def ai_train_synthetic(body: SyntheticTrainBody):
+    anomaly = await ai_runtime.ensure_loaded()
+    return await anomaly.train_synthetic_async(
+        count=body.count,
+        val_count=body.val_count,
+        epochs=body.epochs,
+        lr=body.lr,
+        batch_size=body.batch_size,
+        patience=body.patience,
+        item=body.item,
+        seed=body.seed,
+    )
+
+
+@router.post('/ai/evaluate')
+async def ai_evaluate(body: EvaluateBody, session: AsyncSession = Depends(get_session)):
+    return await evaluate_test_split(
+        session=session,
+        item=body.item,
+        batch_size=body.batch_size,
+        max_images=body.max_images,
+        bins=body.bins,
+    )
+
+
 @router.post('/ai/analyze', response_model=AnalyzeResponse)
 async def ai_analyze(body: AnalyzeBody, session: AsyncSession = Depends(get_session)):
-    result = await analyze_raw_image(session=session, raw_image_id=body.raw_image_id)
+    result = await analyze_raw_image(session=session, raw_image_id=body.raw_image_id, item=body.item)
     if not result.get('found'):
         return AnalyzeResponse(is_anomaly=False, score=0.0, heatmap_url=None, recon_url=None)
     return AnalyzeResponse(
@@ -32,4 +77,24 @@ async def ai_analyze(body: AnalyzeBody, session: AsyncSession = Depends(get_sess
         score=result['score'],
         heatmap_url=result.get('heatmap_url'),
         recon_url=result.get('recon_url'),
+        queue_ms=result.get('queue_ms'),
+        compute_ms=result.get('compute_ms'),
     )
+
+
+@router.get('/ai/executor')
+async def ai_executor_stats():
+    return {
+        'inference': get_inference_executor().get_stats(),
+        'training': get_training_executor().get_stats(),
+    }
+
+
+@router.get('/ai/models')
+async def ai_models():
+    if not ai_runtime.ready:
+        # Reporting an empty cache is not worth importing torch for.
+        return {'ai': ai_runtime.get_status(), 'loaded': []}
+    from app.ai_core.registry import get_model_registry
+
+    return {'ai': ai_runtime.get_status(), **get_model_registry().describe()}
@@ -0,0 +1,58 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.session import get_session
+from app.services import analytics
+
+
+router = APIRouter()
+
+
+@router.get('/analytics/lots')
+async def analytics_lots(limit: int = Query(default=100, le=1000), session: AsyncSession = Depends(get_session)):
+    return await analytics.lot_yields(session, limit=limit)
+
+
+@router.get('/analytics/lots/{lot_number}')
+async def analytics_lot(lot_number: str, session: AsyncSession = Depends(get_session)):
+    result = await analytics.lot_yield(session, lot_number=lot_number)
+    if result is None:
+        raise HTTPException(status_code=404, detail='not found')
+    return result
+
+
+@router.get('/analytics/lots/{lot_number}/image-stats')
+async def analytics_lot_image_stats(lot_number: str, session: AsyncSession = Depends(get_session)):
+    result = await analytics.lot_image_stats(session, lot_number=lot_number)
+    if result is None:
+        raise HTTPException(status_code=404, detail='not found')
+    return result
+
+
+@router.get('/analytics/ng-rate')
+async def analytics_ng_rate(
+    since: datetime | None = Query(default=None),
+    until: datetime | None = Query(default=None),
+    session: AsyncSession = Depends(get_session),
+):
+    return await analytics.ng_rate_series(session, since=since, until=until)
+
+
+@router.get('/analytics/calibration')
+async def analytics_calibration(
+    since: datetime | None = Query(default=None),
+    until: datetime | None = Query(default=None),
+    session: AsyncSession = Depends(get_session),
+):
+    return await analytics.calibration_series(session, since=since, until=until)
+
+
+@router.get('/analytics/image-stats')
+async def analytics_image_stats(
+    since: datetime | None = Query(default=None),
+    until: datetime | None = Query(default=None),
+    session: AsyncSession = Depends(get_session),
+):
+    return await analytics.image_stats_series(session, since=since, until=until)
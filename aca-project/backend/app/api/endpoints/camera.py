@@ -1,9 +1,27 @@
-﻿from fastapi import APIRouter, Depends
+﻿import asyncio
+import uuid
+
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.schemas import CameraParams, CaptureResponse, SimulationModeBody
+from app.api.schemas import (
+    AcquisitionBody,
+    AnalyzeResponse,
+    CameraParams,
+    CaptureResponse,
+    FlatFieldBody,
+    FlatFieldBuildBody,
+    RecordBody,
+    SimulationModeBody,
+)
+from app.core.config import settings
+from app.core.profiling import run_in_thread
 from app.db.session import get_session
+from app.services.acquisition import FrameRef, analyze_latest, get_acquisition, record
 from app.services.camera_driver import get_camera
+from app.services.camera_state import get_camera_state
+from app.services.drift import get_drift_monitor
+from app.services.flat_field import get_flat_field
 
 
 router = APIRouter()
@@ -17,14 +35,138 @@ async def camera_capture(session: AsyncSession = Depends(get_session)):
 
 
 @router.post('/camera/parameters')
-async def camera_parameters(body: CameraParams):
+async def camera_parameters(body: CameraParams, session: AsyncSession = Depends(get_session)):
     camera = get_camera()
-    camera.set_parameters(gain=body.gain, black_level=body.black_level)
-    return {'gain': camera.gain, 'black_level': camera.black_level}
+    state = await get_camera_state().set_parameters(session, camera, gain=body.gain, black_level=body.black_level)
+    return {'gain': float(state['gain']), 'black_level': int(state['black_level'])}
 
 
 @router.post('/camera/simulation')
-async def camera_simulation(body: SimulationModeBody):
+async def camera_simulation(body: SimulationModeBody, session: AsyncSession = Depends(get_session)):
     camera = get_camera()
-    camera.set_mode(body.mode)
-    return {'mode': camera.simulation_mode}
+    state = await get_camera_state().set_mode(session, camera, body.mode)
+    return {'mode': state['simulation_mode']}
+
+
+@router.get('/camera/state')
+async def camera_state(session: AsyncSession = Depends(get_session)):
+    return await get_camera_state().sync(session, get_camera())
+
+
+@router.get('/camera/flat-field')
+async def flat_field_status():
+    return get_flat_field().get_status()
+
+
+@router.post('/camera/flat-field/build')
+async def flat_field_build(body: FlatFieldBuildBody):
+    if get_acquisition().running:
+        raise HTTPException(status_code=409, detail='camera busy; stop acquisition first')
+    # The lease excludes calibrations and sweeps in every worker, not just this one (409 via CameraBusy).
+    async with get_camera_state().lease(get_camera(), f'flat-field-{uuid.uuid4().hex[:12]}', 'flat_field'):
+        return await run_in_thread(get_flat_field().build, body.frames, body.enable)
+
+
+@router.post('/camera/flat-field')
+async def flat_field_enable(body: FlatFieldBody):
+    controller = get_flat_field()
+    if not controller.enable(body.enabled):
+        raise HTTPException(status_code=404, detail='no flat-field map for this camera and resolution; build one first')
+    return controller.get_status()
+
+
+@router.post('/camera/acquisition/start')
+async def acquisition_start(body: AcquisitionBody):
+    acquisition = get_acquisition()
+    started = acquisition.start(fps=body.fps)
+    return {'started': started, **acquisition.get_status()}
+
+
+@router.post('/camera/acquisition/stop')
+async def acquisition_stop():
+    acquisition = get_acquisition()
+    stopped = await acquisition.stop()
+    return {'stopped': stopped, **acquisition.get_status()}
+
+
+@router.get('/camera/acquisition')
+async def acquisition_status():
+    return get_acquisition().get_status()
+
+
+@router.post('/camera/acquisition/analyze', response_model=AnalyzeResponse)
+async def acquisition_analyze(threshold: float = 0.01, item: str | None = None):
+    result = await analyze_latest(get_acquisition(), threshold=threshold, item=item)
+    if result is None:
+        raise HTTPException(status_code=409, detail='no frame available; start acquisition first')
+    return AnalyzeResponse(
+        is_anomaly=result['is_anomaly'],
+        score=result['score'],
+        heatmap_url=result['heatmap_url'],
+        recon_url=result['recon_url'],
+    )
+
+
+@router.post('/camera/acquisition/record')
+async def acquisition_record(body: RecordBody, session: AsyncSession = Depends(get_session)):
+    acquisition = get_acquisition()
+    if not acquisition.running:
+        raise HTTPException(status_code=409, detail='acquisition is not running')
+    return await record(session, acquisition, frames=max(1, body.frames), lot_number=body.lot_number, timeout=body.timeout)
+
+
+@router.get('/camera/drift')
+async def drift_status():
+    return get_drift_monitor().get_status()
+
+
+@router.post('/camera/drift/start')
+async def drift_start():
+    monitor = get_drift_monitor()
+    started = monitor.start()
+    return {'started': started, **monitor.get_status()}
+
+
+@router.post('/camera/drift/stop')
+async def drift_stop():
+    monitor = get_drift_monitor()
+    stopped = await monitor.stop()
+    return {'stopped': stopped, **monitor.get_status()}
+
+
+@router.post('/camera/drift/reset')
+async def drift_reset():
+    monitor = get_drift_monitor()
+    monitor.reset()
+    return monitor.get_status()
+
+
+@router.websocket('/ws/preview')
+async def ws_preview(websocket: WebSocket):
+    """Stream the newest acquisition frame as a JSON header followed by a JPEG; slow clients skip frames."""
+    import cv2
+
+    await websocket.accept()
+    acquisition = get_acquisition()
+    cursor = acquisition.cursor(latest=True)
+    params = [int(cv2.IMWRITE_JPEG_QUALITY), settings.preview_jpeg_quality]
+
+    def _encode(ref: FrameRef) -> bytes | None:
+        ok, jpeg = cv2.imencode('.jpg', ref.image, params)
+        return jpeg.tobytes() if ok and ref.valid() else None
+
+    try:
+        while True:
+            ref = await cursor.next(timeout=1.0)
+            if ref is None:
+                if not acquisition.running:
+                    await websocket.send_json({'status': 'STOPPED'})
+                    await asyncio.sleep(1.0)
+                continue
+            jpeg = await asyncio.to_thread(_encode, ref)
+            if jpeg is None:
+                continue
+            await websocket.send_json({**ref.metadata(), 'skipped': cursor.skipped})
+            await websocket.send_bytes(jpeg)
+    except WebSocketDisconnect:
+        return
@@ -5,7 +5,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.schemas import DatasetImageItem, SaveDatasetBody, SaveDatasetResponse
 from app.db.models import DatasetImage, DatasetSplit, SavedImage
-from app.db.session import get_session
+from app.db.session import get_session, write_transaction
 from app.services.vision_engine import VisionEngine
 
 
@@ -90,7 +90,7 @@ async def save_dataset_image(body: SaveDatasetBody, session: AsyncSession = Depe
     cv2.imwrite(str(out_path), adjusted)
 
     gv_mean = VisionEngine().calc_gv(adjusted)
-    async with session.begin():
+    async with write_transaction(session):
         saved = SavedImage(
             dataset_image_id=row.id,
             file_path=str(out_path),
@@ -102,7 +102,5 @@ async def save_dataset_image(body: SaveDatasetBody, session: AsyncSession = Depe
         )
         session.add(saved)
 
-    await session.refresh(saved)
-
     image_url = f"/static/saved/{out_path.name}"
     return SaveDatasetResponse(saved_image_id=saved.id, image_url=image_url, gv_mean=float(gv_mean))
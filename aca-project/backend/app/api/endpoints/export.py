@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.services.export import ExportUnavailable, check_formats, export_filename, stream_export
+
+
+router = APIRouter()
+
+MEDIA_TYPES = {'zip': 'application/zip', 'tar': 'application/x-tar'}
+
+
+@router.get('/export/results')
+async def export_results(
+    lot_number: str | None = Query(default=None),
+    since: datetime | None = Query(default=None),
+    until: datetime | None = Query(default=None),
+    archive: str = Query(default='zip'),
+    results: str = Query(default='csv'),
+    images: bool = Query(default=True),
+    heatmaps: bool = Query(default=True),
+):
+    try:
+        check_formats(archive, results)
+    except ExportUnavailable as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return StreamingResponse(
+        stream_export(
+            lot_number=lot_number,
+            since=since,
+            until=until,
+            archive=archive,
+            results=results,
+            images=images,
+            heatmaps=heatmaps,
+        ),
+        media_type=MEDIA_TYPES[archive],
+        headers={'Content-Disposition': f'attachment; filename="{export_filename(lot_number, archive)}"'},
+    )
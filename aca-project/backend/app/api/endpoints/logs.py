@@ -1,7 +1,10 @@
 ﻿from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.ai_core.loader import ai_runtime
+from app.core.logging import get_logging_stats
 from app.db.session import get_session
 from app.services.camera_driver import get_camera
 
@@ -19,3 +22,14 @@ async def health_system(session: AsyncSession = Depends(get_session)):
 async def health_camera():
     camera = get_camera()
     return {'status': 'ok', 'camera': camera.get_status()}
+
+
+@router.get('/health/ai')
+async def health_ai():
+    status = ai_runtime.get_status()
+    return JSONResponse(status_code=200 if status['ready'] else 503, content=status)
+
+
+@router.get('/health/logging')
+async def health_logging():
+    return get_logging_stats()
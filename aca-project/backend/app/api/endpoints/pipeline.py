@@ -1,9 +1,14 @@
-from fastapi import APIRouter, Depends, File, Form, UploadFile
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.db.models import RawImageStatus, Verdict
 from app.db.session import get_session
+from app.services.hot_folder import get_hot_folder_watcher
 from app.services.pipeline import analyze_raw_image, ingest_image
+from app.services.records import query_inspections, query_raw_images
 
 
 router = APIRouter()
@@ -12,20 +17,101 @@ router = APIRouter()
 class AnalyzePipelineBody(BaseModel):
     raw_image_id: int
     threshold: float | None = 0.01
+    item: str | None = None
 
 
 @router.post('/pipeline/ingest')
 async def pipeline_ingest(
     file: UploadFile = File(...),
     lot_number: str | None = Form(default=None),
+    item: str | None = Form(default=None),
     session: AsyncSession = Depends(get_session),
 ):
     data = await file.read()
-    result = await ingest_image(session=session, file_bytes=data, filename=file.filename or 'upload.png', lot_number=lot_number)
+    result = await ingest_image(session=session, file_bytes=data, filename=file.filename or 'upload.png', lot_number=lot_number, item=item)
     return result
 
 
 @router.post('/pipeline/analyze')
 async def pipeline_analyze(body: AnalyzePipelineBody, session: AsyncSession = Depends(get_session)):
-    result = await analyze_raw_image(session=session, raw_image_id=body.raw_image_id, threshold=body.threshold or 0.01)
+    result = await analyze_raw_image(session=session, raw_image_id=body.raw_image_id, threshold=body.threshold or 0.01, item=body.item)
     return result
+
+
+@router.get('/pipeline/raw-images')
+async def pipeline_raw_images(
+    lot_number: str | None = Query(default=None),
+    since: datetime | None = Query(default=None),
+    until: datetime | None = Query(default=None),
+    status: RawImageStatus | None = Query(default=None),
+    verdict: Verdict | None = Query(default=None),
+    min_score: float | None = Query(default=None),
+    max_score: float | None = Query(default=None),
+    limit: int = Query(default=100, ge=1, le=1000),
+    cursor: str | None = Query(default=None),
+    session: AsyncSession = Depends(get_session),
+):
+    try:
+        return await query_raw_images(
+            session,
+            lot_number=lot_number,
+            since=since,
+            until=until,
+            status=status,
+            verdict=verdict,
+            min_score=min_score,
+            max_score=max_score,
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.get('/pipeline/inspections')
+async def pipeline_inspections(
+    lot_number: str | None = Query(default=None),
+    since: datetime | None = Query(default=None),
+    until: datetime | None = Query(default=None),
+    verdict: Verdict | None = Query(default=None),
+    min_score: float | None = Query(default=None),
+    max_score: float | None = Query(default=None),
+    limit: int = Query(default=100, ge=1, le=1000),
+    cursor: str | None = Query(default=None),
+    session: AsyncSession = Depends(get_session),
+):
+    try:
+        return await query_inspections(
+            session,
+            lot_number=lot_number,
+            since=since,
+            until=until,
+            verdict=verdict,
+            min_score=min_score,
+            max_score=max_score,
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.get('/pipeline/hot-folder')
+async def hot_folder_status():
+    return get_hot_folder_watcher().get_status()
+
+
+@router.post('/pipeline/hot-folder/start')
+async def hot_folder_start():
+    watcher = get_hot_folder_watcher()
+    if not watcher.folders:
+        raise HTTPException(status_code=409, detail='no folders configured (HOT_FOLDER_PATHS)')
+    started = watcher.start()
+    return {'started': started, **watcher.get_status()}
+
+
+@router.post('/pipeline/hot-folder/stop')
+async def hot_folder_stop():
+    watcher = get_hot_folder_watcher()
+    await watcher.stop()
+    return watcher.get_status()
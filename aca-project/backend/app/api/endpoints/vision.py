@@ -1,40 +1,168 @@
-﻿from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+﻿import asyncio
+import uuid
+
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.schemas import AutoCalibrateBody, AutoCalibrateResponse
+from app.api.schemas import AutoCalibrateBody, AutoCalibrateResponse, CalibrationSweepBody
 from app.db.session import get_session
-from app.services.calibration import CalibrationAgent
+from app.services.calibration_runs import TERMINAL_STATUSES, CalibrationRun, get_run_manager
+from app.services.calibration_sweep import CalibrationSweep
+from app.services.camera_driver import get_camera
+from app.services.camera_state import CameraBusy, get_camera_state
+from app.services.warm_start import get_warm_start_index
 
 
 router = APIRouter()
 
 
 @router.post('/process/auto-calibrate', response_model=AutoCalibrateResponse)
-async def auto_calibrate(body: AutoCalibrateBody, session: AsyncSession = Depends(get_session)):
-    agent = CalibrationAgent()
-    result = await agent.run_auto_calibration(
-        session=session,
+async def auto_calibrate(body: AutoCalibrateBody):
+    run, created = await get_run_manager().start(
         target_gv=body.target_gv,
         tolerance=body.tolerance or 2.0,
         max_iterations=body.max_iterations or 20,
+        warm_start=body.warm_start,
+    )
+    if not created:
+        raise HTTPException(status_code=409, detail={'message': 'calibration already running', 'run_id': run.id})
+    queue = run.subscribe()
+    try:
+        while True:
+            last = await queue.get()
+            if last['status'] in TERMINAL_STATUSES:
+                break
+    finally:
+        run.unsubscribe(queue)
+    return AutoCalibrateResponse(
+        status=last['status'],
+        step=last['step'],
+        current_gv=last['current_gv'],
+        target_gv=body.target_gv,
+        image_url=last['image_url'],
+        warm_started=bool(last.get('warm_started')),
+        run_id=run.id,
+    )
+
+
+@router.post('/calibration/runs')
+async def start_calibration_run(body: AutoCalibrateBody):
+    run, created = await get_run_manager().start(
+        target_gv=body.target_gv,
+        tolerance=body.tolerance or 2.0,
+        max_iterations=body.max_iterations or 20,
+        warm_start=body.warm_start,
+    )
+    return {'created': created, **run.summary()}
+
+
+@router.get('/calibration/runs')
+async def list_calibration_runs():
+    return [run.summary() for run in get_run_manager().list()]
+
+
+@router.get('/calibration/runs/{run_id}')
+async def get_calibration_run(run_id: str):
+    run = get_run_manager().get(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail='not found')
+    return run.summary()
+
+
+@router.post('/calibration/runs/{run_id}/cancel')
+async def cancel_calibration_run(run_id: str):
+    run = get_run_manager().get(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail='not found')
+    return {'run_id': run.id, 'cancelled': run.cancel()}
+
+
+@router.post('/process/calibration-sweep')
+async def calibration_sweep(body: CalibrationSweepBody, session: AsyncSession = Depends(get_session)):
+    active = get_run_manager().active
+    if active is not None and not active.done:
+        raise HTTPException(status_code=409, detail={'message': 'calibration already running', 'run_id': active.id})
+    sweep = CalibrationSweep(
+        gain_range=(body.gain_min, body.gain_max),
+        black_level_range=(body.black_level_min, body.black_level_max),
     )
-    return result
+    async with get_camera_state().lease(get_camera(), f'sweep-{uuid.uuid4().hex[:12]}', 'sweep'):
+        return await sweep.run(
+            session=session,
+            targets=body.targets,
+            tolerance=body.tolerance,
+            max_captures=body.max_captures,
+            black_level=body.black_level,
+            verify=body.verify,
+        )
 
 
 @router.websocket('/ws/calibration')
 async def ws_calibration(websocket: WebSocket):
+    """Subscribe to a calibration run.
+
+    The first message either names ``run_id`` to follow or carries run parameters;
+    parameters join the active run if one is already driving the camera.
+    Afterwards the client may send ``{"action": "cancel"}``.
+    """
     await websocket.accept()
-    agent = CalibrationAgent()
+    manager = get_run_manager()
     try:
         init = await websocket.receive_json()
-        target_gv = float(init.get('target_gv', 140.0))
-        tolerance = float(init.get('tolerance', 2.0))
-        max_iterations = int(init.get('max_iterations', 20))
-        await agent.stream_to_websocket(
-            websocket=websocket,
-            target_gv=target_gv,
-            tolerance=tolerance,
-            max_iterations=max_iterations,
-        )
     except WebSocketDisconnect:
         return
+
+    if init.get('run_id'):
+        run = manager.get(str(init['run_id']))
+        if run is None:
+            await websocket.send_json({'status': 'ERROR', 'message': 'run not found', 'run_id': init['run_id']})
+            return
+    else:
+        try:
+            run, _ = await manager.start(
+                target_gv=float(init.get('target_gv', 140.0)),
+                tolerance=float(init.get('tolerance', 2.0)),
+                max_iterations=int(init.get('max_iterations', 20)),
+                warm_start=bool(init.get('warm_start', True)),
+            )
+        except CameraBusy as exc:
+            # The active run lives in another worker; its steps cannot be followed from here.
+            await websocket.send_json({'status': 'ERROR', 'message': 'camera busy in another worker', 'holder': exc.holder})
+            return
+
+    queue = run.subscribe()
+    sender = asyncio.create_task(_forward_steps(websocket, queue))
+    receiver = asyncio.create_task(_receive_commands(websocket, run))
+    try:
+        _, pending = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+    finally:
+        run.unsubscribe(queue)
+
+
+async def _forward_steps(websocket: WebSocket, queue: asyncio.Queue) -> None:
+    while True:
+        message = await queue.get()
+        await websocket.send_json(message)
+        if message['status'] in TERMINAL_STATUSES:
+            return
+
+
+async def _receive_commands(websocket: WebSocket, run: CalibrationRun) -> None:
+    try:
+        while True:
+            try:
+                command = await websocket.receive_json()
+            except ValueError:
+                # Not JSON: ignore it rather than drop the subscription.
+                continue
+            if isinstance(command, dict) and command.get('action') == 'cancel':
+                run.cancel()
+    except WebSocketDisconnect:
+        return
+
+
+@router.get('/process/warm-start')
+async def warm_start_status():
+    return get_warm_start_index().get_status()
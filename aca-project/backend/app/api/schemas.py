@@ -1,6 +1,8 @@
 ﻿from enum import Enum
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+from app.db.models import DatasetSplit
 
 
 class SimulationMode(str, Enum):
@@ -33,6 +35,7 @@ class AutoCalibrateBody(BaseModel):
     target_gv: float
     tolerance: float | None = 2.0
     max_iterations: int | None = 20
+    warm_start: bool = True
 
 
 class AutoCalibrateResponse(BaseModel):
@@ -41,6 +44,39 @@ class AutoCalibrateResponse(BaseModel):
     current_gv: float
     target_gv: float
     image_url: str | None
+    warm_started: bool = False
+    run_id: str | None = None
+
+
+class CalibrationSweepBody(BaseModel):
+    targets: list[float]
+    tolerance: float = 2.0
+    max_captures: int = 12
+    gain_min: float = 0.0
+    gain_max: float = 24.0
+    black_level_min: int = 0
+    black_level_max: int = 60
+    black_level: int | None = None
+    verify: bool = True
+
+
+class AcquisitionBody(BaseModel):
+    fps: float | None = None
+
+
+class RecordBody(BaseModel):
+    frames: int = 10
+    lot_number: str | None = None
+    timeout: float = 5.0
+
+
+class FlatFieldBuildBody(BaseModel):
+    frames: int | None = None
+    enable: bool = True
+
+
+class FlatFieldBody(BaseModel):
+    enabled: bool
 
 
 class SimulationModeBody(BaseModel):
@@ -49,6 +85,7 @@ class SimulationModeBody(BaseModel):
 
 class AnalyzeBody(BaseModel):
     raw_image_id: int
+    item: str | None = None
 
 
 class AnalyzeResponse(BaseModel):
@@ -56,6 +93,38 @@ class AnalyzeResponse(BaseModel):
     score: float
     heatmap_url: str | None
     recon_url: str | None
+    queue_ms: float | None = None
+    compute_ms: float | None = None
+
+
+class DatasetTrainBody(BaseModel):
+    item: str | None = None
+    split: DatasetSplit = DatasetSplit.TRAIN
+    defect_type: str | None = 'good'
+    incremental: bool = True
+    epochs: int = Field(20, ge=1)
+    lr: float = Field(1e-3, gt=0)
+    batch_size: int = Field(16, ge=1)
+    patience: int = Field(3, ge=0)
+
+
+class SyntheticTrainBody(BaseModel):
+    item: str | None = None
+    # Held in memory as uint8 256x256 frames: 5000 is ~330 MB.
+    count: int = Field(512, ge=1, le=5000)
+    val_count: int = Field(64, ge=0, le=1000)
+    epochs: int = Field(20, ge=1)
+    lr: float = Field(1e-3, gt=0)
+    batch_size: int = Field(16, ge=1)
+    patience: int = Field(3, ge=0)
+    seed: int | None = None
+
+
+class EvaluateBody(BaseModel):
+    item: str | None = None
+    batch_size: int = Field(32, ge=1)
+    max_images: int | None = Field(None, ge=1)
+    bins: int = Field(1000, ge=1)
 
 
 class DatasetImageItem(BaseModel):
@@ -79,3 +148,8 @@ class SaveDatasetResponse(BaseModel):
     saved_image_id: int
     image_url: str
     gv_mean: float
+
+
+class ProfilingConfigBody(BaseModel):
+    enabled: bool
+    sample_rate: float = 1.0
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any
+
+from app.core.config import settings
+
+
+# Attributes every LogRecord has; anything else on a record came from ``extra``.
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'taskName'}
+
+
+def parse_event_map(text: str) -> dict[str, float]:
+    """``'capture=0.1,calibration_step=0.5'`` -> ``{'capture': 0.1, 'calibration_step': 0.5}``."""
+    result = {}
+    for part in filter(None, (p.strip() for p in text.split(','))):
+        name, _, value = part.partition('=')
+        result[name.strip()] = float(value)
+    return result
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, event (the message) and the ``extra`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage(),
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Per-event sampling (keep 1 in ``1/rate``) and rate limits (events per second), keyed by the message.
+
+    Runs on the caller's thread before anything is queued, so a suppressed event
+    costs a dict lookup. Warnings and errors always pass.
+    """
+
+    def __init__(self, sample: dict[str, float], rate_limits: dict[str, float]) -> None:
+        super().__init__()
+        self.sample = {event: max(0.0, min(1.0, rate)) for event, rate in sample.items()}
+        self.rate_limits = {event: max(0.0, limit) for event, limit in rate_limits.items()}
+        self._seen: Counter[str] = Counter()
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self.suppressed: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        event = record.msg if isinstance(record.msg, str) else None
+        rate = self.sample.get(event)
+        limit = self.rate_limits.get(event)
+        if rate is None and limit is None:
+            return True
+        with self._lock:
+            if rate is not None:
+                self._seen[event] += 1
+                # Deterministic 1-in-N rather than random so low rates still log the first occurrence.
+                every = 1.0 / rate if rate > 0 else float('inf')
+                if (self._seen[event] - 1) % every >= 1:
+                    self.suppressed[event] += 1
+                    return False
+            if limit is not None:
+                now = time.monotonic()
+                tokens, last = self._buckets.get(event, (limit, now))
+                tokens = min(limit, tokens + (now - last) * limit)
+                if tokens < 1.0:
+                    self._buckets[event] = (tokens, now)
+                    self.suppressed[event] += 1
+                    return False
+                self._buckets[event] = (tokens - 1.0, now)
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue without blocking; when the writer falls behind the record is dropped and counted.
+
+    Formatting is left to the listener thread: the record goes onto the queue as is
+    instead of being rendered here, which is what keeps the caller's cost flat.
+    """
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.enqueued = 0
+        self.dropped: Counter[str] = Counter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped[record.levelname] += 1
+
+
+class FlushingQueueListener(logging.handlers.QueueListener):
+    """``QueueListener`` whose stop waits for room for its sentinel instead of failing on a full queue.
+
+    The base class posts the sentinel with ``put_nowait``, which raises ``queue.Full``
+    exactly when a flush matters most. The writer thread is still draining while we
+    wait, so room appears unless it is stuck, in which case ``stop`` gives up.
+    """
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel, timeout=5.0)
+
+
+class LoggingPipeline:
+    def __init__(self) -> None:
+        self.queue: queue.Queue | None = None
+        self.handler: DroppingQueueHandler | None = None
+        self.sampler: SamplingFilter | None = None
+        self.listener: FlushingQueueListener | None = None
+
+    def start(self) -> None:
+        if self.listener is not None:
+            return
+        output = logging.StreamHandler(sys.stderr)
+        if settings.log_format == 'json':
+            output.setFormatter(JsonFormatter())
+        else:
+            output.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s'))
+
+        self.queue = queue.Queue(maxsize=max(1, settings.log_queue_size))
+        self.handler = DroppingQueueHandler(self.queue)
+        self.sampler = SamplingFilter(parse_event_map(settings.log_sample), parse_event_map(settings.log_rate_limit))
+        self.handler.addFilter(self.sampler)
+
+        root = logging.getLogger()
+        root.setLevel(getattr(logging, settings.log_level.upper(), logging.INFO))
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(self.handler)
+
+        self.listener = FlushingQueueListener(self.queue, output, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self) -> None:
+        """Flush what is queued and stop the writer thread; ``start`` builds a fresh pipeline."""
+        if self.listener is not None:
+            logging.getLogger().removeHandler(self.handler)
+            listener, self.listener = self.listener, None
+            try:
+                listener.stop()
+            except queue.Full:
+                # The writer made no progress for the whole timeout; leave its daemon thread rather than hang shutdown.
+                pass
+
+    def get_stats(self) -> dict[str, Any]:
+        if self.handler is None:
+            return {'running': False}
+        return {
+            'running': self.listener is not None,
+            'format': settings.log_format,
+            'queue_size': self.queue.qsize(),
+            'queue_capacity': self.queue.maxsize,
+            'enqueued': self.handler.enqueued,
+            'dropped': sum(self.handler.dropped.values()),
+            'dropped_by_level': dict(self.handler.dropped),
+            'suppressed': dict(self.sampler.suppressed),
+            'sample': self.sampler.sample,
+            'rate_limits': self.sampler.rate_limits,
+        }
+
+
+log_pipeline = LoggingPipeline()
+
+
+def setup_logging() -> None:
+    log_pipeline.start()
+
+
+def shutdown_logging() -> None:
+    log_pipeline.stop()
+
+
+def get_logging_stats() -> dict[str, Any]:
+    return log_pipeline.get_stats()
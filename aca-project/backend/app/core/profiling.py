@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import asyncio
+import hmac
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable
+
+from app.core.config import settings
+
+
+_active_profile: ContextVar['Profile | None'] = ContextVar('aca_active_profile', default=None)
+
+
+@dataclass
+class Profile:
+    id: str
+    method: str
+    path: str
+    started_at: datetime
+    interval: float
+    duration_ms: float = 0.0
+    sample_count: int = 0
+    stacks: Counter = field(default_factory=Counter)
+    _threads: dict[int, str] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def attach_thread(self, role: str) -> None:
+        with self._lock:
+            self._threads[threading.get_ident()] = role
+
+    def detach_thread(self) -> None:
+        with self._lock:
+            self._threads.pop(threading.get_ident(), None)
+
+    def sample(self) -> None:
+        with self._lock:
+            threads = dict(self._threads)
+        frames = sys._current_frames()
+        for ident, role in threads.items():
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({code.co_filename}:{frame.f_lineno})')
+                frame = frame.f_back
+            stack.append(role)
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.sample_count += 1
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'started_at': self.started_at.isoformat(),
+            'duration_ms': self.duration_ms,
+            'interval_ms': self.interval * 1000.0,
+            'sample_count': self.sample_count,
+        }
+
+    def folded(self) -> str:
+        # Brendan Gregg's folded stack format, readable by flamegraph.pl and speedscope.
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, profile: Profile) -> None:
+        super().__init__(name=f'aca-profiler-{profile.id}', daemon=True)
+        self.profile = profile
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.profile.interval):
+            self.profile.sample()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+class ProfileStore:
+    def __init__(self, size: int) -> None:
+        self._profiles: deque[Profile] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, profile: Profile) -> None:
+        with self._lock:
+            self._profiles.append(profile)
+
+    def list(self) -> list[Profile]:
+        with self._lock:
+            return list(reversed(self._profiles))
+
+    def get(self, profile_id: str) -> Profile | None:
+        with self._lock:
+            for profile in self._profiles:
+                if profile.id == profile_id:
+                    return profile
+        return None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._profiles.clear()
+
+
+class ProfilingConfig:
+    def __init__(self) -> None:
+        self.enabled = settings.profile_enabled
+        self.sample_rate = settings.profile_sample_rate
+
+    def set(self, enabled: bool, sample_rate: float) -> None:
+        self.sample_rate = float(max(0.0, min(1.0, sample_rate)))
+        self.enabled = bool(enabled)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'header': settings.profile_header,
+            'interval_ms': settings.profile_interval_ms,
+            'ring_size': settings.profile_ring_size,
+        }
+
+
+profiling_config = ProfilingConfig()
+profile_store = ProfileStore(settings.profile_ring_size)
+
+
+def wrap_for_thread(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Attach the worker thread to the active profile (if any) while ``func`` runs."""
+    profile = _active_profile.get()
+    if profile is None:
+        return func
+
+    def traced(*args, **kwargs):
+        profile.attach_thread('worker')
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.detach_thread()
+
+    return traced
+
+
+async def run_in_thread(func: Callable[..., Any], *args) -> Any:
+    return await asyncio.to_thread(wrap_for_thread(func), *args)
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware so the disabled path costs one flag check per request."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self.header = settings.profile_header.lower().encode('latin-1')
+        self.token = settings.profile_token.encode('latin-1')
+
+    def _wants_profile(self, scope) -> bool:
+        config = profiling_config
+        if not config.enabled:
+            return False
+        for name, value in scope.get('headers', ()):
+            if name == self.header:
+                if self.token:
+                    # With a token configured the header must carry it, not just any truthy value.
+                    return hmac.compare_digest(value, self.token)
+                return value not in (b'', b'0', b'false')
+        return config.sample_rate > 0.0 and random.random() < config.sample_rate
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] != 'http' or not self._wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(
+            id=uuid.uuid4().hex[:12],
+            method=scope.get('method', ''),
+            path=scope.get('path', ''),
+            started_at=datetime.utcnow(),
+            interval=max(0.001, settings.profile_interval_ms / 1000.0),
+        )
+        profile.attach_thread('event_loop')
+        token = _active_profile.set(profile)
+        sampler = _Sampler(profile)
+        sampler.start()
+
+        async def send_with_id(message) -> None:
+            if message['type'] == 'http.response.start':
+                headers = list(message.get('headers', []))
+                headers.append((b'x-aca-profile-id', profile.id.encode('latin-1')))
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.duration_ms = (time.perf_counter() - start) * 1000.0
+            _active_profile.reset(token)
+            sampler.stop()
+            profile.detach_thread()
+            profile_store.add(profile)
@@ -1,5 +1,40 @@
-﻿from sqlalchemy.orm import DeclarativeBase
+﻿import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import DeclarativeBase
+
+
+logger = logging.getLogger('aca.db')
 
 
 class Base(DeclarativeBase):
     pass
+
+
+def _add_missing_columns(connection) -> None:
+    """``ALTER TABLE .. ADD COLUMN`` for nullable columns added to tables that already exist."""
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    ddl = connection.dialect.ddl_compiler(connection.dialect, None)
+    preparer = connection.dialect.identifier_preparer
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in present:
+                continue
+            if not column.nullable and column.server_default is None:
+                logger.warning('schema_column_missing', extra={'table': table.name, 'column': column.name})
+                continue
+            connection.execute(text(f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl.get_column_specification(column)}'))
+            logger.info('schema_column_added', extra={'table': table.name, 'column': column.name})
+
+
+def create_schema(connection) -> None:
+    """``create_all`` plus the nullable columns and indexes added later to tables that already exist, which ``create_all`` skips."""
+    Base.metadata.create_all(connection)
+    _add_missing_columns(connection)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
@@ -1,7 +1,7 @@
 ﻿import enum
 from datetime import datetime
 
-from sqlalchemy import DateTime, Enum, Float, ForeignKey, Integer, String
+from sqlalchemy import BigInteger, DateTime, Enum, Float, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
@@ -25,6 +25,12 @@ class DatasetSplit(str, enum.Enum):
 
 class RawImage(Base):
     __tablename__ = 'raw_images'
+    # Each index ends in the (timestamp, id) keyset order so filtered pages are index range scans.
+    __table_args__ = (
+        Index('ix_raw_images_timestamp_id', 'timestamp', 'id'),
+        Index('ix_raw_images_lot_timestamp_id', 'lot_number', 'timestamp', 'id'),
+        Index('ix_raw_images_status_timestamp_id', 'status', 'timestamp', 'id'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     lot_number: Mapped[str | None] = mapped_column(String(64), nullable=True)
@@ -38,6 +44,13 @@ class RawImage(Base):
 
 class InspectionResult(Base):
     __tablename__ = 'inspection_results'
+    __table_args__ = (
+        # Latest inspection per raw image is a seek on this index.
+        Index('ix_inspection_results_raw_image_id_id', 'raw_image_id', 'id'),
+        Index('ix_inspection_results_verdict_id', 'verdict', 'id'),
+        Index('ix_inspection_results_score', 'anomaly_score'),
+        Index('ix_inspection_results_created_at', 'created_at'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     raw_image_id: Mapped[int] = mapped_column(ForeignKey('raw_images.id'))
@@ -61,11 +74,27 @@ class CalibrationLog(Base):
     gain_applied: Mapped[float] = mapped_column(Float)
     black_level_applied: Mapped[float] = mapped_column(Float)
     converged: Mapped[bool] = mapped_column(default=False)
+    camera_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    simulation_mode: Mapped[str | None] = mapped_column(String(32), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     inspection_result: Mapped[InspectionResult] = relationship(back_populates='calibration_logs')
 
 
+class CalibrationRecipe(Base):
+    __tablename__ = 'calibration_recipes'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    sweep_id: Mapped[str] = mapped_column(String(32), index=True)
+    camera_id: Mapped[str] = mapped_column(String(64))
+    simulation_mode: Mapped[str] = mapped_column(String(32))
+    target_gv: Mapped[float] = mapped_column(Float)
+    gain: Mapped[float] = mapped_column(Float)
+    black_level: Mapped[float] = mapped_column(Float)
+    predicted_gv: Mapped[float] = mapped_column(Float)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
 class DatasetImage(Base):
     __tablename__ = 'dataset_images'
 
@@ -78,6 +107,52 @@ class DatasetImage(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 
+class CameraState(Base):
+    """Shared camera settings and the run lease; every API worker reads and writes this row, not its own copy."""
+
+    __tablename__ = 'camera_states'
+
+    camera_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    gain: Mapped[float] = mapped_column(Float, default=8.0)
+    black_level: Mapped[int] = mapped_column(Integer, default=10)
+    simulation_mode: Mapped[str] = mapped_column(String(32), default='CLEAN')
+    capture_count: Mapped[int] = mapped_column(BigInteger, default=0)
+    version: Mapped[int] = mapped_column(Integer, default=0)
+    lease_owner: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    lease_kind: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    lease_worker: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class LotItem(Base):
+    """Which item (product) a lot is, so analysis can pick that item's model."""
+
+    __tablename__ = 'lot_items'
+
+    lot_number: Mapped[str] = mapped_column(String(64), primary_key=True)
+    item: Mapped[str] = mapped_column(String(64), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class TrainingRun(Base):
+    __tablename__ = 'training_runs'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    item: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    split: Mapped[DatasetSplit] = mapped_column(Enum(DatasetSplit), nullable=False)
+    defect_type: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    incremental: Mapped[bool] = mapped_column(default=False)
+    trained: Mapped[bool] = mapped_column(default=False)
+    image_count: Mapped[int] = mapped_column(Integer, default=0)
+    val_count: Mapped[int] = mapped_column(Integer, default=0)
+    last_dataset_image_id: Mapped[int] = mapped_column(Integer, default=0)
+    epochs_run: Mapped[int] = mapped_column(Integer, default=0)
+    best_val_loss: Mapped[float | None] = mapped_column(Float, nullable=True)
+    duration_s: Mapped[float] = mapped_column(Float, default=0.0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
 class SavedImage(Base):
     __tablename__ = 'saved_images'
 
@@ -90,3 +165,90 @@ class SavedImage(Base):
     is_auto_calibration: Mapped[bool] = mapped_column(default=False)
     note: Mapped[str | None] = mapped_column(String(255), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class LotRollup(Base):
+    __tablename__ = 'lot_rollups'
+
+    lot_number: Mapped[str] = mapped_column(String(64), primary_key=True)
+    verdict: Mapped[Verdict] = mapped_column(Enum(Verdict), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0)
+    score_sum: Mapped[float] = mapped_column(Float, default=0.0)
+    first_seen: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    last_seen: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class HourlyInspectionRollup(Base):
+    __tablename__ = 'hourly_inspection_rollups'
+
+    bucket: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    verdict: Mapped[Verdict] = mapped_column(Enum(Verdict), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0)
+    score_sum: Mapped[float] = mapped_column(Float, default=0.0)
+
+
+class HourlyCalibrationRollup(Base):
+    __tablename__ = 'hourly_calibration_rollups'
+
+    bucket: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    runs: Mapped[int] = mapped_column(Integer, default=0)
+    converged: Mapped[int] = mapped_column(Integer, default=0)
+    target_gv_sum: Mapped[float] = mapped_column(Float, default=0.0)
+    initial_error_sum: Mapped[float] = mapped_column(Float, default=0.0)
+    final_error_sum: Mapped[float] = mapped_column(Float, default=0.0)
+    final_abs_error_sum: Mapped[float] = mapped_column(Float, default=0.0)
+
+
+class LotImageStats(Base):
+    __tablename__ = 'lot_image_stats'
+
+    lot_number: Mapped[str] = mapped_column(String(64), primary_key=True)
+    images: Mapped[int] = mapped_column(Integer, default=0)
+    pixels: Mapped[int] = mapped_column(BigInteger, default=0)
+    gv_sum: Mapped[float] = mapped_column(Float, default=0.0)
+    gv_sumsq: Mapped[float] = mapped_column(Float, default=0.0)
+    saturated_low: Mapped[int] = mapped_column(BigInteger, default=0)
+    saturated_high: Mapped[int] = mapped_column(BigInteger, default=0)
+    first_seen: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    last_seen: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class LotGVHistogram(Base):
+    __tablename__ = 'lot_gv_histograms'
+
+    lot_number: Mapped[str] = mapped_column(String(64), primary_key=True)
+    level: Mapped[int] = mapped_column(Integer, primary_key=True)
+    count: Mapped[int] = mapped_column(BigInteger, default=0)
+
+
+class HourlyImageStats(Base):
+    __tablename__ = 'hourly_image_stats'
+
+    bucket: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    images: Mapped[int] = mapped_column(Integer, default=0)
+    pixels: Mapped[int] = mapped_column(BigInteger, default=0)
+    gv_sum: Mapped[float] = mapped_column(Float, default=0.0)
+    gv_sumsq: Mapped[float] = mapped_column(Float, default=0.0)
+    saturated_low: Mapped[int] = mapped_column(BigInteger, default=0)
+    saturated_high: Mapped[int] = mapped_column(BigInteger, default=0)
+
+
+class HourlyGVHistogram(Base):
+    __tablename__ = 'hourly_gv_histograms'
+
+    bucket: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    level: Mapped[int] = mapped_column(Integer, primary_key=True)
+    count: Mapped[int] = mapped_column(BigInteger, default=0)
+
+
+class HotFolderFile(Base):
+    """Every file the hot-folder watcher has taken (or rejected), so a restart resumes instead of re-ingesting."""
+
+    __tablename__ = 'hot_folder_files'
+
+    path: Mapped[str] = mapped_column(String(255), primary_key=True)
+    raw_image_id: Mapped[int | None] = mapped_column(ForeignKey('raw_images.id'), nullable=True)
+    size: Mapped[int] = mapped_column(BigInteger, default=0)
+    mtime_ns: Mapped[int] = mapped_column(BigInteger, default=0)
+    error: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -1,9 +1,61 @@
-﻿from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+﻿from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from app.core.config import settings
 
 
-engine = create_async_engine(settings.database_url, echo=False, future=True)
+database_url = make_url(settings.database_url)
+is_sqlite = database_url.get_backend_name() == 'sqlite'
+
+
+def _create_sqlite_engine():
+    if database_url.database and database_url.database != ':memory:':
+        Path(database_url.database).parent.mkdir(parents=True, exist_ok=True)
+
+    sqlite_engine = create_async_engine(
+        database_url,
+        echo=False,
+        future=True,
+        connect_args={'timeout': settings.sqlite_busy_timeout_ms / 1000.0},
+    )
+
+    @event.listens_for(sqlite_engine.sync_engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, _connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}')
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.execute(f'PRAGMA cache_size=-{int(settings.sqlite_cache_size_kb)}')
+        cursor.execute(f'PRAGMA mmap_size={int(settings.sqlite_mmap_size_mb) * 1024 * 1024}')
+        cursor.close()
+
+    return sqlite_engine
+
+
+def _create_postgres_engine():
+    return create_async_engine(
+        database_url,
+        echo=False,
+        future=True,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+    )
+
+
+engine = _create_sqlite_engine() if is_sqlite else _create_postgres_engine()
 
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
@@ -12,6 +64,23 @@ AsyncSessionLocal = async_sessionmaker(
     class_=AsyncSession,
 )
 
+# SQLite allows a single writer; queueing writers here keeps them off the busy handler.
+_sqlite_write_lock = asyncio.Lock() if is_sqlite else None
+
+
+@asynccontextmanager
+async def write_transaction(session: AsyncSession) -> AsyncIterator[AsyncSession]:
+    """Begin a write transaction, closing any read transaction the session autobegan."""
+    if session.in_transaction():
+        await session.commit()
+    if _sqlite_write_lock is None:
+        async with session.begin():
+            yield session
+        return
+    async with _sqlite_write_lock:
+        async with session.begin():
+            yield session
+
 
 async def get_session() -> AsyncSession:
     async with AsyncSessionLocal() as session:
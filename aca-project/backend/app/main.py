@@ -1,20 +1,25 @@
 ﻿import logging
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 
-from app.api.endpoints import ai, camera, dataset, logs, pipeline, vision
+from app.ai_core.executor import InferenceQueueFull, get_inference_executor, get_training_executor
+from app.ai_core.loader import ai_runtime
+from app.api.endpoints import admin, ai, analytics, camera, dataset, export, logs, pipeline, vision
 from app.core.config import settings
-from app.db.base import Base
-from app.db.session import engine
-
-
-def setup_logging() -> None:
-    logging.basicConfig(
-        level=getattr(logging, settings.log_level.upper(), logging.INFO),
-        format='%(asctime)s %(levelname)s %(name)s %(message)s',
-    )
+from app.core.logging import setup_logging, shutdown_logging
+from app.core.profiling import ProfilingMiddleware
+from app.db.base import create_schema
+from app.db.session import AsyncSessionLocal, engine
+from app.services.acquisition import get_acquisition
+from app.services.camera_driver import get_camera
+from app.services.camera_state import CameraBusy, get_camera_state
+from app.services.drift import get_drift_monitor
+from app.services.flat_field import get_flat_field
+from app.services.hot_folder import get_hot_folder_watcher
+from app.services.warm_start import get_warm_start_index
 
 
 setup_logging()
@@ -26,7 +31,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=['*'],
     allow_headers=['*'],
+    expose_headers=['X-ACA-Profile-Id'],
 )
+app.add_middleware(ProfilingMiddleware)
 
 app.include_router(logs.router)
 app.include_router(camera.router)
@@ -34,11 +41,51 @@ app.include_router(vision.router)
 app.include_router(pipeline.router)
 app.include_router(ai.router)
 app.include_router(dataset.router)
+app.include_router(analytics.router)
+app.include_router(export.router)
+app.include_router(admin.router)
+
+
+@app.exception_handler(InferenceQueueFull)
+async def inference_queue_full(request: Request, exc: InferenceQueueFull) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={'detail': str(exc), 'executor': exc.executor, 'retry_after': exc.retry_after},
+        headers={'Retry-After': str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(CameraBusy)
+async def camera_busy(request: Request, exc: CameraBusy) -> JSONResponse:
+    return JSONResponse(status_code=409, content={'detail': str(exc), 'holder': exc.holder})
+
 
 app.mount(settings.static_url, StaticFiles(directory=settings.static_dir), name='static')
 
 
 @app.on_event('startup')
 async def on_startup() -> None:
+    setup_logging()
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(create_schema)
+    async with AsyncSessionLocal() as session:
+        await get_camera_state().ensure(session, get_camera())
+        await get_warm_start_index().load(session)
+    if settings.flat_field_enabled and not get_flat_field().enable(True):
+        logging.getLogger('aca.camera').warning('flat_field_missing')
+    if settings.hot_folder_enabled:
+        get_hot_folder_watcher().start()
+    if settings.ai_warmup:
+        ai_runtime.start_warmup()
+    if settings.drift_monitor_enabled:
+        get_drift_monitor().start()
+
+
+@app.on_event('shutdown')
+async def on_shutdown() -> None:
+    await get_drift_monitor().stop()
+    await get_acquisition().stop()
+    await get_hot_folder_watcher().stop()
+    get_inference_executor().shutdown()
+    get_training_executor().shutdown()
+    shutdown_logging()
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def _summary(values: list[float]) -> dict:
+    return {
+        'n': len(values),
+        'mean_ms': round(statistics.fmean(values), 2),
+        'p50_ms': round(_percentile(values, 0.50), 2),
+        'p95_ms': round(_percentile(values, 0.95), 2),
+    }
+
+
+async def _bench(iterations: int, concurrency: int, analyze: bool) -> dict:
+    # Imported here so DATABASE_URL from the parent process is picked up by settings.
+    from app.db.base import Base
+    from app.db.session import AsyncSessionLocal, engine
+    from app.services.camera_driver import get_camera
+    from app.services.pipeline import analyze_raw_image
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    camera = get_camera()
+    capture_ms: list[float] = []
+    analyze_ms: list[float] = []
+    errors: list[str] = []
+
+    async def worker(count: int) -> None:
+        async with AsyncSessionLocal() as session:
+            for _ in range(count):
+                try:
+                    start = time.perf_counter()
+                    _, meta = await camera.capture(session=session)
+                    capture_ms.append((time.perf_counter() - start) * 1000.0)
+                    if analyze:
+                        start = time.perf_counter()
+                        await analyze_raw_image(session=session, raw_image_id=meta['raw_image_id'])
+                        analyze_ms.append((time.perf_counter() - start) * 1000.0)
+                except Exception as exc:
+                    errors.append(repr(exc))
+
+    per_worker = max(1, iterations // concurrency)
+    await asyncio.gather(*(worker(per_worker) for _ in range(concurrency)))
+    await engine.dispose()
+
+    result = {'capture': _summary(capture_ms), 'errors': len(errors)}
+    if analyze_ms:
+        result['analyze'] = _summary(analyze_ms)
+    if errors:
+        result['first_error'] = errors[0]
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='compare capture/analyze latency across database backends')
+    parser.add_argument('--database-url', action='append', dest='urls', help='repeat to compare several backends')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--no-analyze', action='store_true')
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        result = asyncio.run(_bench(args.iterations, args.concurrency, not args.no_analyze))
+        print(json.dumps(result))
+        return
+
+    static_dir = tempfile.mkdtemp(prefix='aca_bench_')
+    urls = args.urls or [f'sqlite+aiosqlite:///{os.path.join(static_dir, "bench.db")}']
+    for url in urls:
+        env = dict(os.environ, DATABASE_URL=url, STATIC_DIR=static_dir)
+        cmd = [
+            sys.executable, '-m', 'app.scripts.bench_db', '--single',
+            '--iterations', str(args.iterations),
+            '--concurrency', str(args.concurrency),
+        ]
+        if args.no_analyze:
+            cmd.append('--no-analyze')
+        out = subprocess.run(cmd, env=env, check=True, capture_output=True, text=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        print({'backend': url.split('://', 1)[0], **result})
+
+
+if __name__ == '__main__':
+    main()
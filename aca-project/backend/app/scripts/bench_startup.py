@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+
+# Each probe runs in a fresh interpreter so import caches and RSS start from zero.
+PROBE = '''
+import json, resource, sys, time
+start = time.perf_counter()
+import app.main
+if {eager!r}:
+    import app.ai_core.anomaly
+    app.ai_core.anomaly.get_inference_model()
+elapsed = time.perf_counter() - start
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{'seconds': elapsed, 'rss_mb': rss_kb / 1024.0, 'torch': 'torch' in sys.modules}}))
+'''
+
+
+def run_probe(eager: bool) -> dict:
+    out = subprocess.run(
+        [sys.executable, '-c', PROBE.format(eager=eager)],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='compare app startup time and RSS with lazy vs eager AI loading')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for label, eager in (('lazy', False), ('eager', True)):
+        runs = [run_probe(eager) for _ in range(args.repeat)]
+        print({
+            'mode': label,
+            'startup_s_median': round(statistics.median(r['seconds'] for r in runs), 3),
+            'rss_mb_median': round(statistics.median(r['rss_mb'] for r in runs), 1),
+            'torch_loaded': runs[0]['torch'],
+        })
+
+
+if __name__ == '__main__':
+    main()
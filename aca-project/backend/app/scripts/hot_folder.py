@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import signal
+from pathlib import Path
+
+from app.db.base import Base
+from app.db.session import engine
+from app.services.hot_folder import HotFolderWatcher, configured_folders
+
+
+async def watch(folders: list[Path], polling: bool) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    watcher = HotFolderWatcher(folders, polling=polling or None)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, watcher.request_stop)
+        except NotImplementedError:
+            pass
+    try:
+        await watcher.run()
+    finally:
+        print(watcher.get_status())
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='register images dropped into folders as raw images, in place')
+    parser.add_argument('--folder', action='append', dest='folders', help='repeat for several folders (default: HOT_FOLDER_PATHS)')
+    parser.add_argument('--polling', action='store_true', help='scan instead of using filesystem events (network mounts)')
+    args = parser.parse_args()
+
+    folders = [Path(f) for f in args.folders] if args.folders else configured_folders()
+    missing = [f for f in folders if not f.is_dir()]
+    if not folders or missing:
+        raise SystemExit(f'folder not found: {missing or "none configured"}')
+    asyncio.run(watch(folders, args.polling))
+
+
+if __name__ == '__main__':
+    main()
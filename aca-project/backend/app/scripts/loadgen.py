@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, deque
+
+import httpx
+
+from app.api.schemas import SimulationMode
+
+
+ENDPOINTS = ('capture', 'ingest', 'analyze', 'calibration')
+TERMINAL = {'CONVERGED', 'FAILED', 'CANCELLED', 'ERROR'}
+
+
+def _percentile(ordered: list[float], q: float) -> float | None:
+    if not ordered:
+        return None
+    idx = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return round(ordered[idx], 2)
+
+
+class EndpointStats:
+    def __init__(self) -> None:
+        self.latencies: list[float] = []
+        self.errors: Counter[str] = Counter()
+        self.offered = 0
+        self.dropped = 0
+        self.skipped = 0
+
+    def record(self, ms: float, error: str | None) -> None:
+        if error is None:
+            self.latencies.append(ms)
+        else:
+            self.errors[error] += 1
+
+    def summary(self, duration: float) -> dict:
+        ordered = sorted(self.latencies)
+        failed = sum(self.errors.values())
+        attempted = len(ordered) + failed
+        return {
+            'offered': self.offered,
+            'completed': len(ordered),
+            'failed': failed,
+            'dropped': self.dropped,
+            'skipped': self.skipped,
+            'error_rate': round(failed / attempted, 4) if attempted else None,
+            'throughput_rps': round(len(ordered) / duration, 2) if duration > 0 else None,
+            'p50_ms': _percentile(ordered, 0.50),
+            'p95_ms': _percentile(ordered, 0.95),
+            'p99_ms': _percentile(ordered, 0.99),
+            'max_ms': round(ordered[-1], 2) if ordered else None,
+            'errors': dict(self.errors),
+        }
+
+
+class Station:
+    """One simulated line station: its own seeded camera for uploads, plus the ids it has produced."""
+
+    def __init__(self, index: int, mode: SimulationMode, seed: int, frames: int, client: httpx.AsyncClient, ws_url: str) -> None:
+        import cv2
+
+        from app.services.camera_driver import VirtualCamera
+
+        self.index = index
+        self.mode = mode
+        self.lot_number = f'LOAD-{index:03d}'
+        self.client = client
+        self.ws_url = ws_url
+        self.random = random.Random(seed)
+        camera = VirtualCamera(seed=seed, camera_id=f'load-{index}')
+        camera.set_mode(mode)
+        # Encode up front so PNG work never sits on the event loop while latency is being measured.
+        self.frames = [cv2.imencode('.png', camera.grab())[1].tobytes() for _ in range(max(1, frames))]
+        self.raw_ids: deque[int] = deque(maxlen=256)
+
+    async def capture(self) -> None:
+        r = await self.client.get('/camera/capture')
+        r.raise_for_status()
+        self.raw_ids.append(r.json()['metadata']['raw_image_id'])
+
+    async def ingest(self) -> None:
+        png = self.frames[self.random.randrange(len(self.frames))]
+        r = await self.client.post(
+            '/pipeline/ingest',
+            files={'file': (f'station{self.index}.png', png, 'image/png')},
+            data={'lot_number': self.lot_number},
+        )
+        r.raise_for_status()
+        self.raw_ids.append(r.json()['raw_image_id'])
+
+    async def analyze(self) -> None:
+        if not self.raw_ids:
+            raise LookupError('nothing captured or ingested yet')
+        r = await self.client.post('/pipeline/analyze', json={'raw_image_id': self.raw_ids.popleft()})
+        r.raise_for_status()
+
+    async def calibration(self) -> None:
+        import websockets
+
+        async with websockets.connect(f'{self.ws_url}/ws/calibration', open_timeout=10) as ws:
+            await ws.send(json.dumps({'target_gv': self.random.uniform(120.0, 160.0), 'tolerance': 2.0, 'max_iterations': 20}))
+            while True:
+                message = json.loads(await ws.recv())
+                if message.get('status') in TERMINAL:
+                    if message['status'] == 'ERROR':
+                        raise RuntimeError('calibration_error')
+                    return
+
+
+def _classify(exc: BaseException) -> str:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return f'http_{exc.response.status_code}'
+    return type(exc).__name__
+
+
+async def _drive(
+    station: Station,
+    name: str,
+    rate: float,
+    stats: EndpointStats,
+    deadline: float,
+    max_in_flight: int,
+    tasks: set[asyncio.Task],
+) -> None:
+    """Open-loop Poisson arrivals; latency counts from the scheduled send time so a stalled server is not hidden."""
+    if rate <= 0:
+        return
+    loop = asyncio.get_running_loop()
+    op = getattr(station, name)
+    in_flight = 0
+
+    async def measure(scheduled: float) -> None:
+        nonlocal in_flight
+        error = None
+        try:
+            await op()
+        except LookupError:
+            # The station had no input for this call yet; not a server error.
+            stats.skipped += 1
+            return
+        except asyncio.CancelledError:
+            error = 'unfinished'
+        except Exception as exc:
+            error = _classify(exc)
+        finally:
+            in_flight -= 1
+        stats.record((loop.time() - scheduled) * 1000.0, error)
+
+    next_t = loop.time() + station.random.expovariate(rate)
+    while next_t < deadline:
+        await asyncio.sleep(max(0.0, next_t - loop.time()))
+        stats.offered += 1
+        if in_flight >= max_in_flight:
+            stats.dropped += 1
+        else:
+            in_flight += 1
+            task = asyncio.create_task(measure(next_t))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        next_t += station.random.expovariate(rate)
+
+
+async def run_load(
+    base_url: str,
+    stations: int,
+    duration: float,
+    rates: dict[str, float],
+    seed: int,
+    frames: int,
+    max_in_flight: int,
+    drain: float,
+) -> dict:
+    ws_url = 'ws' + base_url[len('http'):] if base_url.startswith('http') else base_url
+    modes = list(SimulationMode)
+    stats = {name: EndpointStats() for name in ENDPOINTS}
+    limits = httpx.Limits(max_connections=max(10, stations * 4), max_keepalive_connections=max(10, stations * 4))
+    async with httpx.AsyncClient(base_url=base_url, timeout=60.0, limits=limits) as client:
+        fleet = [Station(i, modes[i % len(modes)], seed + i, frames, client, ws_url) for i in range(stations)]
+        tasks: set[asyncio.Task] = set()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + duration
+        await asyncio.gather(*(
+            _drive(station, name, rates.get(name, 0.0), stats[name], deadline, max_in_flight, tasks)
+            for station in fleet
+            for name in ENDPOINTS
+        ))
+        if tasks:
+            _, pending = await asyncio.wait(set(tasks), timeout=drain)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        elapsed = loop.time() - start
+
+    return {
+        'base_url': base_url,
+        'stations': stations,
+        'modes': {m.value: sum(1 for i in range(stations) if modes[i % len(modes)] == m) for m in modes},
+        'duration_s': duration,
+        'elapsed_s': round(elapsed, 2),
+        'rates_per_station': rates,
+        'endpoints': {name: stats[name].summary(duration) for name in ENDPOINTS if rates.get(name, 0.0) > 0},
+    }
+
+
+def _parse_rates(text: str) -> dict[str, float]:
+    rates = {}
+    for part in filter(None, text.split(',')):
+        name, _, value = part.partition('=')
+        if name not in ENDPOINTS:
+            raise SystemExit(f'unknown endpoint {name!r}; choose from {", ".join(ENDPOINTS)}')
+        rates[name] = float(value)
+    return rates
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _spawn_server(database_url: str | None) -> tuple[subprocess.Popen, str]:
+    workdir = tempfile.mkdtemp(prefix='aca_load_')
+    port = _free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url or f'sqlite+aiosqlite:///{os.path.join(workdir, "load.db")}',
+        STATIC_DIR=workdir,
+    )
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app.main:app', '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        env=env,
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60.0
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f'server exited with {proc.returncode}')
+        try:
+            if httpx.get(f'{base_url}/health/system', timeout=1.0).status_code == 200:
+                return proc, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    proc.terminate()
+    raise SystemExit('server did not become healthy')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='simulate N stations against a running (or spawned) backend')
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--spawn', action='store_true', help='start a local uvicorn server for the run')
+    parser.add_argument('--database-url', help='with --spawn: database for the server (default: temporary SQLite)')
+    parser.add_argument('--stations', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds of offered load')
+    parser.add_argument(
+        '--rates',
+        default='capture=1,ingest=1,analyze=0.5,calibration=0.02',
+        help='requests per second per station, e.g. capture=2,ingest=1,analyze=1,calibration=0.05',
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--frames', type=int, default=8, help='distinct pre-encoded frames per station for ingest')
+    parser.add_argument('--max-in-flight', type=int, default=32, help='per station and endpoint; extra arrivals are dropped')
+    parser.add_argument('--drain', type=float, default=30.0, help='seconds to wait for outstanding requests')
+    parser.add_argument('--out', help='also write the JSON report here')
+    args = parser.parse_args()
+
+    proc = None
+    base_url = args.url.rstrip('/')
+    if args.spawn:
+        proc, base_url = _spawn_server(args.database_url)
+    try:
+        report = asyncio.run(run_load(
+            base_url,
+            stations=max(1, args.stations),
+            duration=args.duration,
+            rates=_parse_rates(args.rates),
+            seed=args.seed,
+            frames=args.frames,
+            max_in_flight=max(1, args.max_in_flight),
+            drain=args.drain,
+        ))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import asyncio
+
+from sqlalchemy import delete, insert, select
+
+from app.db.base import Base
+from app.db.models import (
+    CalibrationLog,
+    HourlyCalibrationRollup,
+    HourlyInspectionRollup,
+    InspectionResult,
+    LotRollup,
+    RawImage,
+)
+from app.db.session import AsyncSessionLocal, write_transaction
+from app.services.analytics import UNASSIGNED_LOT, hour_bucket
+
+
+async def rebuild() -> dict:
+    """One full scan of the raw tables to (re)seed the rollups; live writes keep them current afterwards."""
+    lots: dict[tuple, dict] = {}
+    hours: dict[tuple, dict] = {}
+    calib: dict = {}
+
+    async with AsyncSessionLocal() as session:
+        async with session.bind.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        calibration_inspections = select(CalibrationLog.inspection_id)
+        stmt = (
+            select(RawImage.lot_number, InspectionResult.verdict, InspectionResult.anomaly_score, InspectionResult.created_at)
+            .join(RawImage, RawImage.id == InspectionResult.raw_image_id)
+            .where(InspectionResult.id.not_in(calibration_inspections))
+            .execution_options(yield_per=1000)
+        )
+        async for lot_number, verdict, score, created_at in await session.stream(stmt):
+            lot = lots.setdefault((lot_number or UNASSIGNED_LOT, verdict), {
+                'count': 0, 'score_sum': 0.0, 'first_seen': created_at, 'last_seen': created_at,
+            })
+            lot['count'] += 1
+            lot['score_sum'] += score
+            lot['first_seen'] = min(lot['first_seen'], created_at)
+            lot['last_seen'] = max(lot['last_seen'], created_at)
+            hour = hours.setdefault((hour_bucket(created_at), verdict), {'count': 0, 'score_sum': 0.0})
+            hour['count'] += 1
+            hour['score_sum'] += score
+
+        stmt = select(CalibrationLog).execution_options(yield_per=1000)
+        async for log in await session.stream_scalars(stmt):
+            c = calib.setdefault(hour_bucket(log.created_at), {
+                'runs': 0, 'converged': 0, 'target_gv_sum': 0.0,
+                'initial_error_sum': 0.0, 'final_error_sum': 0.0, 'final_abs_error_sum': 0.0,
+            })
+            final_error = log.final_gv - log.target_gv
+            c['runs'] += 1
+            c['converged'] += 1 if log.converged else 0
+            c['target_gv_sum'] += log.target_gv
+            c['initial_error_sum'] += log.initial_gv - log.target_gv
+            c['final_error_sum'] += final_error
+            c['final_abs_error_sum'] += abs(final_error)
+
+        async with write_transaction(session):
+            for model in (LotRollup, HourlyInspectionRollup, HourlyCalibrationRollup):
+                await session.execute(delete(model))
+            if lots:
+                await session.execute(insert(LotRollup), [
+                    {'lot_number': k[0], 'verdict': k[1], **v} for k, v in lots.items()
+                ])
+            if hours:
+                await session.execute(insert(HourlyInspectionRollup), [
+                    {'bucket': k[0], 'verdict': k[1], **v} for k, v in hours.items()
+                ])
+            if calib:
+                await session.execute(insert(HourlyCalibrationRollup), [
+                    {'bucket': k, **v} for k, v in calib.items()
+                ])
+
+    return {'lots': len({k[0] for k in lots}), 'inspection_hours': len(hours), 'calibration_hours': len(calib)}
+
+
+def main() -> None:
+    print(asyncio.run(rebuild()))
+
+
+if __name__ == '__main__':
+    main()
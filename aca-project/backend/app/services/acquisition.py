@@ -0,0 +1,370 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.profiling import run_in_thread
+from app.services.camera_driver import VirtualCamera, get_camera, write_frame_png
+from app.services.vision_engine import ImageStats, VisionEngine
+
+
+logger = logging.getLogger('aca.camera')
+
+
+class FrameRef:
+    """Read-only view of one ring slot plus the sequence number it was taken at.
+
+    The producer may overwrite the slot at any time; a consumer that needs the
+    pixels to be consistent checks ``valid()`` after it has finished reading them.
+    """
+
+    __slots__ = ('ring', 'seq', 'slot', 'image', 'timestamp', 'gain', 'black_level', 'gv_mean')
+
+    def __init__(self, ring: 'FrameRing', seq: int, slot: int) -> None:
+        self.ring = ring
+        self.seq = seq
+        self.slot = slot
+        self.image = ring._views[slot]
+        self.timestamp = float(ring._timestamps[slot])
+        self.gain = float(ring._gains[slot])
+        self.black_level = int(ring._black_levels[slot])
+        self.gv_mean = float(ring._gv[slot])
+
+    def valid(self) -> bool:
+        return int(self.ring._seqs[self.slot]) == self.seq
+
+    def metadata(self) -> dict[str, Any]:
+        return {
+            'seq': self.seq,
+            'timestamp': datetime.utcfromtimestamp(self.timestamp).isoformat(),
+            'gain': self.gain,
+            'black_level': self.black_level,
+            'gv_mean': self.gv_mean,
+        }
+
+
+class FrameRing:
+    """Fixed-size preallocated frame buffer with one writer.
+
+    Each slot carries the sequence number of the frame in it; the writer marks a
+    slot -1 while copying so readers can detect torn or recycled frames (seqlock).
+    """
+
+    def __init__(self, capacity: int, shape: tuple[int, ...]) -> None:
+        self.capacity = max(2, capacity)
+        self.shape = shape
+        self._frames = np.empty((self.capacity, *shape), dtype=np.uint8)
+        self._views = []
+        for i in range(self.capacity):
+            view = self._frames[i]
+            view.flags.writeable = False
+            self._views.append(view)
+        self._seqs = np.full(self.capacity, -1, dtype=np.int64)
+        self._timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self._gains = np.zeros(self.capacity, dtype=np.float64)
+        self._black_levels = np.zeros(self.capacity, dtype=np.int64)
+        self._gv = np.zeros(self.capacity, dtype=np.float64)
+        self.head = -1
+
+    def write(self, image: np.ndarray, gain: float, black_level: int, gv_mean: float) -> int:
+        seq = self.head + 1
+        slot = seq % self.capacity
+        self._seqs[slot] = -1
+        np.copyto(self._frames[slot], image)
+        self._timestamps[slot] = time.time()
+        self._gains[slot] = gain
+        self._black_levels[slot] = black_level
+        self._gv[slot] = gv_mean
+        self._seqs[slot] = seq
+        self.head = seq
+        return seq
+
+    def get(self, seq: int) -> FrameRef | None:
+        if seq < 0 or seq > self.head:
+            return None
+        slot = seq % self.capacity
+        if int(self._seqs[slot]) != seq:
+            return None
+        return FrameRef(self, seq, slot)
+
+    def latest(self) -> FrameRef | None:
+        return self.get(self.head)
+
+    @property
+    def oldest_safe(self) -> int:
+        # The slot after head is the next one written, so it is never handed out.
+        return max(0, self.head - self.capacity + 2)
+
+
+class FrameCursor:
+    """Per-consumer read position.
+
+    ``latest`` consumers (preview, analysis) always jump to the newest frame;
+    sequential ones (recording) take every frame until they fall a ring behind,
+    then skip ahead. Either way the producer never waits.
+    """
+
+    def __init__(self, acquisition: 'Acquisition', latest: bool = True) -> None:
+        self.acquisition = acquisition
+        self.latest = latest
+        ring = acquisition.ring
+        self.next_seq = ring.head + 1 if ring is not None else 0
+        self.delivered = 0
+        self.skipped = 0
+
+    async def next(self, timeout: float = 5.0) -> FrameRef | None:
+        ring = await self.acquisition.wait_for_frame(self.next_seq, timeout)
+        if ring is None:
+            return None
+        start = ring.head if self.latest else max(self.next_seq, ring.oldest_safe)
+        self.skipped += max(0, start - self.next_seq)
+        ref = ring.get(start)
+        self.next_seq = start + 1
+        if ref is not None:
+            self.delivered += 1
+        return ref
+
+
+class Acquisition:
+    """Free-running producer that grabs frames at ``fps`` into a ``FrameRing``.
+
+    Grabbing runs on its own thread so frame generation never blocks the event
+    loop; consumers on the loop are woken per frame.
+    """
+
+    def __init__(self, camera: VirtualCamera | None = None) -> None:
+        self.camera = camera or get_camera()
+        self.ring: FrameRing | None = None
+        self.fps = settings.acquisition_fps
+        self.frames = 0
+        self.overruns = 0
+        self.started_at: float | None = None
+        self.gv_ewma: float | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._frame_event: asyncio.Event | None = None
+        self._sync_task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, fps: float | None = None) -> bool:
+        if self.running:
+            return False
+        self.fps = max(0.1, fps or settings.acquisition_fps)
+        first = self.camera.grab()
+        if self.ring is None or self.ring.shape != first.shape:
+            self.ring = FrameRing(settings.acquisition_ring_size, first.shape)
+        self._loop = asyncio.get_running_loop()
+        self._frame_event = asyncio.Event()
+        self._stop.clear()
+        self.frames = 0
+        self.overruns = 0
+        self.started_at = time.time()
+        self._publish(first)
+        self._thread = threading.Thread(target=self._produce, name='aca-acquisition', daemon=True)
+        self._thread.start()
+        self._sync_task = asyncio.create_task(self._sync_state())
+        logger.info('acquisition_started', extra={'fps': self.fps, 'ring_size': self.ring.capacity})
+        return True
+
+    async def stop(self) -> bool:
+        if not self.running:
+            return False
+        self._stop.set()
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            await asyncio.gather(self._sync_task, return_exceptions=True)
+            self._sync_task = None
+        await asyncio.to_thread(self._thread.join)
+        self._wake()
+        logger.info('acquisition_stopped', extra={'frames': self.frames, 'overruns': self.overruns})
+        return True
+
+    async def _sync_state(self) -> None:
+        """Follow parameter changes made through other workers while frames are being grabbed here."""
+        from app.db.session import AsyncSessionLocal
+        from app.services.camera_state import get_camera_state
+
+        store = get_camera_state()
+        while not self._stop.is_set():
+            try:
+                async with AsyncSessionLocal() as session:
+                    await store.sync(session, self.camera)
+            except Exception:
+                logger.exception('acquisition_state_sync_failed')
+            await asyncio.sleep(max(0.1, settings.camera_state_sync_s))
+
+    def _publish(self, image: np.ndarray) -> None:
+        gv_mean = float(image.mean())
+        self.ring.write(image, self.camera.gain, self.camera.black_level, gv_mean)
+        self.frames += 1
+        self.gv_ewma = gv_mean if self.gv_ewma is None else 0.9 * self.gv_ewma + 0.1 * gv_mean
+
+    def _produce(self) -> None:
+        period = 1.0 / self.fps
+        deadline = time.perf_counter() + period
+        while not self._stop.wait(max(0.0, deadline - time.perf_counter())):
+            try:
+                self._publish(self.camera.grab())
+            except Exception:
+                logger.exception('acquisition_grab_failed')
+            try:
+                self._loop.call_soon_threadsafe(self._wake)
+            except RuntimeError:
+                break
+            deadline += period
+            now = time.perf_counter()
+            if deadline < now:
+                # Grabbing is slower than the requested rate: drop the backlog rather than burst.
+                self.overruns += 1
+                deadline = now
+
+    def _wake(self) -> None:
+        event, self._frame_event = self._frame_event, asyncio.Event()
+        if event is not None:
+            event.set()
+
+    async def wait_for_frame(self, seq: int, timeout: float) -> FrameRing | None:
+        """Wait until frame ``seq`` (or a later one) exists; None on timeout or when stopped."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.ring is None or self.ring.head < seq:
+            if not self.running or self._frame_event is None:
+                return self.ring if self.ring is not None and self.ring.head >= seq else None
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            try:
+                await asyncio.wait_for(self._frame_event.wait(), remaining)
+            except asyncio.TimeoutError:
+                return None
+        return self.ring
+
+    def cursor(self, latest: bool = True) -> FrameCursor:
+        return FrameCursor(self, latest)
+
+    def get_status(self) -> dict[str, Any]:
+        latest = self.ring.latest() if self.ring is not None else None
+        elapsed = time.time() - self.started_at if self.started_at else 0.0
+        return {
+            'running': self.running,
+            'fps': self.fps,
+            'measured_fps': self.frames / elapsed if elapsed > 0 else None,
+            'frames': self.frames,
+            'overruns': self.overruns,
+            'ring_size': self.ring.capacity if self.ring is not None else settings.acquisition_ring_size,
+            'gv_ewma': self.gv_ewma,
+            'latest': latest.metadata() if latest is not None else None,
+        }
+
+
+def _static_url(path: str | None) -> str | None:
+    if not path:
+        return None
+    return path.replace(settings.static_dir, settings.static_url).replace('\\', '/')
+
+
+async def analyze_latest(
+    acquisition: Acquisition,
+    threshold: float = 0.01,
+    retries: int = 3,
+    item: str | None = None,
+) -> dict[str, Any] | None:
+    """Run anomaly analysis on the newest ring frame without going through disk."""
+    from app.ai_core.executor import get_inference_executor
+    from app.ai_core.loader import ai_runtime
+
+    anomaly = await ai_runtime.ensure_loaded()
+
+    def _analyze(ref: FrameRef):
+        x = anomaly.array_to_tensor(ref.image)
+        if not ref.valid():
+            return None
+        return anomaly.analyze_tensor(x, f'frame_{ref.seq}', threshold, item)
+
+    for _ in range(max(1, retries)):
+        ref = acquisition.ring.latest() if acquisition.ring is not None else None
+        if ref is None:
+            return None
+        result = await get_inference_executor().run(_analyze, ref)
+        if result is not None:
+            return {
+                **ref.metadata(),
+                'is_anomaly': result.is_anomaly,
+                'score': result.score,
+                'heatmap_url': _static_url(result.heatmap_path),
+                'recon_url': _static_url(result.recon_path),
+            }
+    return None
+
+
+async def record(
+    session,
+    acquisition: Acquisition,
+    frames: int,
+    lot_number: str | None = None,
+    timeout: float = 5.0,
+) -> dict[str, Any]:
+    """Persist up to ``frames`` consecutive ring frames as raw images; frames lost to overrun are counted, not waited for."""
+    import cv2
+
+    from app.db.models import RawImage
+    from app.db.session import write_transaction
+    from app.services.analytics import record_image_stats
+
+    engine = VisionEngine()
+
+    def _encode(ref: FrameRef) -> tuple[bytes, ImageStats] | None:
+        ok, png = cv2.imencode('.png', ref.image)
+        stats = engine.frame_stats(ref.image)
+        return (png.tobytes(), stats) if ok and ref.valid() else None
+
+    cursor = acquisition.cursor(latest=False)
+    rows: list[RawImage] = []
+    frame_stats: list[ImageStats] = []
+    torn = 0
+    while len(rows) + torn + cursor.skipped < frames:
+        ref = await cursor.next(timeout)
+        if ref is None:
+            break
+        encoded = await run_in_thread(_encode, ref)
+        if encoded is None:
+            torn += 1
+            continue
+        png, stats = encoded
+        timestamp = datetime.utcfromtimestamp(ref.timestamp)
+        file_path, _ = await write_frame_png(png, timestamp)
+        rows.append(RawImage(lot_number=lot_number, timestamp=timestamp, file_path=str(file_path)))
+        frame_stats.append(stats)
+
+    if rows:
+        async with write_transaction(session):
+            session.add_all(rows)
+            for raw, stats in zip(rows, frame_stats):
+                await record_image_stats(session, lot_number, stats, raw.timestamp)
+    return {
+        'recorded': len(rows),
+        'skipped': cursor.skipped,
+        'torn': torn,
+        'raw_image_ids': [r.id for r in rows],
+    }
+
+
+_acquisition: Acquisition | None = None
+
+
+def get_acquisition() -> Acquisition:
+    global _acquisition
+    if _acquisition is None:
+        _acquisition = Acquisition()
+    return _acquisition
@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Any
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.db.models import (
+    CalibrationLog,
+    HourlyCalibrationRollup,
+    HourlyGVHistogram,
+    HourlyImageStats,
+    HourlyInspectionRollup,
+    LotGVHistogram,
+    LotImageStats,
+    LotRollup,
+    Verdict,
+)
+from app.services.vision_engine import GV_LEVELS, ImageStats
+
+
+UNASSIGNED_LOT = ''
+
+
+def hour_bucket(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def _insert_for(session):
+    if session.bind.dialect.name == 'postgresql':
+        return postgresql.insert
+    return sqlite.insert
+
+
+async def _increment(
+    session,
+    model,
+    keys: dict[str, Any],
+    increments: dict[str, float],
+    latest: dict[str, Any] | None = None,
+    earliest: dict[str, Any] | None = None,
+) -> None:
+    """Atomic ``INSERT .. ON CONFLICT DO UPDATE`` adding ``increments`` to an existing rollup row.
+
+    ``latest`` / ``earliest`` columns keep the greater / smaller of the stored and
+    incoming values, so out-of-order writes (hot folder backfills) never move them backwards.
+    """
+    latest = latest or {}
+    earliest = earliest or {}
+    table = model.__table__
+    postgres = session.bind.dialect.name == 'postgresql'
+    # SQLite's multi-argument max()/min() are its scalar GREATEST/LEAST.
+    greatest, least = (func.greatest, func.least) if postgres else (func.max, func.min)
+    stmt = _insert_for(session)(model).values(**keys, **increments, **latest, **earliest)
+    set_ = {name: table.c[name] + stmt.excluded[name] for name in increments}
+    set_.update({name: greatest(table.c[name], stmt.excluded[name]) for name in latest})
+    set_.update({name: least(table.c[name], stmt.excluded[name]) for name in earliest})
+    stmt = stmt.on_conflict_do_update(index_elements=list(keys), set_=set_)
+    await session.execute(stmt)
+
+
+async def _increment_histogram(session, model, keys: dict[str, Any], histogram) -> None:
+    """Add a GV histogram bin-wise in one multi-row upsert; empty bins are skipped."""
+    rows = [{**keys, 'level': int(level), 'count': int(histogram[level])} for level in histogram.nonzero()[0]]
+    if not rows:
+        return
+    stmt = _insert_for(session)(model).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[*keys, 'level'],
+        set_={'count': model.__table__.c.count + stmt.excluded.count},
+    )
+    await session.execute(stmt)
+
+
+async def record_inspection(session, lot_number: str | None, verdict: Verdict, score: float, ts: datetime) -> None:
+    """Fold one inspection into the lot and hourly rollups; call inside the write transaction."""
+    await _increment(
+        session,
+        LotRollup,
+        keys={'lot_number': lot_number or UNASSIGNED_LOT, 'verdict': verdict},
+        increments={'count': 1, 'score_sum': float(score)},
+        latest={'last_seen': ts},
+        earliest={'first_seen': ts},
+    )
+    await _increment(
+        session,
+        HourlyInspectionRollup,
+        keys={'bucket': hour_bucket(ts), 'verdict': verdict},
+        increments={'count': 1, 'score_sum': float(score)},
+    )
+
+
+async def record_calibration(session, log: CalibrationLog, ts: datetime) -> None:
+    final_error = float(log.final_gv) - float(log.target_gv)
+    await _increment(
+        session,
+        HourlyCalibrationRollup,
+        keys={'bucket': hour_bucket(ts)},
+        increments={
+            'runs': 1,
+            'converged': 1 if log.converged else 0,
+            'target_gv_sum': float(log.target_gv),
+            'initial_error_sum': float(log.initial_gv) - float(log.target_gv),
+            'final_error_sum': final_error,
+            'final_abs_error_sum': abs(final_error),
+        },
+    )
+
+
+async def record_image_stats(
+    session,
+    lot_number: str | None,
+    stats: ImageStats,
+    ts: datetime,
+    first_ts: datetime | None = None,
+) -> None:
+    """Fold GV statistics into the lot and hourly accumulators; call inside the write transaction.
+
+    ``stats`` may merge several frames taken between ``first_ts`` and ``ts`` (both
+    ``ts`` for a single frame); they must share ``ts``'s hour bucket.
+    """
+    sums = {
+        'images': stats.images,
+        'pixels': stats.pixels,
+        'gv_sum': stats.gv_sum,
+        'gv_sumsq': stats.gv_sumsq,
+        'saturated_low': stats.saturated_low,
+        'saturated_high': stats.saturated_high,
+    }
+    lot = {'lot_number': lot_number or UNASSIGNED_LOT}
+    bucket = {'bucket': hour_bucket(ts)}
+    await _increment(session, LotImageStats, keys=lot, increments=sums, latest={'last_seen': ts}, earliest={'first_seen': first_ts or ts})
+    await _increment_histogram(session, LotGVHistogram, lot, stats.histogram)
+    await _increment(session, HourlyImageStats, keys=bucket, increments=sums)
+    await _increment_histogram(session, HourlyGVHistogram, bucket, stats.histogram)
+
+
+def _lot_summary(lot_number: str, rows: list[LotRollup]) -> dict[str, Any]:
+    counts = {v.value: 0 for v in Verdict}
+    score_sum = 0.0
+    for r in rows:
+        counts[r.verdict.value] += r.count
+        score_sum += r.score_sum
+    total = sum(counts.values())
+    return {
+        'lot_number': lot_number or None,
+        'total': total,
+        'ok': counts[Verdict.OK.value],
+        'ng': counts[Verdict.NG.value],
+        'yield': counts[Verdict.OK.value] / total if total else None,
+        'mean_score': score_sum / total if total else None,
+        'first_seen': min(r.first_seen for r in rows).isoformat(),
+        'last_seen': max(r.last_seen for r in rows).isoformat(),
+    }
+
+
+async def lot_yields(session, limit: int = 100) -> list[dict[str, Any]]:
+    recent = (
+        select(LotRollup.lot_number)
+        .group_by(LotRollup.lot_number)
+        .order_by(func.max(LotRollup.last_seen).desc())
+        .limit(limit)
+        .subquery()
+    )
+    rows = (await session.execute(select(LotRollup).where(LotRollup.lot_number.in_(select(recent.c.lot_number))))).scalars().all()
+    by_lot: dict[str, list[LotRollup]] = {}
+    for r in rows:
+        by_lot.setdefault(r.lot_number, []).append(r)
+    summaries = [_lot_summary(lot, lot_rows) for lot, lot_rows in by_lot.items()]
+    summaries.sort(key=lambda s: s['last_seen'], reverse=True)
+    return summaries
+
+
+async def lot_yield(session, lot_number: str) -> dict[str, Any] | None:
+    rows = (await session.execute(select(LotRollup).where(LotRollup.lot_number == lot_number))).scalars().all()
+    if not rows:
+        return None
+    return _lot_summary(lot_number, list(rows))
+
+
+def _default_range(since: datetime | None, until: datetime | None) -> tuple[datetime, datetime]:
+    until = until or datetime.utcnow()
+    since = since or until - timedelta(hours=24)
+    return hour_bucket(since), until
+
+
+async def ng_rate_series(session, since: datetime | None = None, until: datetime | None = None) -> list[dict[str, Any]]:
+    since, until = _default_range(since, until)
+    rows = (
+        await session.execute(
+            select(HourlyInspectionRollup)
+            .where(HourlyInspectionRollup.bucket >= since, HourlyInspectionRollup.bucket <= until)
+            .order_by(HourlyInspectionRollup.bucket)
+        )
+    ).scalars().all()
+    buckets: dict[datetime, dict[str, float]] = {}
+    for r in rows:
+        b = buckets.setdefault(r.bucket, {'ok': 0, 'ng': 0, 'score_sum': 0.0})
+        b['ok' if r.verdict == Verdict.OK else 'ng'] += r.count
+        b['score_sum'] += r.score_sum
+    series = []
+    for bucket, b in buckets.items():
+        total = b['ok'] + b['ng']
+        series.append({
+            'bucket': bucket.isoformat(),
+            'total': total,
+            'ng': b['ng'],
+            'ng_rate': b['ng'] / total if total else None,
+            'mean_score': b['score_sum'] / total if total else None,
+        })
+    return series
+
+
+async def calibration_series(session, since: datetime | None = None, until: datetime | None = None) -> dict[str, Any]:
+    since, until = _default_range(since, until)
+    rows = (
+        await session.execute(
+            select(HourlyCalibrationRollup)
+            .where(HourlyCalibrationRollup.bucket >= since, HourlyCalibrationRollup.bucket <= until)
+            .order_by(HourlyCalibrationRollup.bucket)
+        )
+    ).scalars().all()
+    series = [
+        {
+            'bucket': r.bucket.isoformat(),
+            'runs': r.runs,
+            'converged': r.converged,
+            'convergence_rate': r.converged / r.runs if r.runs else None,
+            'mean_target_gv': r.target_gv_sum / r.runs if r.runs else None,
+            # initial GV minus target: how far the camera had drifted before each run
+            'mean_gv_drift': r.initial_error_sum / r.runs if r.runs else None,
+            'mean_final_error': r.final_error_sum / r.runs if r.runs else None,
+            'mean_final_abs_error': r.final_abs_error_sum / r.runs if r.runs else None,
+        }
+        for r in rows
+    ]
+    runs = sum(r.runs for r in rows)
+    converged = sum(r.converged for r in rows)
+    return {
+        'since': since.isoformat(),
+        'until': until.isoformat(),
+        'runs': runs,
+        'convergence_rate': converged / runs if runs else None,
+        'mean_gv_drift': sum(r.initial_error_sum for r in rows) / runs if runs else None,
+        'series': series,
+    }
+
+
+def _as_image_stats(row, bins) -> ImageStats:
+    histogram = np.zeros(GV_LEVELS, dtype=np.int64)
+    for b in bins:
+        histogram[b.level] = b.count
+    return ImageStats(
+        images=row.images,
+        pixels=row.pixels,
+        gv_sum=row.gv_sum,
+        gv_sumsq=row.gv_sumsq,
+        saturated_low=row.saturated_low,
+        saturated_high=row.saturated_high,
+        histogram=histogram,
+    )
+
+
+async def lot_image_stats(session, lot_number: str) -> dict[str, Any] | None:
+    row = await session.get(LotImageStats, lot_number)
+    if row is None:
+        return None
+    bins = (await session.execute(select(LotGVHistogram).where(LotGVHistogram.lot_number == lot_number))).scalars().all()
+    return {
+        'lot_number': lot_number or None,
+        'first_seen': row.first_seen.isoformat(),
+        'last_seen': row.last_seen.isoformat(),
+        **_as_image_stats(row, bins).summary(histogram=True),
+    }
+
+
+async def image_stats_series(session, since: datetime | None = None, until: datetime | None = None) -> dict[str, Any]:
+    since, until = _default_range(since, until)
+    rows = (
+        await session.execute(
+            select(HourlyImageStats)
+            .where(HourlyImageStats.bucket >= since, HourlyImageStats.bucket <= until)
+            .order_by(HourlyImageStats.bucket)
+        )
+    ).scalars().all()
+    bins = (
+        await session.execute(
+            select(HourlyGVHistogram).where(HourlyGVHistogram.bucket >= since, HourlyGVHistogram.bucket <= until)
+        )
+    ).scalars().all()
+    by_bucket: dict[datetime, list[HourlyGVHistogram]] = {}
+    for b in bins:
+        by_bucket.setdefault(b.bucket, []).append(b)
+
+    total = ImageStats()
+    series = []
+    for r in rows:
+        stats = _as_image_stats(r, by_bucket.get(r.bucket, []))
+        series.append({'bucket': r.bucket.isoformat(), **stats.summary()})
+        total.merge(stats)
+    return {
+        'since': since.isoformat(),
+        'until': until.isoformat(),
+        **total.summary(histogram=True),
+        'series': series,
+    }
@@ -2,9 +2,15 @@
 
 import asyncio
 import logging
+from datetime import datetime
+from typing import AsyncIterator
 
+from app.core.config import settings
 from app.services.camera_driver import get_camera
+from app.services.camera_state import get_camera_state
+from app.services.gv_measurement import AdaptiveGVMeter
 from app.services.vision_engine import VisionEngine
+from app.services.warm_start import get_warm_start_index
 
 
 logger = logging.getLogger('aca.calibration')
@@ -13,133 +19,117 @@ logger = logging.getLogger('aca.calibration')
 class CalibrationAgent:
     def __init__(self) -> None:
         self.camera = get_camera()
+        self.state = get_camera_state()
         self.engine = VisionEngine()
-
-    async def run_auto_calibration(self, session, target_gv: float, tolerance: float, max_iterations: int) -> dict:
-        current_gv = 0.0
+        self.meter = get_gv_meter()
+
+    async def apply_warm_start(self, session, target_gv: float) -> dict | None:
+        await self.state.sync(session, self.camera)
+        seed = get_warm_start_index().lookup(self.camera.camera_id, self.camera.simulation_mode.value, target_gv)
+        if seed is not None:
+            await self.state.set_parameters(session, self.camera, gain=seed['gain'], black_level=seed['black_level'])
+            logger.info('calibration_warm_start', extra={'target_gv': target_gv, **seed})
+        return seed
+
+    async def iterate(
+        self,
+        session,
+        target_gv: float,
+        tolerance: float,
+        max_iterations: int,
+        warm_start: bool = True,
+    ) -> AsyncIterator[dict]:
+        """Yield one message per capture; the last one has status CONVERGED or FAILED."""
+        max_iterations = max(1, max_iterations)
+        seed = await self.apply_warm_start(session, target_gv) if warm_start else None
+        loop = asyncio.get_running_loop()
         initial_gv = None
-        last_meta = None
-        last_image_url = None
 
         for step in range(1, max_iterations + 1):
-            last_image_url, last_meta = await self.camera.capture(session=session)
-            current_gv = float(last_meta['gv_mean'])
+            image_url, meta = await self.meter.measure(session, target_gv=target_gv, tolerance=tolerance)
+            captured_at = loop.time()
+            current_gv = float(meta['gv_mean'])
             if initial_gv is None:
                 initial_gv = current_gv
 
             error = target_gv - current_gv
-            logger.info('calibration_step', extra={'step': step, 'current_gv': current_gv, 'target_gv': target_gv})
-
+            status = 'ADJUSTING'
+            message = 'calibrating'
             if abs(error) <= tolerance:
+                status, message = 'CONVERGED', 'done'
+            elif step == max_iterations:
+                status, message = 'FAILED', 'max iterations reached'
+            logger.info('calibration_step', extra={'step': step, 'current_gv': current_gv, 'target_gv': target_gv, 'status': status, 'gv_frames': meta['gv_frames']})
+
+            if status != 'ADJUSTING':
                 await self._record_log(
                     session=session,
-                    meta=last_meta,
+                    meta=meta,
                     initial_gv=initial_gv,
                     target_gv=target_gv,
                     final_gv=current_gv,
-                    converged=True,
+                    converged=status == 'CONVERGED',
                 )
-                return {
-                    'status': 'CONVERGED',
-                    'step': step,
-                    'current_gv': current_gv,
-                    'target_gv': target_gv,
-                    'image_url': last_image_url,
-                }
-
-            self.camera.set_parameters(
+
+            yield {
+                'step': step,
+                'current_gv': current_gv,
+                'target_gv': target_gv,
+                'applied_gain': self.camera.gain,
+                'applied_black_level': self.camera.black_level,
+                'status': status,
+                'message': message,
+                'image_url': image_url,
+                'raw_image_id': meta.get('raw_image_id'),
+                'inspection_id': None,
+                'warm_started': seed is not None,
+                'gv_frames': meta['gv_frames'],
+                'gv_ci_half_width': meta['gv_ci_half_width'],
+            }
+            if status != 'ADJUSTING':
+                return
+
+            await self.state.set_parameters(
+                session,
+                self.camera,
                 gain=self.camera.gain + 0.1 * error,
                 black_level=self.camera.black_level + int(0.05 * error),
             )
-
-        await self._record_log(
-            session=session,
-            meta=last_meta,
-            initial_gv=initial_gv or current_gv,
-            target_gv=target_gv,
-            final_gv=current_gv,
-            converged=False,
-        )
+            # New parameters land on the next frame: wait out the camera's frame period, but at least
+            # calibration_min_step_interval, since a virtual camera's period is just its render time.
+            settle = max(self.camera.frame_interval, settings.calibration_min_step_interval)
+            remaining = settle - (loop.time() - captured_at)
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+
+    async def run_auto_calibration(
+        self,
+        session,
+        target_gv: float,
+        tolerance: float,
+        max_iterations: int,
+        warm_start: bool = True,
+    ) -> dict:
+        last: dict | None = None
+        async for last in self.iterate(session, target_gv, tolerance, max_iterations, warm_start):
+            pass
         return {
-            'status': 'FAILED',
-            'step': max_iterations,
-            'current_gv': current_gv,
+            'status': last['status'],
+            'step': last['step'],
+            'current_gv': last['current_gv'],
             'target_gv': target_gv,
-            'image_url': last_image_url,
+            'image_url': last['image_url'],
+            'warm_started': last['warm_started'],
         }
 
-    async def stream_to_websocket(self, websocket, target_gv: float, tolerance: float, max_iterations: int):
-        from app.db.session import AsyncSessionLocal
-
-        async with AsyncSessionLocal() as session:
-            for step in range(1, max_iterations + 1):
-                image_url, meta = await self.camera.capture(session=session)
-                current_gv = float(meta['gv_mean'])
-                error = target_gv - current_gv
-                status = 'ADJUSTING'
-
-                if abs(error) <= tolerance:
-                    status = 'CONVERGED'
-
-                await websocket.send_json({
-                    'step': step,
-                    'current_gv': current_gv,
-                    'target_gv': target_gv,
-                    'applied_gain': self.camera.gain,
-                    'applied_black_level': self.camera.black_level,
-                    'status': status,
-                    'message': 'calibrating' if status == 'ADJUSTING' else 'done',
-                    'image_url': image_url,
-                    'raw_image_id': meta.get('raw_image_id'),
-                    'inspection_id': None,
-                })
-
-                logger.info('calibration_stream', extra={'step': step, 'status': status})
-
-                if status == 'CONVERGED':
-                    await self._record_log(
-                        session=session,
-                        meta=meta,
-                        initial_gv=current_gv,
-                        target_gv=target_gv,
-                        final_gv=current_gv,
-                        converged=True,
-                    )
-                    break
-
-                if step == max_iterations:
-                    await websocket.send_json({
-                        'step': step,
-                        'current_gv': current_gv,
-                        'target_gv': target_gv,
-                        'applied_gain': self.camera.gain,
-                        'applied_black_level': self.camera.black_level,
-                        'status': 'FAILED',
-                        'message': 'max iterations reached',
-                        'image_url': image_url,
-                        'raw_image_id': meta.get('raw_image_id'),
-                        'inspection_id': None,
-                    })
-                    await self._record_log(
-                        session=session,
-                        meta=meta,
-                        initial_gv=current_gv,
-                        target_gv=target_gv,
-                        final_gv=current_gv,
-                        converged=False,
-                    )
-                    break
-
-                self.camera.set_parameters(
-                    gain=self.camera.gain + 0.1 * error,
-                    black_level=self.camera.black_level + int(0.05 * error),
-                )
-                await asyncio.sleep(0.2)
-
     async def _record_log(self, session, meta, initial_gv, target_gv, final_gv, converged: bool) -> None:
         from app.db.models import CalibrationLog, InspectionResult
+        from app.db.session import write_transaction
+        from app.services.analytics import record_calibration
+
+        now = datetime.utcnow()
 
-        async with session.begin():
+        async with write_transaction(session):
             inspection = InspectionResult(
                 raw_image_id=meta['raw_image_id'],
                 is_anomaly=False,
@@ -147,17 +137,36 @@ class CalibrationAgent:
                 verdict='OK',
             )
             session.add(inspection)
-
-        await session.refresh(inspection)
-
-        async with session.begin():
             log = CalibrationLog(
-                inspection_id=inspection.id,
+                inspection_result=inspection,
                 initial_gv=float(initial_gv),
                 target_gv=float(target_gv),
                 final_gv=float(final_gv),
                 gain_applied=float(self.camera.gain),
                 black_level_applied=float(self.camera.black_level),
                 converged=converged,
+                camera_id=self.camera.camera_id,
+                simulation_mode=self.camera.simulation_mode.value,
+                created_at=now,
             )
             session.add(log)
+            await record_calibration(session, log=log, ts=now)
+
+        if converged:
+            get_warm_start_index().add(
+                self.camera.camera_id,
+                self.camera.simulation_mode.value,
+                target_gv,
+                self.camera.gain,
+                self.camera.black_level,
+            )
+
+
+_meter: AdaptiveGVMeter | None = None
+
+
+def get_gv_meter() -> AdaptiveGVMeter:
+    global _meter
+    if _meter is None:
+        _meter = AdaptiveGVMeter(get_camera())
+    return _meter
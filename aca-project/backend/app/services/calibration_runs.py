@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any
+
+from app.core.config import settings
+from app.services.calibration import CalibrationAgent
+from app.services.camera_state import CameraLeaseLost, get_camera_state
+
+
+logger = logging.getLogger('aca.calibration')
+
+TERMINAL_STATUSES = {'CONVERGED', 'FAILED', 'CANCELLED', 'ERROR'}
+
+
+class CalibrationRun:
+    """A server-side calibration job whose step stream fans out to any number of subscribers."""
+
+    def __init__(self, target_gv: float, tolerance: float, max_iterations: int, warm_start: bool = True) -> None:
+        self.id = uuid.uuid4().hex[:12]
+        self.target_gv = target_gv
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.warm_start = warm_start
+        self.status = 'PENDING'
+        self.latest: dict[str, Any] | None = None
+        self.created_at = datetime.utcnow()
+        self.finished_at: datetime | None = None
+        self._subscribers: set[asyncio.Queue] = set()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def start(self) -> None:
+        self.status = 'RUNNING'
+        self._task = asyncio.create_task(self._run())
+
+    def cancel(self) -> bool:
+        if self.done or self._task is None:
+            return False
+        self._task.cancel()
+        return True
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, settings.calibration_subscriber_queue))
+        if self.latest is not None:
+            queue.put_nowait(self.latest)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    def _publish(self, message: dict[str, Any]) -> None:
+        self.latest = message
+        for queue in self._subscribers:
+            if queue.full():
+                # A slow subscriber loses its oldest step rather than holding up the run.
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    def _terminal_message(self, status: str, message: str) -> dict[str, Any]:
+        last = self.latest or {}
+        return {
+            'step': last.get('step', 0),
+            'current_gv': last.get('current_gv', 0.0),
+            'target_gv': self.target_gv,
+            'applied_gain': last.get('applied_gain'),
+            'applied_black_level': last.get('applied_black_level'),
+            'status': status,
+            'message': message,
+            'image_url': last.get('image_url'),
+            'raw_image_id': last.get('raw_image_id'),
+            'inspection_id': None,
+            'run_id': self.id,
+        }
+
+    async def _run(self) -> None:
+        from app.db.session import AsyncSessionLocal
+
+        agent = CalibrationAgent()
+        final: dict[str, Any] | None = None
+        try:
+            async with agent.state.lease(agent.camera, self.id, 'calibration'), AsyncSessionLocal() as session:
+                async for message in agent.iterate(
+                    session,
+                    target_gv=self.target_gv,
+                    tolerance=self.tolerance,
+                    max_iterations=self.max_iterations,
+                    warm_start=self.warm_start,
+                ):
+                    # The agent's last message is the terminal one; it is held back until the lease is released.
+                    if message['status'] in TERMINAL_STATUSES:
+                        final = {**message, 'run_id': self.id}
+                    else:
+                        self.status = 'RUNNING'
+                        self._publish({**message, 'run_id': self.id})
+            if final is None:
+                final = self._terminal_message('ERROR', 'calibration ended without a result')
+        except asyncio.CancelledError:
+            final = self._terminal_message('CANCELLED', 'cancelled')
+        except CameraLeaseLost as exc:
+            final = self._terminal_message('ERROR', str(exc))
+        except Exception as exc:
+            logger.exception('calibration_run_failed', extra={'run_id': self.id})
+            final = self._terminal_message('ERROR', repr(exc))
+        finally:
+            # Reported only after the lease is released, so whoever sees ``done`` can take it straight away.
+            self.finished_at = datetime.utcnow()
+            if final is not None:
+                self.status = final['status']
+                self._publish(final)
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            'run_id': self.id,
+            'status': self.status,
+            'target_gv': self.target_gv,
+            'tolerance': self.tolerance,
+            'max_iterations': self.max_iterations,
+            'subscribers': len(self._subscribers),
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'latest': self.latest,
+        }
+
+
+class CalibrationRunManager:
+    """Owns this worker's active run on the shared camera plus a short history of finished runs.
+
+    Runs in other worker processes are excluded by the camera lease rather than by ``active``.
+    """
+
+    def __init__(self) -> None:
+        self._runs: OrderedDict[str, CalibrationRun] = OrderedDict()
+        self.active: CalibrationRun | None = None
+        self._lock = asyncio.Lock()
+
+    async def start(self, target_gv: float, tolerance: float, max_iterations: int, warm_start: bool = True) -> tuple[CalibrationRun, bool]:
+        """Start a run, or return the one already driving the camera (``created`` is then False).
+
+        Raises ``CameraBusy`` when a run in another worker holds the camera lease.
+        """
+        from app.db.session import AsyncSessionLocal
+        from app.services.camera_driver import get_camera
+
+        async with self._lock:
+            if self.active is not None and not self.active.done:
+                return self.active, False
+            run = CalibrationRun(target_gv, tolerance, max_iterations, warm_start)
+            # Taken here so a conflict is reported to the caller; the run itself renews and releases it.
+            async with AsyncSessionLocal() as session:
+                await get_camera_state().acquire_lease(session, get_camera(), run.id, 'calibration')
+            return self._begin(run), True
+
+    def _begin(self, run: CalibrationRun) -> CalibrationRun:
+        self._runs[run.id] = run
+        while len(self._runs) > max(1, settings.calibration_run_history):
+            oldest_id = next(iter(self._runs))
+            if not self._runs[oldest_id].done:
+                break
+            self._runs.popitem(last=False)
+        self.active = run
+        run.start()
+        logger.info('calibration_run_started', extra={'run_id': run.id, 'target_gv': run.target_gv})
+        return run
+
+    def get(self, run_id: str) -> CalibrationRun | None:
+        return self._runs.get(run_id)
+
+    def list(self) -> list[CalibrationRun]:
+        return list(reversed(self._runs.values()))
+
+
+_manager: CalibrationRunManager | None = None
+
+
+def get_run_manager() -> CalibrationRunManager:
+    global _manager
+    if _manager is None:
+        _manager = CalibrationRunManager()
+    return _manager
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import logging
+import uuid
+from typing import Any
+
+import numpy as np
+
+from app.db.models import CalibrationRecipe
+from app.db.session import write_transaction
+from app.services.camera_driver import get_camera
+from app.services.camera_state import get_camera_state
+from app.services.warm_start import get_warm_start_index
+
+
+logger = logging.getLogger('aca.calibration')
+
+# Frames at the rails carry no slope information, so they are kept out of the fit.
+SATURATION_LOW = 3.0
+SATURATION_HIGH = 252.0
+
+
+class ResponseModel:
+    """Least-squares GV response ``gv = c0 + c1*gain + c2*bl (+ c3*gain*bl)``."""
+
+    def __init__(self, coef: np.ndarray, rmse: float) -> None:
+        self.coef = coef
+        self.rmse = rmse
+
+    @staticmethod
+    def _features(gain: np.ndarray, black_level: np.ndarray, interaction: bool) -> np.ndarray:
+        cols = [np.ones_like(gain), gain, black_level]
+        if interaction:
+            cols.append(gain * black_level)
+        return np.stack(cols, axis=1)
+
+    @classmethod
+    def fit(cls, samples: list[tuple[float, float, float]]) -> 'ResponseModel | None':
+        usable = [s for s in samples if SATURATION_LOW < s[2] < SATURATION_HIGH]
+        if len(usable) < 3:
+            return None
+        arr = np.asarray(usable, dtype=np.float64)
+        interaction = len(usable) >= 6
+        x = cls._features(arr[:, 0], arr[:, 1], interaction)
+        coef, *_ = np.linalg.lstsq(x, arr[:, 2], rcond=None)
+        rmse = float(np.sqrt(np.mean((x @ coef - arr[:, 2]) ** 2)))
+        return cls(coef, rmse)
+
+    def predict(self, gain: float, black_level: float) -> float:
+        c = self.coef
+        gv = c[0] + c[1] * gain + c[2] * black_level
+        if len(c) > 3:
+            gv += c[3] * gain * black_level
+        return float(gv)
+
+    def solve_gain(self, target_gv: float, black_level: float) -> float:
+        c = self.coef
+        slope = c[1] + (c[3] * black_level if len(c) > 3 else 0.0)
+        if abs(slope) < 1e-9:
+            return float('nan')
+        return float((target_gv - c[0] - c[2] * black_level) / slope)
+
+    def solve_black_level(self, target_gv: float, gain: float) -> float:
+        c = self.coef
+        slope = c[2] + (c[3] * gain if len(c) > 3 else 0.0)
+        if abs(slope) < 1e-9:
+            return float('nan')
+        return float((target_gv - c[0] - c[1] * gain) / slope)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {'coefficients': [float(v) for v in self.coef], 'rmse': self.rmse}
+
+
+class CalibrationSweep:
+    def __init__(
+        self,
+        gain_range: tuple[float, float] = (0.0, 24.0),
+        black_level_range: tuple[int, int] = (0, 60),
+    ) -> None:
+        self.camera = get_camera()
+        self.gain_range = gain_range
+        self.black_level_range = black_level_range
+
+    def _design(self) -> list[tuple[float, int]]:
+        """Capture order: three spread points that pin a plane plus the centre, then points that fill the largest gaps."""
+        g0, g1 = self.gain_range
+        b0, b1 = self.black_level_range
+        gm, bm = (g0 + g1) / 2.0, int(round((b0 + b1) / 2.0))
+        points = [(g0, b0), (g1, b0), (gm, b1), (gm, bm)]
+        grid = [(g, b) for g in np.linspace(g0, g1, 5) for b in np.linspace(b0, b1, 3)]
+        scale = np.array([max(g1 - g0, 1e-9), max(b1 - b0, 1e-9)])
+        while grid:
+            chosen = np.array(points, dtype=np.float64) / scale
+            candidates = np.array(grid, dtype=np.float64) / scale
+            dist = np.min(np.linalg.norm(candidates[:, None, :] - chosen[None, :, :], axis=2), axis=1)
+            best = int(np.argmax(dist))
+            if dist[best] < 1e-6:
+                break
+            g, b = grid.pop(best)
+            points.append((float(g), int(round(b))))
+        return points
+
+    async def _measure(self, session, gain: float, black_level: int) -> float:
+        await get_camera_state().set_parameters(session, self.camera, gain=gain, black_level=black_level)
+        _, meta = await self.camera.capture(session=session)
+        return float(meta['gv_mean'])
+
+    async def run(
+        self,
+        session,
+        targets: list[float],
+        tolerance: float = 2.0,
+        max_captures: int = 12,
+        black_level: int | None = None,
+        verify: bool = True,
+        max_refine: int = 3,
+    ) -> dict[str, Any]:
+        await get_camera_state().sync(session, self.camera)
+        original = self.camera.get_parameters()
+        samples: list[tuple[float, float, float]] = []
+        model: ResponseModel | None = None
+        table: list[dict[str, Any]] = []
+        preferred_bl = int(original['black_level'] if black_level is None else black_level)
+        try:
+            for gain, bl in self._design()[:max(3, max_captures)]:
+                gv = await self._measure(session, gain, bl)
+                # Check the current fit against the new point before adding it; stop once it predicts within tolerance.
+                converged = model is not None and len(samples) >= 3 and abs(model.predict(gain, bl) - gv) <= tolerance / 2.0
+                samples.append((gain, float(bl), gv))
+                model = ResponseModel.fit(samples) or model
+                if converged:
+                    break
+
+            if model is None:
+                return {'status': 'FAILED', 'reason': 'not_enough_unsaturated_samples', 'captures': len(samples)}
+
+            for target in sorted(targets):
+                row = self._solve(model, target, preferred_bl, tolerance)
+                if verify:
+                    row = await self._verify(session, model, row, preferred_bl, tolerance, max_refine, samples)
+                table.append(row)
+        finally:
+            await get_camera_state().set_parameters(session, self.camera, gain=original['gain'], black_level=original['black_level'])
+
+        sweep_id = uuid.uuid4().hex[:12]
+        camera_id = self.camera.camera_id
+        mode = self.camera.simulation_mode.value
+        index = get_warm_start_index()
+        async with write_transaction(session):
+            for row in table:
+                if not row['reachable']:
+                    continue
+                session.add(CalibrationRecipe(
+                    sweep_id=sweep_id,
+                    camera_id=camera_id,
+                    simulation_mode=mode,
+                    target_gv=row['target_gv'],
+                    gain=row['gain'],
+                    black_level=row['black_level'],
+                    predicted_gv=row['predicted_gv'],
+                ))
+        for row in table:
+            if row['reachable']:
+                index.add(camera_id, mode, row['target_gv'], row['gain'], row['black_level'], source='recipe')
+
+        logger.info('calibration_sweep', extra={'sweep_id': sweep_id, 'captures': len(samples), 'rmse': model.rmse})
+        return {
+            'status': 'OK',
+            'sweep_id': sweep_id,
+            'camera_id': camera_id,
+            'simulation_mode': mode,
+            'captures': len(samples),
+            'model': model.as_dict(),
+            'samples': [{'gain': g, 'black_level': b, 'gv': v} for g, b, v in samples],
+            'table': table,
+        }
+
+    async def _verify(
+        self,
+        session,
+        model: ResponseModel,
+        row: dict[str, Any],
+        black_level: int,
+        tolerance: float,
+        max_refine: int,
+        samples: list[tuple[float, float, float]],
+    ) -> dict[str, Any]:
+        """Capture at the solved setting; if off, re-solve for a target shifted by the observed model error.
+
+        The returned row is always a setting that was actually measured: there is no
+        re-solve after the last capture.
+        """
+        target = row['target_gv']
+        aim = target
+        for attempt in range(max_refine + 1):
+            gv = await self._measure(session, row['gain'], row['black_level'])
+            samples.append((row['gain'], float(row['black_level']), gv))
+            row['measured_gv'] = gv
+            if abs(gv - target) <= tolerance or attempt == max_refine:
+                break
+            aim -= gv - target
+            row = {**self._solve(model, aim, black_level, tolerance), 'target_gv': target, 'measured_gv': gv}
+        row['reachable'] = abs(row['measured_gv'] - target) <= tolerance
+        return row
+
+    def _solve(self, model: ResponseModel, target_gv: float, black_level: int, tolerance: float) -> dict[str, Any]:
+        g0, g1 = self.gain_range
+        b0, b1 = self.black_level_range
+        bl = int(min(max(black_level, b0), b1))
+        gain = model.solve_gain(target_gv, bl)
+        if not np.isfinite(gain) or not g0 <= gain <= g1:
+            # Gain alone cannot reach the target: pin it at the nearer limit and move the black level.
+            gain = g1 if not np.isfinite(gain) or gain > g1 else g0
+            solved_bl = model.solve_black_level(target_gv, gain)
+            if np.isfinite(solved_bl):
+                bl = int(round(min(max(solved_bl, b0), b1)))
+        gain = float(min(max(gain, g0), g1))
+        predicted = model.predict(gain, bl)
+        return {
+            'target_gv': float(target_gv),
+            'gain': gain,
+            'black_level': bl,
+            'predicted_gv': predicted,
+            'reachable': abs(predicted - target_gv) <= tolerance,
+        }
@@ -1,6 +1,7 @@
 ﻿from __future__ import annotations
 
 import logging
+import time
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Tuple
@@ -17,12 +18,23 @@ logger = logging.getLogger('aca.camera')
 
 
 class VirtualCamera:
-    def __init__(self) -> None:
+    def __init__(self, seed: int | None = None, camera_id: str | None = None) -> None:
+        self.camera_id = camera_id or settings.camera_id
+        # Per-instance generator so seeded cameras (load tests, replays) produce repeatable frames.
+        self.rng = np.random.default_rng(seed)
+        self.resolution = (480, 640)
         self.gain = 8.0
         self.black_level = 10
         self.engine = VisionEngine()
         self.capture_count = 0
+        # EWMA of how long the sensor takes to deliver a frame; callers pace parameter changes by it.
+        self.frame_interval = 0.0
         self.simulation_mode = SimulationMode.CLEAN
+        # 'object' is the normal scene; 'flat' and 'dark' are the reference targets for flat-field maps.
+        self.scene = 'object'
+        self.flat_field = None
+        # Version of the shared ``camera_states`` row these settings were last synced from.
+        self.state_version = -1
 
     def get_status(self) -> str:
         return 'online'
@@ -31,59 +43,88 @@ class VirtualCamera:
         return {'gain': self.gain, 'black_level': self.black_level}
 
     def set_parameters(self, gain: float, black_level: int) -> None:
-        self.gain = float(max(0.0, min(24.0, gain)))
-        self.black_level = int(max(0, min(255, black_level)))
+        """Local only; the shared camera is changed through ``CameraStateStore`` so every worker sees it."""
+        self.gain, self.black_level = clamp_parameters(gain, black_level)
 
     def set_mode(self, mode: SimulationMode) -> None:
         self.simulation_mode = mode
 
-    async def capture(self, session, lot_number: str | None = None) -> Tuple[str, dict[str, Any]]:
-        self.capture_count += 1
-        image = self._generate_image()
+    def apply_state(self, gain: float, black_level: int, mode: SimulationMode, version: int) -> None:
+        self.gain = float(gain)
+        self.black_level = int(black_level)
+        self.simulation_mode = mode
+        self.state_version = version
+
+    def grab(self, correct: bool = True, scene: str | None = None) -> np.ndarray:
+        """Produce one frame with the current parameters without persisting it.
+
+        With a flat-field map enabled the frame is corrected in place before anyone
+        sees it, so GV measurement, storage and analysis all get the corrected pixels.
+        ``scene`` overrides ``self.scene`` for this frame only, so reference targets
+        can be grabbed without other callers ever seeing them.
+        """
+        start = time.perf_counter()
+        image = self._generate_image(scene or self.scene)
         image = self._apply_simulation(image)
+        flat_field = self.flat_field
+        if correct and flat_field is not None and flat_field.shape == image.shape:
+            flat_field.apply(image)
+        elapsed = time.perf_counter() - start
+        self.frame_interval = elapsed if self.frame_interval == 0.0 else 0.8 * self.frame_interval + 0.2 * elapsed
+        return image
+
+    async def capture(self, session, lot_number: str | None = None) -> Tuple[str, dict[str, Any]]:
+        from app.services.camera_state import get_camera_state
+
+        store = get_camera_state()
+        # Another worker may have changed the settings since this one last looked.
+        await store.sync(session, self)
+        image = self.grab()
         gv_mean = float(self.engine.calc_gv(image))
         timestamp = datetime.utcnow()
 
-        image_dir = Path(settings.static_dir) / settings.image_subdir
-        image_dir.mkdir(parents=True, exist_ok=True)
-        filename = f'img_{timestamp.strftime("%Y%m%d_%H%M%S_%f")}.png'
-        file_path = image_dir / filename
-
         import cv2
 
         _, png = cv2.imencode('.png', image)
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(png.tobytes())
+        file_path, image_url = await write_frame_png(png.tobytes(), timestamp)
 
         from app.db.models import RawImage
+        from app.db.session import write_transaction
+        from app.services.analytics import record_image_stats
 
-        async with session.begin():
+        stats = self.engine.frame_stats(image)
+        async with write_transaction(session):
             raw = RawImage(
                 lot_number=lot_number,
                 timestamp=timestamp,
                 file_path=str(file_path),
             )
             session.add(raw)
+            await record_image_stats(session, lot_number, stats, timestamp)
+            capture_count = await store.count_capture(session, self)
 
-        await session.refresh(raw)
-
-        image_url = f"{settings.static_url}/{settings.image_subdir}/{filename}"
         metadata = {
             'gain': self.gain,
             'black_level': float(self.black_level),
             'gv_mean': gv_mean,
             'timestamp': timestamp.isoformat(),
             'raw_image_id': raw.id,
-            'capture_count': self.capture_count,
+            'capture_count': capture_count,
             'simulation_mode': self.simulation_mode,
         }
         logger.info('capture', extra={'metadata': metadata})
         return image_url, metadata
 
-    def _generate_image(self) -> np.ndarray:
-        base = np.full((480, 640), 90, dtype=np.float32)
-        gradient = np.tile(np.linspace(0, 40, 640, dtype=np.float32), (480, 1))
-        img = base + gradient
+    def _generate_image(self, scene: str) -> np.ndarray:
+        h, w = self.resolution
+        if scene == 'flat':
+            img = np.full((h, w), 110, dtype=np.float32)
+        elif scene == 'dark':
+            img = np.zeros((h, w), dtype=np.float32)
+        else:
+            base = np.full((h, w), 90, dtype=np.float32)
+            gradient = np.tile(np.linspace(0, 40, w, dtype=np.float32), (h, 1))
+            img = base + gradient
 
         img = img * (1.0 + self.gain / 24.0) + self.black_level
         img = np.clip(img, 0, 255).astype(np.uint8)
@@ -116,7 +157,7 @@ class VirtualCamera:
         return np.clip(out, 0, 255).astype(np.uint8)
 
     def _add_gaussian_noise(self, image: np.ndarray, sigma: float) -> np.ndarray:
-        noise = np.random.normal(0, sigma, image.shape).astype(np.float32)
+        noise = self.rng.standard_normal(image.shape, dtype=np.float32) * sigma
         out = image.astype(np.float32) + noise
         return np.clip(out, 0, 255).astype(np.uint8)
 
@@ -132,19 +173,34 @@ class VirtualCamera:
         out = image.copy()
         h, w = out.shape[:2]
         for _ in range(6):
-            x1 = np.random.randint(0, w)
-            y1 = np.random.randint(0, h)
-            x2 = np.random.randint(0, w)
-            y2 = np.random.randint(0, h)
+            x1 = self.rng.integers(0, w)
+            y1 = self.rng.integers(0, h)
+            x2 = self.rng.integers(0, w)
+            y2 = self.rng.integers(0, h)
             cv2.line(out, (x1, y1), (x2, y2), (255, 255, 255), 1)
         for _ in range(12):
-            cx = np.random.randint(0, w)
-            cy = np.random.randint(0, h)
-            r = np.random.randint(2, 6)
+            cx = self.rng.integers(0, w)
+            cy = self.rng.integers(0, h)
+            r = self.rng.integers(2, 6)
             cv2.circle(out, (cx, cy), r, (0, 0, 0), -1)
         return out
 
 
+def clamp_parameters(gain: float, black_level: int) -> Tuple[float, int]:
+    return float(max(0.0, min(24.0, gain))), int(max(0, min(255, black_level)))
+
+
+async def write_frame_png(png: bytes, timestamp: datetime) -> Tuple[Path, str]:
+    """Write an encoded frame under the image dir; returns the file path and its static URL."""
+    image_dir = Path(settings.static_dir) / settings.image_subdir
+    image_dir.mkdir(parents=True, exist_ok=True)
+    filename = f'img_{timestamp.strftime("%Y%m%d_%H%M%S_%f")}.png'
+    file_path = image_dir / filename
+    async with aiofiles.open(file_path, 'wb') as f:
+        await f.write(png)
+    return file_path, f"{settings.static_url}/{settings.image_subdir}/{filename}"
+
+
 _camera: VirtualCamera | None = None
 
 
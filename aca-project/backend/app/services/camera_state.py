@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.api.schemas import SimulationMode
+from app.core.config import settings
+from app.db.models import CameraState
+from app.db.session import AsyncSessionLocal, write_transaction
+from app.services.camera_driver import VirtualCamera, clamp_parameters
+
+
+logger = logging.getLogger('aca.camera')
+
+_COLUMNS = (
+    CameraState.camera_id,
+    CameraState.gain,
+    CameraState.black_level,
+    CameraState.simulation_mode,
+    CameraState.capture_count,
+    CameraState.version,
+    CameraState.lease_owner,
+    CameraState.lease_kind,
+    CameraState.lease_worker,
+    CameraState.lease_expires_at,
+    CameraState.updated_at,
+)
+
+
+class CameraBusy(Exception):
+    """Another run (possibly in another worker process) holds the camera lease."""
+
+    def __init__(self, holder: dict[str, Any]) -> None:
+        super().__init__(f'camera {holder.get("camera_id")} is leased to {holder.get("lease_kind")} {holder.get("lease_owner")}')
+        self.holder = holder
+
+
+class CameraLeaseLost(CameraBusy):
+    """Raised out of ``CameraStateStore.lease`` when another run took the lease while the block was running."""
+
+
+class CameraStateStore:
+    """The camera's parameters, mode, capture counter and run lease, kept in ``camera_states``.
+
+    Every change is a single ``UPDATE .. RETURNING`` so concurrent workers never
+    lose each other's writes, and each worker's ``VirtualCamera`` is only a cache
+    of the row: it is refreshed from the returned values, before every capture,
+    and periodically while acquisition runs. The lease makes "one calibration
+    drives the camera" hold across processes, not just within one.
+    """
+
+    def __init__(self) -> None:
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+
+    @staticmethod
+    def _as_dict(row) -> dict[str, Any]:
+        state = dict(row._mapping)
+        for key in ('lease_expires_at', 'updated_at'):
+            if state[key] is not None:
+                state[key] = state[key].isoformat()
+        return state
+
+    @staticmethod
+    def _apply(camera: VirtualCamera, row) -> None:
+        if row.version != camera.state_version:
+            camera.apply_state(row.gain, row.black_level, SimulationMode(row.simulation_mode), row.version)
+        camera.capture_count = row.capture_count
+
+    async def ensure(self, session, camera: VirtualCamera) -> dict[str, Any]:
+        """Create the row from the camera's defaults if no worker has yet, then adopt whatever is stored."""
+        insert = postgresql.insert if session.bind.dialect.name == 'postgresql' else sqlite.insert
+        async with write_transaction(session):
+            await session.execute(
+                insert(CameraState)
+                .values(
+                    camera_id=camera.camera_id,
+                    gain=camera.gain,
+                    black_level=camera.black_level,
+                    simulation_mode=camera.simulation_mode.value,
+                    capture_count=camera.capture_count,
+                    version=0,
+                    updated_at=datetime.utcnow(),
+                )
+                .on_conflict_do_nothing(index_elements=['camera_id'])
+            )
+        return await self.sync(session, camera)
+
+    async def sync(self, session, camera: VirtualCamera) -> dict[str, Any]:
+        row = (await session.execute(select(*_COLUMNS).where(CameraState.camera_id == camera.camera_id))).one_or_none()
+        if row is None:
+            return await self.ensure(session, camera)
+        self._apply(camera, row)
+        return self._as_dict(row)
+
+    async def _update(self, session, camera: VirtualCamera, values: dict[str, Any], *where) -> Any:
+        stmt = (
+            update(CameraState)
+            .where(CameraState.camera_id == camera.camera_id, *where)
+            .values(**values, updated_at=datetime.utcnow())
+            .returning(*_COLUMNS)
+        )
+        async with write_transaction(session):
+            row = (await session.execute(stmt)).one_or_none()
+        if row is not None:
+            self._apply(camera, row)
+        return row
+
+    async def set_parameters(self, session, camera: VirtualCamera, gain: float, black_level: int) -> dict[str, Any]:
+        gain, black_level = clamp_parameters(gain, black_level)
+        row = await self._update(session, camera, {'gain': gain, 'black_level': black_level, 'version': CameraState.version + 1})
+        if row is None:
+            await self.ensure(session, camera)
+            row = await self._update(session, camera, {'gain': gain, 'black_level': black_level, 'version': CameraState.version + 1})
+        return self._as_dict(row)
+
+    async def set_mode(self, session, camera: VirtualCamera, mode: SimulationMode) -> dict[str, Any]:
+        row = await self._update(session, camera, {'simulation_mode': mode.value, 'version': CameraState.version + 1})
+        if row is None:
+            await self.ensure(session, camera)
+            row = await self._update(session, camera, {'simulation_mode': mode.value, 'version': CameraState.version + 1})
+        return self._as_dict(row)
+
+    async def count_capture(self, session, camera: VirtualCamera) -> int:
+        """Bump the shared capture counter; call inside the capture's own write transaction."""
+        stmt = (
+            update(CameraState)
+            .where(CameraState.camera_id == camera.camera_id)
+            .values(capture_count=CameraState.capture_count + 1)
+            .returning(CameraState.capture_count)
+        )
+        count = (await session.execute(stmt)).scalar_one_or_none()
+        camera.capture_count = count if count is not None else camera.capture_count + 1
+        return camera.capture_count
+
+    async def acquire_lease(self, session, camera: VirtualCamera, owner: str, kind: str) -> dict[str, Any]:
+        """Take (or extend) the lease for ``owner``; raises ``CameraBusy`` while someone else holds a live one."""
+        now = datetime.utcnow()
+        values = {
+            'lease_owner': owner,
+            'lease_kind': kind,
+            'lease_worker': self.worker_id,
+            'lease_expires_at': now + timedelta(seconds=settings.camera_lease_ttl_s),
+        }
+        free = or_(
+            CameraState.lease_owner.is_(None),
+            CameraState.lease_owner == owner,
+            CameraState.lease_expires_at < now,
+        )
+        row = await self._update(session, camera, values, free)
+        if row is None:
+            state = await self.sync(session, camera)
+            if state['lease_owner'] is None or state['lease_owner'] == owner:
+                # The row did not exist yet; ``sync`` created it.
+                row = await self._update(session, camera, values, free)
+            if row is None:
+                raise CameraBusy(state)
+        return self._as_dict(row)
+
+    async def release_lease(self, session, camera: VirtualCamera, owner: str) -> None:
+        values = {'lease_owner': None, 'lease_kind': None, 'lease_worker': None, 'lease_expires_at': None}
+        await self._update(session, camera, values, CameraState.lease_owner == owner)
+
+    @asynccontextmanager
+    async def lease(self, camera: VirtualCamera, owner: str, kind: str) -> AsyncIterator[None]:
+        """Hold the lease for the duration of the block, renewing it in the background.
+
+        If a renewal finds the lease taken by someone else the task running the
+        block is cancelled, and the block exits with ``CameraLeaseLost`` rather
+        than go on driving a camera it no longer owns.
+        """
+        async with AsyncSessionLocal() as session:
+            await self.acquire_lease(session, camera, owner, kind)
+        lost: list[dict[str, Any]] = []
+        renew = asyncio.create_task(self._renew(camera, owner, kind, asyncio.current_task(), lost))
+        try:
+            yield
+        finally:
+            renew.cancel()
+            await asyncio.gather(renew, return_exceptions=True)
+            if lost:
+                raise CameraLeaseLost(lost[0])
+            async with AsyncSessionLocal() as session:
+                await self.release_lease(session, camera, owner)
+
+    async def _renew(self, camera: VirtualCamera, owner: str, kind: str, holder: asyncio.Task, lost: list) -> None:
+        interval = max(0.5, settings.camera_lease_ttl_s / 3.0)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with AsyncSessionLocal() as session:
+                    await self.acquire_lease(session, camera, owner, kind)
+            except CameraBusy as exc:
+                # Only possible after missing renewals for a whole TTL (e.g. a stalled database).
+                logger.warning('camera_lease_lost', extra={'owner': owner, 'holder': exc.holder.get('lease_owner')})
+                lost.append(exc.holder)
+                holder.cancel()
+                return
+            except Exception:
+                logger.exception('camera_lease_renew_failed')
+
+_store: CameraStateStore | None = None
+
+
+def get_camera_state() -> CameraStateStore:
+    global _store
+    if _store is None:
+        _store = CameraStateStore()
+    return _store
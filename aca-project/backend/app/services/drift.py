@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any
+
+import numpy as np
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.models import CalibrationLog
+from app.db.session import AsyncSessionLocal
+from app.services.acquisition import Acquisition, FrameRef, get_acquisition
+from app.services.calibration_runs import get_run_manager
+from app.services.camera_state import CameraBusy
+
+
+logger = logging.getLogger('aca.calibration')
+
+
+class DriftMonitor:
+    """Watches acquisition frames for GV drift and starts a calibration only when it is needed.
+
+    Two signals are followed per frame, both as EWMAs so single noisy frames do
+    not trip them: the frame's mean GV (already measured by the producer) against
+    the target of the last converged ``CalibrationLog``, and the mean absolute
+    difference between a strided thumbnail of the frame and a golden thumbnail,
+    with the global offset removed so it reacts to contrast and shading changes
+    that keep the mean in place. A frame costs a few thousand pixel reads and no
+    allocation beyond the thumbnail.
+
+    Sensor noise alone keeps that difference well above zero, by an amount that
+    depends on the mode, so the golden thumbnail is the average of the first
+    ``drift_min_frames`` frames after calibration, the score reached with no drift
+    is recorded as the mean over the next ``drift_min_frames``, and
+    ``drift_golden_limit`` applies only to the excess over that score.
+
+    The baseline (target, golden, EWMAs) is rebuilt whenever the camera
+    parameters change, including changes made by another worker, and frames are
+    ignored while this worker's calibration is running.
+    """
+
+    def __init__(self, acquisition: Acquisition | None = None) -> None:
+        self.acquisition = acquisition or get_acquisition()
+        self.target_gv: float | None = None
+        self.target_log_id: int | None = None
+        self.golden: np.ndarray | None = None
+        self.golden_baseline: float | None = None
+        self.gv_ewma: float | None = None
+        self.golden_ewma: float | None = None
+        self._golden_sum: np.ndarray | None = None
+        self._golden_frames = 0
+        self._baseline_sum = 0.0
+        self._baseline_frames = 0
+        self.frames = 0
+        self.skipped = 0
+        self.triggers = 0
+        self.last_trigger_at: float | None = None
+        self.last_trigger: dict[str, Any] | None = None
+        self.last_run_id: str | None = None
+        self.state = 'stopped'
+        self._version: int | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> bool:
+        if self.running:
+            return False
+        self._task = asyncio.create_task(self._run())
+        logger.info('drift_monitor_started', extra={'gv_limit': settings.drift_gv_limit, 'golden_limit': settings.drift_golden_limit})
+        return True
+
+    async def stop(self) -> bool:
+        if not self.running:
+            return False
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self.state = 'stopped'
+        return True
+
+    def reset(self) -> None:
+        """Forget the baseline; the target is reloaded and a new golden thumbnail averaged from the next frames."""
+        self._version = None
+
+    async def _run(self) -> None:
+        cursor = self.acquisition.cursor(latest=True)
+        while True:
+            ref = await cursor.next(timeout=1.0)
+            if ref is None:
+                self.state = 'waiting_for_frames'
+                if not self.acquisition.running:
+                    await asyncio.sleep(1.0)
+                continue
+            active = get_run_manager().active
+            if active is not None and not active.done:
+                self.state = 'calibrating'
+                self.skipped += 1
+                self._version = None
+                continue
+            if self._version != self.acquisition.camera.state_version:
+                await self._rebuild_baseline()
+            if self.target_gv is None:
+                self.state = 'no_target'
+                continue
+            if not self._observe(ref):
+                self.skipped += 1
+                continue
+            self.state = 'monitoring'
+            reason = self._exceeded()
+            if reason is not None:
+                await self._trigger(reason)
+
+    async def _rebuild_baseline(self) -> None:
+        self._version = self.acquisition.camera.state_version
+        self.golden = None
+        self.golden_baseline = None
+        self.gv_ewma = None
+        self.golden_ewma = None
+        self._golden_sum = None
+        self._golden_frames = 0
+        self._baseline_sum = 0.0
+        self._baseline_frames = 0
+        self.frames = 0
+        try:
+            async with AsyncSessionLocal() as session:
+                row = (
+                    await session.execute(
+                        select(CalibrationLog.id, CalibrationLog.target_gv)
+                        .where(
+                            CalibrationLog.converged.is_(True),
+                            CalibrationLog.camera_id == self.acquisition.camera.camera_id,
+                        )
+                        .order_by(CalibrationLog.id.desc())
+                        .limit(1)
+                    )
+                ).one_or_none()
+        except Exception:
+            logger.exception('drift_target_load_failed')
+            return
+        self.target_log_id, self.target_gv = (row.id, float(row.target_gv)) if row is not None else (None, None)
+
+    def _observe(self, ref: FrameRef) -> bool:
+        image = ref.image
+        stride = max(1, settings.drift_stride)
+        thumb = (image[::stride, ::stride, 0] if image.ndim == 3 else image[::stride, ::stride]).astype(np.float32)
+        if not ref.valid():
+            return False
+        alpha = settings.drift_ewma_alpha
+        self.gv_ewma = ref.gv_mean if self.gv_ewma is None else (1 - alpha) * self.gv_ewma + alpha * ref.gv_mean
+        window = max(1, settings.drift_min_frames)
+        if self.golden is None:
+            if self._golden_sum is None:
+                self._golden_sum = thumb
+            else:
+                self._golden_sum += thumb
+            self._golden_frames += 1
+            if self._golden_frames >= window:
+                self.golden = self._golden_sum / self._golden_frames
+                self._golden_sum = None
+        else:
+            diff = thumb - self.golden
+            diff -= diff.mean()
+            score = float(np.abs(diff).mean())
+            self.golden_ewma = score if self.golden_ewma is None else (1 - alpha) * self.golden_ewma + alpha * score
+            if self.golden_baseline is None:
+                self._baseline_sum += score
+                self._baseline_frames += 1
+                if self._baseline_frames >= window:
+                    self.golden_baseline = self._baseline_sum / self._baseline_frames
+        self.frames += 1
+        return True
+
+    @property
+    def golden_excess(self) -> float | None:
+        """How far the golden difference sits above what noise alone gives; None until the baseline is known."""
+        if self.golden_baseline is None or self.golden_ewma is None:
+            return None
+        return max(0.0, self.golden_ewma - self.golden_baseline)
+
+    def _exceeded(self) -> str | None:
+        if self.frames < settings.drift_min_frames:
+            return None
+        if abs(self.gv_ewma - self.target_gv) > settings.drift_gv_limit:
+            return 'gv'
+        excess = self.golden_excess
+        if excess is not None and excess > settings.drift_golden_limit:
+            return 'golden'
+        return None
+
+    async def _trigger(self, reason: str) -> None:
+        now = time.monotonic()
+        if self.last_trigger_at is not None and now - self.last_trigger_at < settings.drift_cooldown_s:
+            self.state = 'cooldown'
+            return
+        self.last_trigger_at = now
+        self.last_trigger = {
+            'reason': reason,
+            'gv_ewma': self.gv_ewma,
+            'target_gv': self.target_gv,
+            'golden_diff': self.golden_ewma,
+            'golden_excess': self.golden_excess,
+            'at': time.time(),
+        }
+        logger.warning('drift_detected', extra=self.last_trigger)
+        if not settings.drift_auto_calibrate:
+            return
+        try:
+            run, created = await get_run_manager().start(
+                target_gv=self.target_gv,
+                tolerance=settings.drift_calibration_tolerance,
+                max_iterations=20,
+            )
+        except CameraBusy as exc:
+            logger.info('drift_calibration_deferred', extra={'holder': exc.holder.get('lease_owner')})
+            return
+        self.last_run_id = run.id
+        if created:
+            self.triggers += 1
+        self._version = None
+
+    def get_status(self) -> dict[str, Any]:
+        cooldown = None
+        if self.last_trigger_at is not None:
+            cooldown = max(0.0, settings.drift_cooldown_s - (time.monotonic() - self.last_trigger_at))
+        return {
+            'running': self.running,
+            'state': self.state if self.running else 'stopped',
+            'target_gv': self.target_gv,
+            'target_log_id': self.target_log_id,
+            'gv_ewma': self.gv_ewma,
+            'gv_drift': self.gv_ewma - self.target_gv if self.gv_ewma is not None and self.target_gv is not None else None,
+            'golden_diff': self.golden_ewma,
+            'golden_baseline': self.golden_baseline,
+            'golden_excess': self.golden_excess,
+            'has_golden': self.golden is not None,
+            'frames': self.frames,
+            'skipped': self.skipped,
+            'triggers': self.triggers,
+            'last_trigger': self.last_trigger,
+            'last_run_id': self.last_run_id,
+            'cooldown_remaining_s': cooldown,
+            'limits': {
+                'gv': settings.drift_gv_limit,
+                'golden': settings.drift_golden_limit,
+                'min_frames': settings.drift_min_frames,
+                'cooldown_s': settings.drift_cooldown_s,
+                'auto_calibrate': settings.drift_auto_calibrate,
+            },
+        }
+
+
+_monitor: DriftMonitor | None = None
+
+
+def get_drift_monitor() -> DriftMonitor:
+    global _monitor
+    if _monitor is None:
+        _monitor = DriftMonitor()
+    return _monitor
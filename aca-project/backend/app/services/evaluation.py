@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import select
+
+from app.ai_core.loader import ai_runtime
+from app.db.models import DatasetImage, DatasetSplit
+
+
+def _mask_key(item: str, defect_type: str, path: str) -> tuple[str, str, str]:
+    stem = Path(path).stem
+    if stem.endswith('_mask'):
+        stem = stem[: -len('_mask')]
+    return item, defect_type, stem
+
+
+async def evaluate_test_split(
+    session,
+    item: str | None = None,
+    batch_size: int = 32,
+    max_images: int | None = None,
+    bins: int = 1000,
+) -> dict[str, Any]:
+    """Score the ``test`` split against ``ground_truth`` masks (MVTec layout: ``000.png`` <-> ``000_mask.png``)."""
+    masks_stmt = select(DatasetImage.item, DatasetImage.defect_type, DatasetImage.file_path).where(
+        DatasetImage.split == DatasetSplit.GROUND_TRUTH
+    )
+    tests_stmt = select(DatasetImage.item, DatasetImage.defect_type, DatasetImage.file_path).where(
+        DatasetImage.split == DatasetSplit.TEST,
+        DatasetImage.is_mask.is_(False),
+    )
+    if item is not None:
+        masks_stmt = masks_stmt.where(DatasetImage.item == item)
+        tests_stmt = tests_stmt.where(DatasetImage.item == item)
+    tests_stmt = tests_stmt.order_by(DatasetImage.id)
+    if max_images:
+        tests_stmt = tests_stmt.limit(max_images)
+
+    masks = {_mask_key(i, d, p): p for i, d, p in (await session.execute(masks_stmt)).all()}
+    rows = (await session.execute(tests_stmt)).all()
+    if not rows:
+        return {'images': 0, 'reason': 'no_test_images'}
+
+    await ai_runtime.ensure_loaded()
+    from app.ai_core import evaluation
+
+    samples = [
+        evaluation.EvalSample(
+            image_path=p,
+            mask_path=masks.get(_mask_key(i, d, p)),
+            is_anomaly=d != 'good',
+            defect_type=d,
+        )
+        for i, d, p in rows
+    ]
+    result = await evaluation.evaluate_async(samples, batch_size=batch_size, bins=bins, item=item)
+    missing_masks = sum(1 for s in samples if s.is_anomaly and s.mask_path is None)
+    return {'item': item, 'missing_masks': missing_masks, **result}
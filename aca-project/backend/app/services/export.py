@@ -0,0 +1,393 @@
+from __future__ import annotations
+
+import asyncio
+import csv
+import io
+import logging
+import os
+import tarfile
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, BinaryIO
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.models import CalibrationLog, InspectionResult, RawImage
+from app.db.session import AsyncSessionLocal
+
+
+logger = logging.getLogger('aca.export')
+
+ARCHIVE_FORMATS = ('zip', 'tar')
+RESULT_FORMATS = ('csv', 'parquet')
+CHUNK = 256 * 1024
+ROW_BATCH = 1000
+
+COLUMNS = [
+    'raw_image_id',
+    'lot_number',
+    'captured_at',
+    'status',
+    'image',
+    'heatmap',
+    'inspection_id',
+    'is_anomaly',
+    'anomaly_score',
+    'verdict',
+    'inspected_at',
+    'calibration_log_id',
+    'initial_gv',
+    'target_gv',
+    'final_gv',
+    'gain_applied',
+    'black_level_applied',
+    'converged',
+    'camera_id',
+    'simulation_mode',
+]
+
+
+class ExportUnavailable(Exception):
+    pass
+
+
+def check_formats(archive: str, results: str) -> None:
+    """Validate before the response starts; once bytes are streaming an error can only truncate the archive."""
+    if archive not in ARCHIVE_FORMATS:
+        raise ExportUnavailable(f'archive must be one of {", ".join(ARCHIVE_FORMATS)}')
+    if results not in RESULT_FORMATS:
+        raise ExportUnavailable(f'results must be one of {", ".join(RESULT_FORMATS)}')
+    if results == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ExportUnavailable('parquet results need pyarrow installed') from None
+
+
+class _Sink:
+    """Write-only file object the archive writers fill; the response drains it after every chunk."""
+
+    def __init__(self) -> None:
+        self._buf = bytearray()
+        self._pos = 0
+
+    def write(self, data: bytes) -> int:
+        self._buf += data
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+
+class _ZipArchive:
+    def __init__(self, sink: _Sink) -> None:
+        # The sink cannot seek, so zipfile writes data descriptors after each member.
+        self._zip = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED)
+
+    def open(self, name: str, size: int, mtime: float, compress: bool = False):
+        info = zipfile.ZipInfo(name, date_time=time.localtime(mtime)[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        info.file_size = size
+        return self._zip.open(info, 'w', force_zip64=size >= zipfile.ZIP64_LIMIT)
+
+    def close(self) -> None:
+        self._zip.close()
+
+
+class _TarMember:
+    def __init__(self, sink: _Sink, size: int) -> None:
+        self._sink = sink
+        self._remaining = size
+        self._size = size
+
+    def write(self, data: bytes) -> None:
+        data = data[:self._remaining]
+        self._remaining -= len(data)
+        self._sink.write(data)
+
+    def close(self) -> None:
+        # The header promised ``size`` bytes; a file that shrank underneath us is zero-filled.
+        if self._remaining:
+            self._sink.write(tarfile.NUL * self._remaining)
+        remainder = self._size % tarfile.BLOCKSIZE
+        if remainder:
+            self._sink.write(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+
+    def __enter__(self) -> '_TarMember':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class _TarArchive:
+    """Streaming tar written member by member; ``tarfile`` itself would buffer each member whole."""
+
+    def __init__(self, sink: _Sink) -> None:
+        self._sink = sink
+
+    def open(self, name: str, size: int, mtime: float, compress: bool = False) -> _TarMember:
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(mtime)
+        info.mode = 0o644
+        self._sink.write(info.tobuf(tarfile.PAX_FORMAT))
+        return _TarMember(self._sink, size)
+
+    def close(self) -> None:
+        self._sink.write(tarfile.NUL * (tarfile.BLOCKSIZE * 2))
+        remainder = self._sink.tell() % tarfile.RECORDSIZE
+        if remainder:
+            self._sink.write(tarfile.NUL * (tarfile.RECORDSIZE - remainder))
+
+
+class _ResultsWriter:
+    """Results rows spooled to a temp file (in memory until it grows) until the archive can take them."""
+
+    def __init__(self, fmt: str) -> None:
+        self.fmt = fmt
+        self.rows = 0
+        self.file: BinaryIO = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        self._pending: list[dict[str, Any]] = []
+        self._parquet = None
+        if fmt == 'csv':
+            self._text = io.TextIOWrapper(self.file, encoding='utf-8', newline='', write_through=True)
+            self._csv = csv.DictWriter(self._text, fieldnames=COLUMNS)
+            self._csv.writeheader()
+
+    def add(self, row: dict[str, Any]) -> None:
+        self.rows += 1
+        if self.fmt == 'csv':
+            self._csv.writerow(row)
+            return
+        self._pending.append(row)
+        if len(self._pending) >= ROW_BATCH:
+            self._flush_parquet()
+
+    def _flush_parquet(self) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pylist(self._pending, schema=_parquet_schema())
+        if self._parquet is None:
+            self._parquet = pq.ParquetWriter(self.file, table.schema)
+        self._parquet.write_table(table)
+        self._pending.clear()
+
+    def finish(self) -> int:
+        """Flush and rewind; returns the size in bytes."""
+        if self.fmt == 'csv':
+            self._text.flush()
+            self._text.detach()
+        else:
+            if self._pending or self._parquet is None:
+                self._flush_parquet()
+            self._parquet.close()
+        size = self.file.tell()
+        self.file.seek(0)
+        return size
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('raw_image_id', pa.int64()),
+        ('lot_number', pa.string()),
+        ('captured_at', pa.timestamp('us')),
+        ('status', pa.string()),
+        ('image', pa.string()),
+        ('heatmap', pa.string()),
+        ('inspection_id', pa.int64()),
+        ('is_anomaly', pa.bool_()),
+        ('anomaly_score', pa.float64()),
+        ('verdict', pa.string()),
+        ('inspected_at', pa.timestamp('us')),
+        ('calibration_log_id', pa.int64()),
+        ('initial_gv', pa.float64()),
+        ('target_gv', pa.float64()),
+        ('final_gv', pa.float64()),
+        ('gain_applied', pa.float64()),
+        ('black_level_applied', pa.float64()),
+        ('converged', pa.bool_()),
+        ('camera_id', pa.string()),
+        ('simulation_mode', pa.string()),
+    ])
+
+
+def _heatmap_path(file_path: str) -> Path:
+    # Same naming as ``anomaly.analyze_tensor``.
+    return Path(settings.static_dir) / 'heatmaps' / (Path(file_path).stem + '_heat.png')
+
+
+def _stat(path: Path) -> os.stat_result | None:
+    try:
+        return path.stat() if path.is_file() else None
+    except OSError:
+        return None
+
+
+async def _copy_member(archive, sink: _Sink, name: str, source: BinaryIO, size: int, mtime: float, compress: bool = False) -> AsyncIterator[bytes]:
+    with archive.open(name, size, mtime, compress) as member:
+        while True:
+            data = await asyncio.to_thread(source.read, CHUNK)
+            if not data:
+                break
+            member.write(data)
+            yield sink.drain()
+    yield sink.drain()
+
+
+async def _add_file(archive, sink: _Sink, name: str, path: Path) -> AsyncIterator[bytes]:
+    st = await asyncio.to_thread(_stat, path)
+    if st is None:
+        return
+    source = await asyncio.to_thread(open, path, 'rb')
+    try:
+        async for chunk in _copy_member(archive, sink, name, source, st.st_size, st.st_mtime):
+            yield chunk
+    finally:
+        source.close()
+
+
+def _filtered(stmt, lot_number: str | None, since: datetime | None, until: datetime | None):
+    if lot_number is not None:
+        stmt = stmt.where(RawImage.lot_number == lot_number)
+    if since is not None:
+        stmt = stmt.where(RawImage.timestamp >= since)
+    if until is not None:
+        stmt = stmt.where(RawImage.timestamp < until)
+    return stmt
+
+
+async def stream_export(
+    lot_number: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    archive: str = 'zip',
+    results: str = 'csv',
+    images: bool = True,
+    heatmaps: bool = True,
+) -> AsyncIterator[bytes]:
+    """Yield a ZIP or tar of the selected raw images, their heatmaps and a joined results file.
+
+    Rows come off a server-side cursor (``yield_per``) ordered by raw image, so each
+    image is written once however many inspections or calibration logs join to it.
+    Memory stays at one file chunk plus the spooled results, whatever the export size.
+    """
+    sink = _Sink()
+    writer = _ZipArchive(sink) if archive == 'zip' else _TarArchive(sink)
+    out = _ResultsWriter(results)
+    started = time.perf_counter()
+    image_count = 0
+    try:
+        stmt = _filtered(
+            select(
+                RawImage.id,
+                RawImage.lot_number,
+                RawImage.timestamp,
+                RawImage.status,
+                RawImage.file_path,
+                InspectionResult.id,
+                InspectionResult.is_anomaly,
+                InspectionResult.anomaly_score,
+                InspectionResult.verdict,
+                InspectionResult.created_at,
+                CalibrationLog.id,
+                CalibrationLog.initial_gv,
+                CalibrationLog.target_gv,
+                CalibrationLog.final_gv,
+                CalibrationLog.gain_applied,
+                CalibrationLog.black_level_applied,
+                CalibrationLog.converged,
+                CalibrationLog.camera_id,
+                CalibrationLog.simulation_mode,
+            )
+            .outerjoin(InspectionResult, InspectionResult.raw_image_id == RawImage.id)
+            .outerjoin(CalibrationLog, CalibrationLog.inspection_id == InspectionResult.id),
+            lot_number,
+            since,
+            until,
+        ).order_by(RawImage.id, InspectionResult.id, CalibrationLog.id).execution_options(yield_per=ROW_BATCH)
+
+        last_raw_id = None
+        image_name = heatmap_name = None
+        async with AsyncSessionLocal() as session:
+            async for row in await session.stream(stmt):
+                (raw_id, lot, captured_at, status, file_path,
+                 inspection_id, is_anomaly, score, verdict, inspected_at,
+                 log_id, initial_gv, target_gv, final_gv, gain, black_level, converged, camera_id, mode) = row
+                if raw_id != last_raw_id:
+                    last_raw_id = raw_id
+                    image_name = heatmap_name = None
+                    if images:
+                        name = f'images/{raw_id}_{Path(file_path).name}'
+                        async for chunk in _add_file(writer, sink, name, Path(file_path)):
+                            image_name = name
+                            yield chunk
+                        image_count += image_name is not None
+                    if heatmaps:
+                        heat = _heatmap_path(file_path)
+                        name = f'heatmaps/{raw_id}_{heat.name}'
+                        async for chunk in _add_file(writer, sink, name, heat):
+                            heatmap_name = name
+                            yield chunk
+                out.add({
+                    'raw_image_id': raw_id,
+                    'lot_number': lot,
+                    'captured_at': captured_at,
+                    'status': status.value if status is not None else None,
+                    'image': image_name,
+                    'heatmap': heatmap_name,
+                    'inspection_id': inspection_id,
+                    'is_anomaly': is_anomaly,
+                    'anomaly_score': score,
+                    'verdict': verdict.value if verdict is not None else None,
+                    'inspected_at': inspected_at,
+                    'calibration_log_id': log_id,
+                    'initial_gv': initial_gv,
+                    'target_gv': target_gv,
+                    'final_gv': final_gv,
+                    'gain_applied': gain,
+                    'black_level_applied': black_level,
+                    'converged': converged,
+                    'camera_id': camera_id,
+                    'simulation_mode': mode,
+                })
+
+        size = await asyncio.to_thread(out.finish)
+        async for chunk in _copy_member(writer, sink, f'results.{results}', out.file, size, time.time(), compress=results == 'csv'):
+            yield chunk
+        writer.close()
+        yield sink.drain()
+        logger.info('export_done', extra={
+            'lot_number': lot_number,
+            'rows': out.rows,
+            'images': image_count,
+            'bytes': sink.tell(),
+            'seconds': time.perf_counter() - started,
+        })
+    finally:
+        out.close()
+
+
+def export_filename(lot_number: str | None, archive: str) -> str:
+    stamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+    lot = ''.join(c if c.isalnum() or c in '-_' else '_' for c in lot_number) if lot_number else 'all'
+    return f'aca_export_{lot}_{stamp}.{archive}'
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.camera_driver import VirtualCamera, get_camera
+
+
+logger = logging.getLogger('aca.camera')
+
+
+class FlatField:
+    """Per-pixel correction ``out = raw * gain - offset``.
+
+    Built so that ``(raw - dark) * mean(flat - dark) / (flat - dark) + mean(dark)``
+    collapses to one multiply and one subtract: radial falloff and fixed-pattern
+    offsets are removed while the global black level is kept.
+    """
+
+    def __init__(self, camera_id: str, gain: np.ndarray, offset: np.ndarray, created_at: datetime, frames: int) -> None:
+        self.camera_id = camera_id
+        self.gain = gain.astype(np.float32, copy=False)
+        self.offset = offset.astype(np.float32, copy=False)
+        self.created_at = created_at
+        self.frames = frames
+        self._local = threading.local()
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return self.gain.shape
+
+    @property
+    def key(self) -> tuple[str, int, int]:
+        return self.camera_id, self.shape[0], self.shape[1]
+
+    @classmethod
+    def from_references(cls, camera_id: str, flat: np.ndarray, dark: np.ndarray, frames: int) -> 'FlatField':
+        signal = np.maximum(flat - dark, 1.0)
+        gain = (signal.mean() / signal).astype(np.float32)
+        offset = (dark * gain - dark.mean()).astype(np.float32)
+        return cls(camera_id, gain, offset, datetime.utcnow(), frames)
+
+    def apply(self, image: np.ndarray) -> np.ndarray:
+        """Correct a uint8 frame in place and return it; the float scratch buffer is per thread."""
+        work = getattr(self._local, 'work', None)
+        if work is None:
+            work = self._local.work = np.empty(self.shape, dtype=np.float32)
+        np.multiply(image, self.gain, out=work)
+        np.subtract(work, self.offset, out=work)
+        np.clip(work, 0.0, 255.0, out=work)
+        np.rint(work, out=work)
+        np.copyto(image, work, casting='unsafe')
+        return image
+
+    def describe(self) -> dict[str, Any]:
+        return {
+            'camera_id': self.camera_id,
+            'height': self.shape[0],
+            'width': self.shape[1],
+            'frames': self.frames,
+            'created_at': self.created_at.isoformat(),
+            'gain_min': float(self.gain.min()),
+            'gain_max': float(self.gain.max()),
+        }
+
+
+def uniformity(image: np.ndarray) -> float:
+    """Mean of the four corner patches over the centre patch; 1.0 is perfectly flat."""
+    h, w = image.shape[:2]
+    ph, pw = max(1, h // 10), max(1, w // 10)
+    gray = image.astype(np.float32)
+    corners = [gray[:ph, :pw], gray[:ph, -pw:], gray[-ph:, :pw], gray[-ph:, -pw:]]
+    centre = gray[h // 2 - ph // 2:h // 2 + ph // 2 + 1, w // 2 - pw // 2:w // 2 + pw // 2 + 1]
+    return float(np.mean([c.mean() for c in corners]) / max(float(centre.mean()), 1e-6))
+
+
+class FlatFieldStore:
+    """Maps cached per (camera, resolution) in memory and as ``.npz`` files under the static dir."""
+
+    def __init__(self) -> None:
+        self._maps: dict[tuple[str, int, int], FlatField] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self) -> Path:
+        return Path(settings.static_dir) / 'flat_field'
+
+    def _path(self, key: tuple[str, int, int]) -> Path:
+        camera_id, height, width = key
+        return self.directory / f'{camera_id}_{width}x{height}.npz'
+
+    def put(self, flat_field: FlatField) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        np.savez(
+            self._path(flat_field.key),
+            gain=flat_field.gain,
+            offset=flat_field.offset,
+            created_at=np.array(flat_field.created_at.isoformat()),
+            frames=np.array(flat_field.frames),
+        )
+        with self._lock:
+            self._maps[flat_field.key] = flat_field
+
+    def get(self, camera_id: str, height: int, width: int) -> FlatField | None:
+        key = (camera_id, height, width)
+        with self._lock:
+            if key in self._maps:
+                return self._maps[key]
+        path = self._path(key)
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            flat_field = FlatField(
+                camera_id,
+                data['gain'],
+                data['offset'],
+                datetime.fromisoformat(str(data['created_at'])),
+                int(data['frames']),
+            )
+        with self._lock:
+            self._maps[key] = flat_field
+        return flat_field
+
+    def cached(self) -> list[dict[str, Any]]:
+        with self._lock:
+            return [m.describe() for m in self._maps.values()]
+
+
+def _reference(camera: VirtualCamera, scene: str, frames: int) -> np.ndarray:
+    # The scene is passed per grab, never set on the shared camera, so a concurrent capture still sees the product.
+    # Median rather than mean so transient defects and outlier noise do not print into the map.
+    stack = np.stack([camera.grab(correct=False, scene=scene) for _ in range(frames)])
+    return np.median(stack, axis=0).astype(np.float32)
+
+
+def build_flat_field(camera: VirtualCamera, frames: int) -> tuple[FlatField, dict[str, Any]]:
+    """Capture flat and dark references at the current settings and derive the map; blocking."""
+    frames = max(1, frames)
+    flat = _reference(camera, 'flat', frames)
+    dark = _reference(camera, 'dark', frames)
+
+    flat_field = FlatField.from_references(camera.camera_id, flat, dark, frames)
+    corrected = flat_field.apply(flat.round().astype(np.uint8))
+    start = time.perf_counter()
+    flat_field.apply(np.zeros(flat_field.shape, dtype=np.uint8))
+    apply_ms = (time.perf_counter() - start) * 1000.0
+    report = {
+        **flat_field.describe(),
+        'uniformity_before': uniformity(flat),
+        'uniformity_after': uniformity(corrected),
+        'flat_saturated_fraction': float(np.mean(flat >= 254.5)),
+        'apply_ms': apply_ms,
+    }
+    return flat_field, report
+
+
+class FlatFieldController:
+    """Builds maps and switches correction on the shared camera."""
+
+    def __init__(self, camera: VirtualCamera, store: FlatFieldStore) -> None:
+        self.camera = camera
+        self.store = store
+
+    def _current(self) -> FlatField | None:
+        height, width = self.camera.resolution
+        return self.store.get(self.camera.camera_id, height, width)
+
+    def build(self, frames: int | None = None, enable: bool = True) -> dict[str, Any]:
+        flat_field, report = build_flat_field(self.camera, frames or settings.flat_field_frames)
+        self.store.put(flat_field)
+        if enable:
+            self.camera.flat_field = flat_field
+        logger.info('flat_field_built', extra={'camera_id': flat_field.camera_id, 'uniformity_after': report['uniformity_after']})
+        return {**report, 'enabled': self.camera.flat_field is flat_field}
+
+    def enable(self, enabled: bool) -> bool:
+        """Switch correction on (loading the cached map for this camera and resolution) or off."""
+        if not enabled:
+            self.camera.flat_field = None
+            return True
+        flat_field = self._current()
+        self.camera.flat_field = flat_field
+        return flat_field is not None
+
+    def get_status(self) -> dict[str, Any]:
+        active = self.camera.flat_field
+        return {
+            'enabled': active is not None,
+            'active': active.describe() if active is not None else None,
+            'cached': self.store.cached(),
+        }
+
+
+_controller: FlatFieldController | None = None
+
+
+def get_flat_field() -> FlatFieldController:
+    global _controller
+    if _controller is None:
+        _controller = FlatFieldController(get_camera(), FlatFieldStore())
+    return _controller
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import math
+from typing import Any, Tuple
+
+from app.api.schemas import SimulationMode
+from app.core.config import settings
+from app.services.vision_engine import VisionEngine
+
+
+ADAPTIVE_MODES = {SimulationMode.OPTICAL_NOISE, SimulationMode.DEFECTIVE}
+
+# Two-sided 95% Student t critical values by degrees of freedom; normal beyond the table.
+_T95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262, 10: 2.228,
+        12: 2.179, 15: 2.131, 20: 2.086, 30: 2.042}
+
+
+def t_critical(df: int) -> float:
+    if df <= 0:
+        return float('inf')
+    for key in sorted(_T95):
+        if df <= key:
+            return _T95[key]
+    return 1.96
+
+
+class RunningStats:
+    """Welford accumulator: mean and variance without keeping the samples."""
+
+    def __init__(self) -> None:
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def push(self, value: float) -> None:
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+
+class PooledVariance:
+    """Within-measurement spread pooled across measurements taken at different settings."""
+
+    def __init__(self) -> None:
+        self.df = 0
+        self.m2 = 0.0
+
+    def add(self, stats: RunningStats) -> None:
+        if stats.n >= 2:
+            self.df += stats.n - 1
+            self.m2 += stats.m2
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / self.df) if self.df > 0 else 0.0
+
+
+class AdaptiveGVMeter:
+    """Sequential GV measurement: add frames only while the convergence decision is still ambiguous.
+
+    Frame-to-frame spread is pooled per simulation mode across measurements, so once
+    the noise level is known a single frame is often enough to decide.
+    """
+
+    def __init__(self, camera, engine: VisionEngine | None = None) -> None:
+        self.camera = camera
+        self.engine = engine or VisionEngine()
+        self._pooled: dict[SimulationMode, PooledVariance] = {}
+
+    def _half_width(self, stats: RunningStats, mode: SimulationMode) -> float | None:
+        pooled = self._pooled.get(mode)
+        if pooled is not None and pooled.df >= max(2, stats.n - 1):
+            sigma, df = pooled.std, pooled.df
+        elif stats.n >= 2:
+            sigma, df = stats.std, stats.n - 1
+        else:
+            return None
+        return t_critical(df) * sigma / math.sqrt(stats.n)
+
+    async def measure(self, session, target_gv: float, tolerance: float) -> Tuple[str, dict[str, Any]]:
+        image_url, meta = await self.camera.capture(session=session)
+        mode = self.camera.simulation_mode
+        if mode not in ADAPTIVE_MODES or settings.gv_measure_max_frames <= 1:
+            return image_url, {**meta, 'gv_frames': 1, 'gv_ci_half_width': None}
+
+        stats = RunningStats()
+        stats.push(float(meta['gv_mean']))
+        low, high = target_gv - tolerance, target_gv + tolerance
+        half_width = None
+        while True:
+            half_width = self._half_width(stats, mode)
+            if half_width is not None:
+                lo, hi = stats.mean - half_width, stats.mean + half_width
+                decided = (low <= lo and hi <= high) or hi < low or lo > high
+                if decided or half_width <= tolerance * settings.gv_measure_precision:
+                    break
+            if stats.n >= settings.gv_measure_max_frames:
+                break
+            stats.push(self.engine.calc_gv(self.camera.grab()))
+
+        # Deviations are taken from each measurement's own mean, so gain changes do not inflate the estimate.
+        self._pooled.setdefault(mode, PooledVariance()).add(stats)
+
+        return image_url, {
+            **meta,
+            'gv_mean': stats.mean,
+            'gv_frames': stats.n,
+            'gv_ci_half_width': half_width,
+        }
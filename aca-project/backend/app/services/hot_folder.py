@@ -0,0 +1,336 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import delete, select
+
+from app.core.config import settings
+from app.db.models import HotFolderFile, RawImage
+from app.db.session import AsyncSessionLocal, write_transaction
+from app.services.analytics import hour_bucket, record_image_stats
+from app.services.vision_engine import ImageStats, VisionEngine
+
+
+logger = logging.getLogger('aca.ingest')
+
+IMAGE_EXTS = {'.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff'}
+MAX_PATH = 255
+
+
+def configured_folders() -> list[Path]:
+    return [Path(p.strip()) for p in settings.hot_folder_paths.split(',') if p.strip()]
+
+
+def _frame_stats(path: str) -> ImageStats | None:
+    import cv2
+
+    image = cv2.imread(path, cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    return VisionEngine().frame_stats(image)
+
+
+class HotFolderWatcher:
+    """Registers images dropped into watched folders as ``RawImage`` rows, in place and in batches.
+
+    inotify events (via watchfiles) or a periodic scan feed candidate paths. A file
+    is taken once its size and mtime have held still for ``settle_s``. Stats are
+    computed on a thread pool, and each batch lands in one transaction together with
+    its ``hot_folder_files`` bookkeeping rows, which is what makes a restart resume
+    cleanly.
+    """
+
+    def __init__(
+        self,
+        folders: list[Path],
+        polling: bool | None = None,
+        settle_s: float | None = None,
+        batch_size: int | None = None,
+        workers: int | None = None,
+    ) -> None:
+        self.folders = [f.resolve() for f in folders]
+        self.polling = settings.hot_folder_polling if polling is None else polling
+        self.settle_s = settings.hot_folder_settle_s if settle_s is None else settle_s
+        self.batch_size = max(1, batch_size or settings.hot_folder_batch_size)
+        self.workers = max(1, workers or settings.hot_folder_workers)
+        self.mode = 'stopped'
+        # path -> (size, mtime_ns, monotonic time the pair was first seen)
+        self._pending: dict[str, tuple[int, int, float]] = {}
+        # Recently ingested paths, LRU-bounded; anything evicted is deduplicated by ``hot_folder_files``.
+        self._done: OrderedDict[str, None] = OrderedDict()
+        # Rejected files stay watchable: a half-written file is retried once its size or mtime moves.
+        self._rejected: dict[str, tuple[int, int]] = {}
+        self._stop = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.registered = 0
+        self.already_known = 0
+        self.rejected = 0
+        self.batches = 0
+        self.last_batch_at: datetime | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> bool:
+        if self.running or not self.folders:
+            return False
+        self._stop.clear()
+        self._task = asyncio.create_task(self.run())
+        return True
+
+    def request_stop(self) -> None:
+        self._stop.set()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    def _lot_for(self, path: Path) -> str | None:
+        for root in self.folders:
+            try:
+                rel = path.relative_to(root)
+            except ValueError:
+                continue
+            # Files in a sub-folder belong to the lot named by that sub-folder.
+            return rel.parts[0] if len(rel.parts) > 1 else None
+        return None
+
+    def _offer(self, path: str) -> None:
+        if path in self._done:
+            self._done.move_to_end(path)
+            return
+        if path in self._pending:
+            return
+        if Path(path).suffix.lower() not in IMAGE_EXTS:
+            return
+        self._pending[path] = (-1, -1, 0.0)
+
+    def _scan(self) -> list[str]:
+        found = []
+        for root in self.folders:
+            for dirpath, _, filenames in os.walk(root):
+                for name in filenames:
+                    if Path(name).suffix.lower() in IMAGE_EXTS:
+                        found.append(os.path.join(dirpath, name))
+        return found
+
+    def _remember(self, path: str) -> None:
+        self._done[path] = None
+        self._done.move_to_end(path)
+        while len(self._done) > max(1, settings.hot_folder_recent_paths):
+            self._done.popitem(last=False)
+
+    def _forget(self, path: str) -> None:
+        self._done.pop(path, None)
+        self._rejected.pop(path, None)
+
+    async def _rescan(self) -> None:
+        found = await asyncio.to_thread(self._scan)
+        for path in found:
+            self._offer(path)
+        # Files that left the folders no longer need remembering.
+        present = set(found)
+        for path in [p for p in self._done if p not in present] + [p for p in self._rejected if p not in present]:
+            self._forget(path)
+
+    async def _watch_events(self) -> None:
+        from watchfiles import Change, awatch
+
+        try:
+            async for changes in awatch(*self.folders, stop_event=self._stop, recursive=True):
+                for change, path in changes:
+                    if change == Change.deleted:
+                        self._forget(path)
+                    else:
+                        self._offer(path)
+        except Exception as exc:
+            # inotify unavailable (watch limit, unsupported mount): keep going by polling.
+            logger.warning('hot_folder_events_failed', extra={'error': repr(exc)})
+            self.mode = 'polling'
+            await self._watch_polling()
+
+    async def _watch_polling(self) -> None:
+        while not self._stop.is_set():
+            await self._rescan()
+            try:
+                await asyncio.wait_for(self._stop.wait(), settings.hot_folder_poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _periodic_rescan(self) -> None:
+        """Safety net for event mode: inotify queues can overflow and miss files."""
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), settings.hot_folder_rescan_s)
+            except asyncio.TimeoutError:
+                await self._rescan()
+
+    @staticmethod
+    def _stat_all(paths: list[str]) -> list[os.stat_result | None]:
+        results = []
+        for path in paths:
+            try:
+                results.append(os.stat(path))
+            except FileNotFoundError:
+                results.append(None)
+        return results
+
+    async def _settled(self) -> list[tuple[str, int, int]]:
+        snapshot = list(self._pending.items())
+        stats = await asyncio.to_thread(self._stat_all, [path for path, _ in snapshot])
+        now = time.monotonic()
+        ready = []
+        for (path, (size, mtime_ns, since)), st in zip(snapshot, stats):
+            if st is None:
+                self._pending.pop(path, None)
+            elif st.st_size != size or st.st_mtime_ns != mtime_ns or st.st_size == 0:
+                self._pending[path] = (st.st_size, st.st_mtime_ns, now)
+            elif now - since >= self.settle_s:
+                if self._rejected.get(path) == (size, mtime_ns):
+                    self._pending.pop(path, None)
+                else:
+                    ready.append((path, st.st_size, st.st_mtime_ns))
+        return ready
+
+    async def _settle_loop(self, pool: ThreadPoolExecutor) -> None:
+        interval = max(0.05, min(self.settle_s / 2.0, 1.0))
+        while not self._stop.is_set():
+            ready = await self._settled()
+            for start in range(0, len(ready), self.batch_size):
+                await self._ingest(pool, ready[start:start + self.batch_size])
+            try:
+                await asyncio.wait_for(self._stop.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _ingest(self, pool: ThreadPoolExecutor, batch: list[tuple[str, int, int]]) -> None:
+        async with AsyncSessionLocal() as session:
+            paths = [p for p, _, _ in batch]
+            rows = await session.execute(
+                select(HotFolderFile.path, HotFolderFile.size, HotFolderFile.mtime_ns, HotFolderFile.error)
+                .where(HotFolderFile.path.in_([p[:MAX_PATH] for p in paths]))
+            )
+            known = {path: (size, mtime_ns, error) for path, size, mtime_ns, error in rows}
+            fresh, retry = [], []
+            for path, size, mtime_ns in batch:
+                row = known.get(path[:MAX_PATH])
+                if row is None:
+                    fresh.append((path, size, mtime_ns))
+                elif row[2] is not None and row[:2] != (size, mtime_ns):
+                    fresh.append((path, size, mtime_ns))
+                    retry.append(path[:MAX_PATH])
+                elif row[2] is not None:
+                    self._rejected[path] = (size, mtime_ns)
+            self.already_known += len(batch) - len(fresh)
+
+            loop = asyncio.get_running_loop()
+            stats = await asyncio.gather(*(loop.run_in_executor(pool, _frame_stats, p) for p, _, _ in fresh))
+
+            grouped: dict[tuple[str | None, datetime], tuple[ImageStats, datetime, datetime]] = {}
+            accepted: list[tuple[RawImage, int, int]] = []
+            async with write_transaction(session):
+                if retry:
+                    await session.execute(delete(HotFolderFile).where(HotFolderFile.path.in_(retry)))
+                for (path, size, mtime_ns), frame in zip(fresh, stats):
+                    error = None
+                    if len(path) > MAX_PATH:
+                        error = 'path_too_long'
+                    elif frame is None:
+                        error = 'unreadable'
+                    if error is not None:
+                        session.add(HotFolderFile(path=path[:MAX_PATH], size=size, mtime_ns=mtime_ns, error=error))
+                        self._rejected[path] = (size, mtime_ns)
+                        self.rejected += 1
+                        continue
+                    lot_number = self._lot_for(Path(path))
+                    taken_at = datetime.utcfromtimestamp(mtime_ns / 1e9)
+                    raw = RawImage(lot_number=lot_number, timestamp=taken_at, file_path=path)
+                    session.add(raw)
+                    self._rejected.pop(path, None)
+                    accepted.append((raw, size, mtime_ns))
+                    key = (lot_number, hour_bucket(taken_at))
+                    merged, earliest, latest = grouped.get(key, (ImageStats(), taken_at, taken_at))
+                    grouped[key] = (merged.merge(frame), min(earliest, taken_at), max(latest, taken_at))
+                await session.flush()
+                session.add_all([
+                    HotFolderFile(path=raw.file_path, raw_image_id=raw.id, size=size, mtime_ns=mtime_ns)
+                    for raw, size, mtime_ns in accepted
+                ])
+                # One rollup upsert per (lot, hour) instead of one per file.
+                for (lot_number, _), (merged, earliest, latest) in grouped.items():
+                    await record_image_stats(session, lot_number, merged, latest, first_ts=earliest)
+            self.registered += len(accepted)
+
+        for path in paths:
+            self._pending.pop(path, None)
+            if path not in self._rejected:
+                self._remember(path)
+        self.batches += 1
+        self.last_batch_at = datetime.utcnow()
+        if fresh:
+            logger.info('hot_folder_batch', extra={'files': len(fresh), 'known': len(batch) - len(fresh)})
+
+    async def run(self) -> None:
+        events = not self.polling
+        if events:
+            try:
+                import watchfiles  # noqa: F401
+            except ImportError:
+                events = False
+        self.mode = 'events' if events else 'polling'
+        logger.info('hot_folder_started', extra={'folders': [str(f) for f in self.folders], 'mode': self.mode})
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='aca-hot-folder') as pool:
+            # Files that arrived while nothing was watching are picked up (or skipped as known) first.
+            await self._rescan()
+            tasks = [asyncio.create_task(self._settle_loop(pool))]
+            if events:
+                tasks += [asyncio.create_task(self._watch_events()), asyncio.create_task(self._periodic_rescan())]
+            else:
+                tasks.append(asyncio.create_task(self._watch_polling()))
+            try:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+                for task in done:
+                    if task.exception() is not None:
+                        raise task.exception()
+            finally:
+                self._stop.set()
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                self.mode = 'stopped'
+
+    def get_status(self) -> dict[str, Any]:
+        return {
+            'running': self.running,
+            'mode': self.mode,
+            'folders': [str(f) for f in self.folders],
+            'pending': len(self._pending),
+            'recent': len(self._done),
+            'registered': self.registered,
+            'already_known': self.already_known,
+            'rejected': self.rejected,
+            'batches': self.batches,
+            'last_batch_at': self.last_batch_at.isoformat() if self.last_batch_at else None,
+        }
+
+
+_watcher: HotFolderWatcher | None = None
+
+
+def get_hot_folder_watcher() -> HotFolderWatcher:
+    global _watcher
+    if _watcher is None:
+        _watcher = HotFolderWatcher(configured_folders())
+    return _watcher
@@ -5,14 +5,30 @@ from pathlib import Path
 from typing import Any
 
 import aiofiles
+import numpy as np
 
-from app.ai_core.anomaly import analyze_async
+from app.ai_core.loader import ai_runtime
 from app.core.config import settings
-from app.db.models import InspectionResult, RawImage, RawImageStatus
+from app.db.models import InspectionResult, LotItem, RawImage, RawImageStatus, Verdict
+from app.db.session import write_transaction
+from app.services.analytics import record_image_stats, record_inspection
 from app.services.vision_engine import VisionEngine
 
 
-async def ingest_image(session, file_bytes: bytes, filename: str, lot_number: str | None = None) -> dict[str, Any]:
+async def item_for_lot(session, lot_number: str | None) -> str | None:
+    if lot_number is None:
+        return None
+    row = await session.get(LotItem, lot_number)
+    return row.item if row is not None else None
+
+
+async def ingest_image(
+    session,
+    file_bytes: bytes,
+    filename: str,
+    lot_number: str | None = None,
+    item: str | None = None,
+) -> dict[str, Any]:
     timestamp = datetime.utcnow()
     image_dir = Path(settings.static_dir) / settings.image_subdir
     image_dir.mkdir(parents=True, exist_ok=True)
@@ -24,10 +40,14 @@ async def ingest_image(session, file_bytes: bytes, filename: str, lot_number: st
     async with aiofiles.open(file_path, 'wb') as f:
         await f.write(file_bytes)
 
-    engine = VisionEngine()
-    gv_mean = await engine.calc_gv_from_path(str(file_path))
+    import cv2
 
-    async with session.begin():
+    # Decode the uploaded bytes once; GV and the lot statistics both come from this array.
+    image = cv2.imdecode(np.frombuffer(file_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    stats = VisionEngine().frame_stats(image) if image is not None else None
+    gv_mean = stats.gv_sum / stats.pixels if stats is not None else 0.0
+
+    async with write_transaction(session):
         raw = RawImage(
             lot_number=lot_number,
             timestamp=timestamp,
@@ -35,8 +55,10 @@ async def ingest_image(session, file_bytes: bytes, filename: str, lot_number: st
             status=RawImageStatus.PENDING,
         )
         session.add(raw)
-
-    await session.refresh(raw)
+        if lot_number is not None and item is not None:
+            await session.merge(LotItem(lot_number=lot_number, item=item, updated_at=timestamp))
+        if stats is not None:
+            await record_image_stats(session, lot_number, stats, timestamp)
 
     image_url = f"{settings.static_url}/{settings.image_subdir}/{out_name}"
     return {
@@ -47,22 +69,29 @@ async def ingest_image(session, file_bytes: bytes, filename: str, lot_number: st
     }
 
 
-async def analyze_raw_image(session, raw_image_id: int, threshold: float = 0.01) -> dict[str, Any]:
+async def analyze_raw_image(session, raw_image_id: int, threshold: float = 0.01, item: str | None = None) -> dict[str, Any]:
+    """Score one raw image with the model for ``item``, or for the item its lot was ingested as."""
     raw = await session.get(RawImage, raw_image_id)
     if raw is None:
         return {'found': False}
 
-    result = await analyze_async(raw.file_path, threshold=threshold)
+    item = item or await item_for_lot(session, raw.lot_number)
+    anomaly = await ai_runtime.ensure_loaded()
+    result = await anomaly.analyze_async(raw.file_path, threshold=threshold, item=item)
 
-    async with session.begin():
+    verdict = Verdict.NG if result.is_anomaly else Verdict.OK
+    now = datetime.utcnow()
+    async with write_transaction(session):
         inspection = InspectionResult(
             raw_image_id=raw.id,
             is_anomaly=result.is_anomaly,
             anomaly_score=result.score,
-            verdict='NG' if result.is_anomaly else 'OK',
+            verdict=verdict,
+            created_at=now,
         )
         session.add(inspection)
         raw.status = RawImageStatus.PROCESSED
+        await record_inspection(session, lot_number=raw.lot_number, verdict=verdict, score=result.score, ts=now)
 
     heatmap_url = None
     recon_url = None
@@ -75,8 +104,11 @@ async def analyze_raw_image(session, raw_image_id: int, threshold: float = 0.01)
         'found': True,
         'raw_image_id': raw.id,
         'inspection_id': inspection.id,
+        'item': item,
         'is_anomaly': result.is_anomaly,
         'score': result.score,
         'heatmap_url': heatmap_url,
         'recon_url': recon_url,
+        'queue_ms': result.queue_ms,
+        'compute_ms': result.compute_ms,
     }
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import and_, func, select, tuple_
+from sqlalchemy.orm import aliased
+
+from app.core.config import settings
+from app.db.models import InspectionResult, RawImage, RawImageStatus, Verdict
+
+
+def encode_cursor(*values: Any) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int) -> list[Any]:
+    """Inverse of ``encode_cursor``; raises ``ValueError`` for anything it did not produce."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception as exc:
+        raise ValueError('invalid cursor') from exc
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('invalid cursor')
+    return values
+
+
+def _image_url(file_path: str) -> str:
+    return file_path.replace(settings.static_dir, settings.static_url).replace('\\', '/')
+
+
+def _inspection(inspection_id, is_anomaly, score, verdict, created_at) -> dict[str, Any] | None:
+    if inspection_id is None:
+        return None
+    return {
+        'inspection_id': inspection_id,
+        'is_anomaly': is_anomaly,
+        'score': score,
+        'verdict': verdict.value,
+        'created_at': created_at.isoformat(),
+    }
+
+
+def _score_filters(min_score: float | None, max_score: float | None) -> list:
+    filters = []
+    if min_score is not None:
+        filters.append(InspectionResult.anomaly_score >= min_score)
+    if max_score is not None:
+        filters.append(InspectionResult.anomaly_score <= max_score)
+    return filters
+
+
+async def query_raw_images(
+    session,
+    lot_number: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    status: RawImageStatus | None = None,
+    verdict: Verdict | None = None,
+    min_score: float | None = None,
+    max_score: float | None = None,
+    limit: int = 100,
+    cursor: str | None = None,
+) -> dict[str, Any]:
+    """Newest raw images first, each with its latest inspection, one keyset page at a time.
+
+    The latest inspection is joined through a correlated ``max(id)`` that resolves on
+    ``ix_inspection_results_raw_image_id_id``, so a page is one query however many rows
+    it holds. ``verdict`` and the score range filter on that latest inspection.
+    """
+    newer = aliased(InspectionResult)
+    latest_id = select(func.max(newer.id)).where(newer.raw_image_id == RawImage.id).scalar_subquery()
+    stmt = (
+        select(
+            RawImage.id,
+            RawImage.lot_number,
+            RawImage.timestamp,
+            RawImage.status,
+            RawImage.file_path,
+            InspectionResult.id,
+            InspectionResult.is_anomaly,
+            InspectionResult.anomaly_score,
+            InspectionResult.verdict,
+            InspectionResult.created_at,
+        )
+        .outerjoin(InspectionResult, InspectionResult.id == latest_id)
+    )
+    if lot_number is not None:
+        stmt = stmt.where(RawImage.lot_number == lot_number)
+    if since is not None:
+        stmt = stmt.where(RawImage.timestamp >= since)
+    if until is not None:
+        stmt = stmt.where(RawImage.timestamp < until)
+    if status is not None:
+        stmt = stmt.where(RawImage.status == status)
+    if verdict is not None:
+        stmt = stmt.where(InspectionResult.verdict == verdict)
+    score_filters = _score_filters(min_score, max_score)
+    if score_filters:
+        stmt = stmt.where(and_(*score_filters))
+    if cursor is not None:
+        ts, last_id = decode_cursor(cursor, 2)
+        try:
+            key = (datetime.fromisoformat(ts), int(last_id))
+        except (TypeError, ValueError) as exc:
+            raise ValueError('invalid cursor') from exc
+        stmt = stmt.where(tuple_(RawImage.timestamp, RawImage.id) < tuple_(*key))
+    stmt = stmt.order_by(RawImage.timestamp.desc(), RawImage.id.desc()).limit(limit + 1)
+
+    rows = (await session.execute(stmt)).all()
+    page = rows[:limit]
+    items = [
+        {
+            'raw_image_id': raw_id,
+            'lot_number': lot,
+            'timestamp': ts.isoformat(),
+            'status': raw_status.value,
+            'image_url': _image_url(file_path),
+            'latest_inspection': _inspection(*inspection),
+        }
+        for raw_id, lot, ts, raw_status, file_path, *inspection in page
+    ]
+    next_cursor = encode_cursor(page[-1][2], page[-1][0]) if len(rows) > limit else None
+    return {'items': items, 'next_cursor': next_cursor}
+
+
+async def query_inspections(
+    session,
+    lot_number: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    verdict: Verdict | None = None,
+    min_score: float | None = None,
+    max_score: float | None = None,
+    limit: int = 100,
+    cursor: str | None = None,
+) -> dict[str, Any]:
+    """Newest inspection results first with their raw image joined in; keyset-paginated on id."""
+    stmt = (
+        select(
+            InspectionResult.id,
+            InspectionResult.is_anomaly,
+            InspectionResult.anomaly_score,
+            InspectionResult.verdict,
+            InspectionResult.created_at,
+            RawImage.id,
+            RawImage.lot_number,
+            RawImage.timestamp,
+            RawImage.file_path,
+        )
+        .join(RawImage, RawImage.id == InspectionResult.raw_image_id)
+    )
+    if lot_number is not None:
+        stmt = stmt.where(RawImage.lot_number == lot_number)
+    if since is not None:
+        stmt = stmt.where(InspectionResult.created_at >= since)
+    if until is not None:
+        stmt = stmt.where(InspectionResult.created_at < until)
+    if verdict is not None:
+        stmt = stmt.where(InspectionResult.verdict == verdict)
+    score_filters = _score_filters(min_score, max_score)
+    if score_filters:
+        stmt = stmt.where(and_(*score_filters))
+    if cursor is not None:
+        (last_id,) = decode_cursor(cursor, 1)
+        if not isinstance(last_id, int):
+            raise ValueError('invalid cursor')
+        stmt = stmt.where(InspectionResult.id < last_id)
+    stmt = stmt.order_by(InspectionResult.id.desc()).limit(limit + 1)
+
+    rows = (await session.execute(stmt)).all()
+    page = rows[:limit]
+    items = [
+        {
+            **_inspection(inspection_id, is_anomaly, score, verdict_, created_at),
+            'raw_image_id': raw_id,
+            'lot_number': lot,
+            'timestamp': ts.isoformat(),
+            'image_url': _image_url(file_path),
+        }
+        for inspection_id, is_anomaly, score, verdict_, created_at, raw_id, lot, ts, file_path in page
+    ]
+    next_cursor = encode_cursor(page[-1][0]) if len(rows) > limit else None
+    return {'items': items, 'next_cursor': next_cursor}
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Sequence
+
+import numpy as np
+
+from app.api.schemas import SimulationMode
+
+
+# Noise sigma and vignetting ceiling per mode, as in ``VirtualCamera._apply_simulation``.
+_NOISE_SIGMA = {SimulationMode.CLEAN: 5.0, SimulationMode.OPTICAL_NOISE: 10.0, SimulationMode.DEFECTIVE: 12.0}
+_MAX_VIGNETTING = {SimulationMode.CLEAN: 0.0, SimulationMode.OPTICAL_NOISE: 0.4, SimulationMode.DEFECTIVE: 0.4}
+_MODES = (SimulationMode.CLEAN, SimulationMode.OPTICAL_NOISE, SimulationMode.DEFECTIVE)
+
+
+@dataclass
+class SyntheticBatch:
+    frames: np.ndarray
+    modes: list[SimulationMode]
+    gain: np.ndarray
+    black_level: np.ndarray
+    vignetting: np.ndarray
+    masks: np.ndarray | None = None
+
+    def describe(self) -> dict[str, Any]:
+        return {
+            'count': len(self.frames),
+            'shape': list(self.frames.shape),
+            'modes': {mode.value: self.modes.count(mode) for mode in _MODES},
+            'gain': [float(self.gain.min()), float(self.gain.max())] if len(self.gain) else None,
+            'black_level': [int(self.black_level.min()), int(self.black_level.max())] if len(self.black_level) else None,
+            'defect_pixels': int(self.masks.sum()) if self.masks is not None else None,
+        }
+
+
+class SyntheticFrameGenerator:
+    """Whole batches of ``VirtualCamera``-style frames as one ``[N,H,W]`` uint8 array.
+
+    Scene, gain/black-level response, vignetting, noise and defects follow the
+    virtual camera's model, but every step is a numpy operation over the batch
+    instead of a per-frame OpenCV call, parameters are drawn per frame, and
+    defects are rasterised from coordinates so their exact pixels can be
+    returned as masks. Frames are grayscale and produced directly at model
+    resolution, so nothing has to be encoded, written or resized before training.
+    """
+
+    def __init__(
+        self,
+        resolution: tuple[int, int] = (256, 256),
+        gain_range: tuple[float, float] = (0.0, 24.0),
+        black_level_range: tuple[int, int] = (0, 60),
+        seed: int | None = None,
+    ) -> None:
+        self.resolution = resolution
+        self.gain_range = gain_range
+        self.black_level_range = black_level_range
+        self.rng = np.random.default_rng(seed)
+        h, w = resolution
+        self._scene = 90.0 + np.linspace(0, 40, w, dtype=np.float32)[None, :].repeat(h, axis=0)
+        y = np.linspace(-1, 1, h, dtype=np.float32)[:, None]
+        x = np.linspace(-1, 1, w, dtype=np.float32)[None, :]
+        self._radius2 = x**2 + y**2
+
+    def generate(
+        self,
+        count: int,
+        modes: Sequence[SimulationMode] = _MODES,
+        weights: Sequence[float] | None = None,
+        with_masks: bool = False,
+    ) -> SyntheticBatch:
+        n = int(count)
+        picks = self.rng.choice(len(modes), size=n, p=_normalise(weights, len(modes)))
+        batch_modes = [modes[i] for i in picks]
+        sigma = np.array([_NOISE_SIGMA[m] for m in batch_modes], dtype=np.float32)
+        max_vignetting = np.array([_MAX_VIGNETTING[m] for m in batch_modes], dtype=np.float32)
+        optical = np.array([m == SimulationMode.OPTICAL_NOISE for m in batch_modes])
+        defective = np.array([m == SimulationMode.DEFECTIVE for m in batch_modes])
+
+        gain = self.rng.uniform(*self.gain_range, size=n).astype(np.float32)
+        black_level = self.rng.integers(self.black_level_range[0], self.black_level_range[1] + 1, size=n)
+        vignetting = self.rng.uniform(0.0, 1.0, size=n).astype(np.float32) * max_vignetting
+
+        frames = self._scene[None] * (1.0 + gain / 24.0)[:, None, None] + black_level[:, None, None].astype(np.float32)
+        np.clip(frames, 0, 255, out=frames)
+        frames *= np.clip(1.0 - vignetting[:, None, None] * self._radius2[None], 0.3, 1.0)
+        if optical.any():
+            frames[optical] = _blur5(frames[optical])
+        frames += self.rng.standard_normal(frames.shape, dtype=np.float32) * sigma[:, None, None]
+        np.clip(frames, 0, 255, out=frames)
+        out = frames.astype(np.uint8)
+
+        masks = np.zeros(out.shape, dtype=bool) if with_masks else None
+        if defective.any():
+            index = np.flatnonzero(defective)
+            lines, spots = self._defects(len(index))
+            sub = out[index]
+            sub[lines] = 255
+            sub[spots] = 0
+            out[index] = sub
+            if masks is not None:
+                masks[index] = lines | spots
+
+        return SyntheticBatch(out, batch_modes, gain, black_level, vignetting, masks)
+
+    def fill(
+        self,
+        out: np.ndarray,
+        modes: Sequence[SimulationMode] = _MODES,
+        weights: Sequence[float] | None = None,
+        chunk: int = 64,
+    ) -> np.ndarray:
+        """Write ``len(out)`` frames into a preallocated ``[N,H,W]`` uint8 array, ``chunk`` at a time.
+
+        The float32 working set of ``generate`` is bounded by ``chunk`` rather than
+        by the whole batch, so large training sets only cost their uint8 size.
+        """
+        chunk = max(1, chunk)
+        for start in range(0, len(out), chunk):
+            batch = self.generate(min(chunk, len(out) - start), modes=modes, weights=weights)
+            out[start:start + len(batch.frames)] = batch.frames
+        return out
+
+    def _defects(self, n: int) -> tuple[np.ndarray, np.ndarray]:
+        """Six 1px scratches and twelve dark spots (radius 2-5) per frame, as boolean maps."""
+        h, w = self.resolution
+        lines = np.zeros((n, h, w), dtype=bool)
+        x1, x2 = self.rng.integers(0, w, size=(2, n, 6, 1))
+        y1, y2 = self.rng.integers(0, h, size=(2, n, 6, 1))
+        # One sample per pixel along the longer axis hits every pixel of the line.
+        t = np.linspace(0.0, 1.0, max(h, w) + 1, dtype=np.float32)
+        xs = np.rint(x1 + (x2 - x1) * t).astype(np.intp)
+        ys = np.rint(y1 + (y2 - y1) * t).astype(np.intp)
+        frame = np.broadcast_to(np.arange(n)[:, None, None], xs.shape)
+        lines[frame, ys, xs] = True
+
+        spots = np.zeros((n, h, w), dtype=bool)
+        cx = self.rng.integers(0, w, size=(n, 12))
+        cy = self.rng.integers(0, h, size=(n, 12))
+        r = self.rng.integers(2, 6, size=(n, 12))
+        yy = np.arange(h)[None, :, None]
+        xx = np.arange(w)[None, None, :]
+        for k in range(12):
+            spots |= (yy - cy[:, k, None, None]) ** 2 + (xx - cx[:, k, None, None]) ** 2 <= (r[:, k, None, None] ** 2)
+        # Spots are drawn after scratches, so where they overlap the pixel is dark.
+        lines &= ~spots
+        return lines, spots
+
+
+def _normalise(weights: Sequence[float] | None, size: int) -> np.ndarray | None:
+    if weights is None:
+        return None
+    p = np.asarray(weights, dtype=np.float64)
+    if p.shape != (size,) or (p < 0).any() or p.sum() <= 0:
+        raise ValueError('weights must be one non-negative value per mode')
+    return p / p.sum()
+
+
+def _blur5(frames: np.ndarray) -> np.ndarray:
+    """Separable 5-tap Gaussian over the last two axes with edge reflection, like ``cv2.GaussianBlur(.., (5, 5), 0)``."""
+    kernel = np.array([1, 4, 6, 4, 1], dtype=np.float32) / 16.0
+    h, w = frames.shape[-2:]
+    padded = np.pad(frames, ((0, 0), (2, 2), (0, 0)), mode='reflect')
+    rows = sum(k * padded[:, i:i + h] for i, k in enumerate(kernel))
+    padded = np.pad(rows, ((0, 0), (0, 0), (2, 2)), mode='reflect')
+    return sum(k * padded[:, :, i:i + w] for i, k in enumerate(kernel))
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import logging
+from typing import Any
+
+from sqlalchemy import select
+
+from app.ai_core.loader import ai_runtime
+from app.core.config import settings
+from app.db.models import DatasetImage, DatasetSplit, TrainingRun
+from app.db.session import write_transaction
+
+
+logger = logging.getLogger('aca.ai')
+
+
+def _matches(column, value):
+    return column.is_(None) if value is None else column == value
+
+
+async def last_trained_watermark(session, item: str | None, split: DatasetSplit, defect_type: str | None) -> int:
+    stmt = (
+        select(TrainingRun.last_dataset_image_id)
+        .where(
+            _matches(TrainingRun.item, item),
+            TrainingRun.split == split,
+            _matches(TrainingRun.defect_type, defect_type),
+            TrainingRun.trained.is_(True),
+        )
+        .order_by(TrainingRun.id.desc())
+        .limit(1)
+    )
+    return (await session.execute(stmt)).scalar_one_or_none() or 0
+
+
+async def train_from_dataset(
+    session,
+    item: str | None,
+    split: DatasetSplit = DatasetSplit.TRAIN,
+    defect_type: str | None = 'good',
+    incremental: bool = True,
+    epochs: int = 20,
+    lr: float = 1e-3,
+    batch_size: int = 16,
+    patience: int = 3,
+) -> dict[str, Any]:
+    """Fine-tune on ``dataset_images`` rows matching the selection.
+
+    Rows whose id is a multiple of ``train_val_every`` are held out for early stopping.
+    With ``incremental`` only rows added since the last successful run for the same
+    selection are trained on, starting from the current weights.
+    """
+    stmt = select(DatasetImage.id, DatasetImage.file_path).where(
+        DatasetImage.split == split,
+        DatasetImage.is_mask.is_(False),
+    )
+    if item is not None:
+        stmt = stmt.where(DatasetImage.item == item)
+    if defect_type is not None:
+        stmt = stmt.where(DatasetImage.defect_type == defect_type)
+    stmt = stmt.order_by(DatasetImage.id)
+    rows = (await session.execute(stmt)).all()
+    if not rows:
+        return {'trained': False, 'reason': 'no_images'}
+
+    every = max(2, settings.train_val_every)
+    val_rows = [r for r in rows if r.id % every == 0]
+    if len(val_rows) > settings.train_max_val_images:
+        step = len(val_rows) / settings.train_max_val_images
+        val_rows = [val_rows[int(i * step)] for i in range(settings.train_max_val_images)]
+
+    watermark = await last_trained_watermark(session, item, split, defect_type) if incremental else 0
+    train_rows = [r for r in rows if r.id % every != 0 and r.id > watermark]
+    if not train_rows:
+        return {'trained': False, 'reason': 'no_new_images', 'watermark': watermark}
+
+    anomaly = await ai_runtime.ensure_loaded()
+    result = await anomaly.fine_tune_async(
+        [r.file_path for r in train_rows],
+        [r.file_path for r in val_rows],
+        epochs,
+        lr,
+        batch_size,
+        patience,
+        item,
+    )
+
+    async with write_transaction(session):
+        run = TrainingRun(
+            item=item,
+            split=split,
+            defect_type=defect_type,
+            incremental=incremental and watermark > 0,
+            trained=result['trained'],
+            image_count=result['count'],
+            val_count=result['val_count'],
+            last_dataset_image_id=max(r.id for r in rows),
+            epochs_run=result['epochs_run'],
+            best_val_loss=result['best_val_loss'],
+            duration_s=result['duration_s'],
+        )
+        session.add(run)
+
+    logger.info('dataset_training', extra={'training_run_id': run.id, 'count': result['count'], 'trained': result['trained']})
+    return {'training_run_id': run.id, 'incremental': run.incremental, 'watermark': watermark, **result}
@@ -1,8 +1,63 @@
 ﻿from __future__ import annotations
 
+from dataclasses import dataclass, field
+from typing import Any
+
 import numpy as np
 
 
+GV_LEVELS = 256
+
+
+@dataclass
+class ImageStats:
+    """GV accumulator whose fields all combine by addition, so frames, lots and hours merge exactly."""
+
+    images: int = 0
+    pixels: int = 0
+    gv_sum: float = 0.0
+    gv_sumsq: float = 0.0
+    saturated_low: int = 0
+    saturated_high: int = 0
+    histogram: np.ndarray = field(default_factory=lambda: np.zeros(GV_LEVELS, dtype=np.int64))
+
+    def merge(self, other: 'ImageStats') -> 'ImageStats':
+        self.images += other.images
+        self.pixels += other.pixels
+        self.gv_sum += other.gv_sum
+        self.gv_sumsq += other.gv_sumsq
+        self.saturated_low += other.saturated_low
+        self.saturated_high += other.saturated_high
+        self.histogram += other.histogram
+        return self
+
+    def percentile(self, q: float) -> int | None:
+        total = int(self.histogram.sum())
+        if total == 0:
+            return None
+        return int(np.searchsorted(np.cumsum(self.histogram), q / 100.0 * total, side='left'))
+
+    def summary(self, histogram: bool = False) -> dict[str, Any]:
+        n = self.pixels
+        mean = self.gv_sum / n if n else None
+        variance = max(0.0, self.gv_sumsq / n - mean * mean) if n else None
+        out = {
+            'images': self.images,
+            'pixels': n,
+            'gv_mean': mean,
+            'gv_std': variance ** 0.5 if variance is not None else None,
+            'saturated_low': self.saturated_low,
+            'saturated_high': self.saturated_high,
+            'saturated_fraction': (self.saturated_low + self.saturated_high) / n if n else None,
+            'p01': self.percentile(1),
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+        }
+        if histogram:
+            out['histogram'] = self.histogram.tolist()
+        return out
+
+
 class VisionEngine:
     def calc_gv(self, image: np.ndarray) -> float:
         gray = image.mean(axis=2)
@@ -13,6 +68,33 @@ class VisionEngine:
         hist, _ = np.histogram(gray, bins=256, range=(0, 255))
         return hist.tolist()
 
+    def frame_stats(self, image: np.ndarray) -> ImageStats:
+        """GV statistics of the channel-mean gray image (histogram bins are its truncated levels).
+
+        Saturation is counted per pixel from the channels themselves, not the mean:
+        a pixel is saturated low if any channel is 0 and high if any channel is 255.
+        """
+        if image.ndim == 3:
+            gray = image.mean(axis=2, dtype=np.float32)
+            low = int(np.count_nonzero(image.min(axis=2) == 0))
+            high = int(np.count_nonzero(image.max(axis=2) == 255))
+        else:
+            gray = image.astype(np.float32)
+            low = int(np.count_nonzero(image == 0))
+            high = int(np.count_nonzero(image == 255))
+        flat = gray.ravel()
+        hist = np.bincount(flat.astype(np.uint8), minlength=GV_LEVELS).astype(np.int64)
+        values = flat.astype(np.float64)
+        return ImageStats(
+            images=1,
+            pixels=int(flat.size),
+            gv_sum=float(values.sum()),
+            gv_sumsq=float(values @ values),
+            saturated_low=low,
+            saturated_high=high,
+            histogram=hist,
+        )
+
     async def calc_gv_from_path(self, path: str) -> float:
         import cv2
 
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import bisect
+import logging
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.models import CalibrationLog, CalibrationRecipe
+
+
+logger = logging.getLogger('aca.calibration')
+
+
+@dataclass
+class WarmStartPoint:
+    target_gv: float
+    gain: float
+    black_level: float
+    source: str = 'log'
+
+
+class WarmStartIndex:
+    """Converged (target_gv -> gain, black_level) points per camera and simulation mode."""
+
+    def __init__(self) -> None:
+        self._points: dict[tuple[str, str], list[WarmStartPoint]] = {}
+        self.loaded = False
+
+    async def load(self, session) -> int:
+        self._points.clear()
+        count = 0
+        # Sweep recipes first so that measured, converged runs override model predictions.
+        recipes = select(
+            CalibrationRecipe.camera_id,
+            CalibrationRecipe.simulation_mode,
+            CalibrationRecipe.target_gv,
+            CalibrationRecipe.gain,
+            CalibrationRecipe.black_level,
+        ).order_by(CalibrationRecipe.id)
+        for camera_id, mode, target_gv, gain, black_level in (await session.execute(recipes)).all():
+            self.add(camera_id, mode, target_gv, gain, black_level, source='recipe')
+            count += 1
+
+        stmt = (
+            select(
+                CalibrationLog.camera_id,
+                CalibrationLog.simulation_mode,
+                CalibrationLog.target_gv,
+                CalibrationLog.gain_applied,
+                CalibrationLog.black_level_applied,
+            )
+            .where(
+                CalibrationLog.converged.is_(True),
+                CalibrationLog.camera_id.is_not(None),
+                CalibrationLog.simulation_mode.is_not(None),
+            )
+            .order_by(CalibrationLog.id)
+        )
+        for camera_id, mode, target_gv, gain, black_level in (await session.execute(stmt)).all():
+            self.add(camera_id, mode, target_gv, gain, black_level)
+            count += 1
+        self.loaded = True
+        logger.info('warm_start_loaded', extra={'points': count})
+        return count
+
+    def add(self, camera_id: str, mode: str, target_gv: float, gain: float, black_level: float, source: str = 'log') -> None:
+        points = self._points.setdefault((camera_id, mode), [])
+        point = WarmStartPoint(float(target_gv), float(gain), float(black_level), source)
+        idx = bisect.bisect_left([p.target_gv for p in points], point.target_gv)
+        # The newest result for (almost) the same target replaces the older one: it reflects current optics.
+        for near in (idx - 1, idx):
+            if 0 <= near < len(points) and abs(points[near].target_gv - point.target_gv) <= settings.warm_start_merge_gv:
+                points[near] = point
+                return
+        points.insert(idx, point)
+
+    def lookup(self, camera_id: str, mode: str, target_gv: float) -> dict[str, Any] | None:
+        points = self._points.get((camera_id, mode))
+        if not points:
+            return None
+        targets = [p.target_gv for p in points]
+        idx = bisect.bisect_left(targets, target_gv)
+        lower = points[idx - 1] if idx > 0 else None
+        upper = points[idx] if idx < len(points) else None
+
+        if lower is not None and upper is not None and upper.target_gv - lower.target_gv <= settings.warm_start_max_gap_gv:
+            span = upper.target_gv - lower.target_gv
+            t = (target_gv - lower.target_gv) / span if span > 0 else 0.0
+            return {
+                'gain': lower.gain + t * (upper.gain - lower.gain),
+                'black_level': int(round(lower.black_level + t * (upper.black_level - lower.black_level))),
+                'method': 'interpolated',
+                'source': lower.source if lower.source == upper.source else 'mixed',
+            }
+
+        nearest = min((p for p in (lower, upper) if p is not None), key=lambda p: abs(p.target_gv - target_gv))
+        if abs(nearest.target_gv - target_gv) > settings.warm_start_max_gap_gv:
+            return None
+        return {
+            'gain': nearest.gain,
+            'black_level': int(round(nearest.black_level)),
+            'method': 'nearest',
+            'source': nearest.source,
+        }
+
+    def get_status(self) -> dict[str, Any]:
+        return {
+            'loaded': self.loaded,
+            'keys': [
+                {'camera_id': camera_id, 'simulation_mode': mode, 'points': len(points)}
+                for (camera_id, mode), points in self._points.items()
+            ],
+        }
+
+
+_index: WarmStartIndex | None = None
+
+
+def get_warm_start_index() -> WarmStartIndex:
+    global _index
+    if _index is None:
+        _index = WarmStartIndex()
+    return _index
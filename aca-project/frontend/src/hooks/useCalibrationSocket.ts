@@ -24,7 +24,7 @@ export function useCalibrationSocket() {
     ws.onmessage = (event) => {
       const data = JSON.parse(event.data) as CalibrationStep
       setSteps((prev) => [...prev, data])
-      if (data.status === 'CONVERGED' || data.status === 'FAILED') {
+      if (data.status !== 'ADJUSTING') {
         setStatus('done')
         ws.close()
       }
@@ -1,4 +1,4 @@
-﻿export type CalibrationStatus = 'ADJUSTING' | 'CONVERGED' | 'FAILED'
+﻿export type CalibrationStatus = 'ADJUSTING' | 'CONVERGED' | 'FAILED' | 'CANCELLED' | 'ERROR'
 
 export interface CalibrationStep {
   step: number
@@ -11,6 +11,7 @@ export interface CalibrationStep {
   image_url: string
   raw_image_id: number | null
   inspection_id: number | null
+  run_id?: string
 }
 
 export interface CaptureResponse {